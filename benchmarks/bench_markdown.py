@@ -0,0 +1,67 @@
+"""比较内置Markdown生成器与html2text的速度
+
+用法: python benchmarks/bench_markdown.py [--repeat N] 文件或目录 ...
+每个文件只解析一次，分别计时两种生成方式，每行输出一条JSON结果，最后输出汇总。
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import html2md
+
+
+def iter_html_files(paths):
+    """展开命令行中的文件和目录"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file.endswith(('.html', '.htm')):
+                        yield os.path.join(root, file)
+        else:
+            yield path
+
+
+def time_engine(soup, engine, repeat):
+    """返回多次生成中最快的一次耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        out = io.StringIO()
+        start = time.perf_counter()
+        html2md.write_markdown(soup, out, engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较Markdown生成方式的速度')
+    parser.add_argument('paths', nargs='+', help='HTML文件或目录')
+    parser.add_argument('--repeat', type=int, default=5, help='每种方式重复次数，取最快一次')
+    args = parser.parse_args()
+
+    totals = {engine: 0.0 for engine in html2md.MARKDOWN_ENGINES}
+    for html_file in iter_html_files(args.paths):
+        with open(html_file, 'r', encoding='utf-8') as f:
+            soup, _ = html2md.extract_article(html2md.parse_html(f.read()))
+        result = {'file': html_file, 'bytes': os.path.getsize(html_file)}
+        for engine in html2md.MARKDOWN_ENGINES:
+            elapsed = time_engine(soup, engine, args.repeat)
+            totals[engine] += elapsed
+            result[engine] = round(elapsed, 6)
+        result['speedup'] = round(result['html2text'] / result['native'], 2) if result['native'] else None
+        print(json.dumps(result, ensure_ascii=False))
+    speedup = totals['html2text'] / totals['native'] if totals['native'] else None
+    print(json.dumps({
+        'total': {engine: round(elapsed, 6) for engine, elapsed in totals.items()},
+        'speedup': round(speedup, 2) if speedup else None,
+    }, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""测量转换大文件时的峰值内存与输入大小的关系，比较完整读取和低内存模式
+
+用法: python benchmarks/bench_memory.py [--sizes 1 4 16 64] [--pages csdn zhihu] [--output results.json]
+
+在语料中的文章页面末尾填充评论、推荐列表之类的无关内容，生成指定大小（MB）的页面，
+每个大小和模式在独立的子进程中转换一次，记录峰值内存（ru_maxrss）和耗时。
+低内存模式的峰值内存应当基本不随页面大小增长，只与文章本身的大小有关。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus_server import CorpusServer, load_manifest, render_page
+from bench_pipeline import peak_rss_kb
+
+MODES = ('full', 'low-memory')
+
+# 填充用的无关内容，模拟评论区和推荐文章
+FILLER = (
+    '<div class="comment-box"><div class="comment-list-item">'
+    '<a class="user-name" href="https://example.com/u/{i}">用户{i}</a>'
+    '<span class="date">2024-01-01 12:00:00</span>'
+    '<p class="comment-content">这是第{i}条评论，写得很好，收藏了。</p>'
+    '<ul class="recommend"><li><a href="https://example.com/p/{i}">推荐文章 {i}</a></li></ul>'
+    '</div></div>\n'
+)
+
+
+def build_page(page, base_url, size, path):
+    """把页面填充到 size 字节，写入 path，返回实际大小"""
+    html = render_page(page, base_url)
+    head, sep, tail = html.rpartition('</body>')
+    if not sep:
+        head, tail = html, ''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(head)
+        written = len(html.encode('utf-8'))
+        i = 0
+        while written < size:
+            filler = FILLER.format(i=i)
+            f.write(filler)
+            written += len(filler.encode('utf-8'))
+            i += 1
+        f.write(sep + tail)
+    return os.path.getsize(path)
+
+
+def run_child(args):
+    import html2md
+    html2md.set_parser_backend(args.parser)
+    html2md.set_low_memory_threshold(0 if args.mode == 'low-memory' else None)
+    baseline_rss = peak_rss_kb()
+    with tempfile.TemporaryDirectory(prefix='html2md-bench-') as tmp:
+        start = time.perf_counter()
+        result = html2md.convert_html_to_md(args.child, tmp)
+        elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'ok': bool(result),
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'baseline_rss_kb': baseline_rss,
+        'peak_rss_kb': peak_rss_kb(),
+        'sliced': bool(html2md.metrics.snapshot()['counters'].get('low_memory_inputs')),
+    }))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量峰值内存与输入大小的关系')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16, 64], help='页面大小（MB）')
+    parser.add_argument('--pages', nargs='+', default=['csdn', 'zhihu'], help='用于填充的语料页面')
+    parser.add_argument('--parser', default='html.parser', help='HTML解析后端')
+    parser.add_argument('--output', help='把全部结果保存为JSON文件')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    pages = {page['name']: page for page in load_manifest()['pages']}
+    results = []
+    failed = False
+    with CorpusServer() as server, tempfile.TemporaryDirectory(prefix='html2md-bench-') as tmp:
+        for name in args.pages:
+            for size_mb in args.sizes:
+                input_file = os.path.join(tmp, f'{name}.html')
+                input_bytes = build_page(pages[name], server.base_url, int(size_mb * 1024 * 1024), input_file)
+                for mode in MODES:
+                    command = [sys.executable, os.path.abspath(__file__), '--child', input_file,
+                               '--mode', mode, '--parser', args.parser]
+                    proc = subprocess.run(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+                    result = {'page': name, 'mode': mode, 'input_bytes': input_bytes}
+                    if proc.returncode != 0:
+                        failed = True
+                        result['error'] = f'退出码 {proc.returncode}'
+                    else:
+                        result.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+                        failed = failed or not result['ok']
+                    results.append(result)
+                    print(json.dumps(result, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'parser': args.parser, 'results': results}, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
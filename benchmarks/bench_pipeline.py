@@ -0,0 +1,311 @@
+"""端到端基准测试：在离线语料上测量 convert_html_to_md、convert_url_to_md 和 process_directory
+
+用法: python benchmarks/bench_pipeline.py [--iterations N] [--output results.json] [--baseline old.json]
+
+语料位于 benchmarks/corpus，由本地HTTP服务（corpus_server.py）提供页面和图片，不访问外网。
+每个场景在独立的子进程中运行，以便单独测量峰值内存。每次迭代使用新的图片仓库、
+HTTP缓存和输出目录（--warm 时复用，测量缓存命中的情况）。
+
+CSDN和知乎在真实环境中需要浏览器渲染，这里把本地服务返回的页面预先放入渲染缓存，
+测量的是获取页面之后的流水线；微信公众号页面通过HTTP完整获取。
+
+每个场景输出一行JSON：延迟百分位、吞吐量、各阶段耗时、计数器和峰值内存。
+--output 保存全部结果（附带提交号和运行环境），--baseline 与之前保存的结果比较，
+p50 延迟变慢超过 --max-regression 时返回非零退出码。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus_server import CorpusServer, load_manifest, render_page
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SCENARIOS = [
+    'file:csdn', 'file:zhihu', 'file:wechat',
+    'url:csdn', 'url:zhihu', 'url:wechat',
+    'directory',
+]
+
+
+def percentile(values, fraction):
+    """最近秩法计算百分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_kb():
+    """当前进程的峰值内存（KB），不支持时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以KB为单位
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---- 子进程：运行单个场景 ----
+
+class Scenario:
+    """一个场景的准备和执行，setup 在计时之外，run 被计时"""
+
+    def __init__(self, name, base_url, args):
+        import html2md
+        self.html2md = html2md
+        self.name = name
+        self.base_url = base_url
+        self.args = args
+        self.manifest = load_manifest()
+        self.pages = {page['name']: page for page in self.manifest['pages']}
+        self.documents = 1
+        self.input_bytes = 0
+        self.fetch_mode = None
+        self.work_dir = None
+        self.kind, _, page_name = name.partition(':')
+        if self.kind in ('file', 'url'):
+            if page_name not in self.pages:
+                raise SystemExit(f"未知的页面: {page_name}")
+            self.page = self.pages[page_name]
+            self.html = render_page(self.page, base_url)
+            self.input_bytes = len(self.html.encode('utf-8'))
+        elif self.kind == 'directory':
+            self.page = None
+            self.documents = len(self.pages) * args.copies
+        else:
+            raise SystemExit(f"未知的场景: {name}")
+
+    def prepare(self, iteration_dir):
+        """为一次迭代准备输入和缓存目录"""
+        html2md = self.html2md
+        state_dir = self.args.state_dir or iteration_dir
+        html2md.RESOURCE_STORE_DIR = os.path.join(state_dir, 'store')
+        html2md.configure_http_cache(os.path.join(state_dir, 'http-cache'), ttl=3600)
+        self.output_dir = os.path.join(iteration_dir, 'output')
+
+        if self.kind == 'file':
+            self.input_file = os.path.join(iteration_dir, self.page['name'] + '.html')
+            with open(self.input_file, 'w', encoding='utf-8') as f:
+                f.write(self.html)
+        elif self.kind == 'url':
+            self.url = self.base_url + self.page['path']
+            if self.page['fetch'] == 'browser':
+                # 没有浏览器时用本地服务的页面预先填充渲染缓存
+                self.fetch_mode = 'rendered-cache'
+                with urllib.request.urlopen(self.url) as response:
+                    html_content = response.read().decode('utf-8')
+                html2md.get_http_cache().store_rendered(self.url, html_content)
+            else:
+                self.fetch_mode = 'http'
+        else:
+            self.input_dir = os.path.join(iteration_dir, 'input')
+            total = 0
+            for copy in range(self.args.copies):
+                copy_dir = os.path.join(self.input_dir, f'{copy:03d}')
+                os.makedirs(copy_dir, exist_ok=True)
+                for name, page in self.pages.items():
+                    html = render_page(page, self.base_url)
+                    with open(os.path.join(copy_dir, name + '.html'), 'w', encoding='utf-8') as f:
+                        f.write(html)
+                    total += len(html.encode('utf-8'))
+            self.input_bytes = total
+
+    def run(self):
+        """执行一次被测的转换，返回是否成功"""
+        html2md = self.html2md
+        if self.kind == 'file':
+            return bool(html2md.convert_html_to_md(self.input_file, self.output_dir))
+        if self.kind == 'url':
+            return bool(html2md.convert_url_to_md(self.url, self.output_dir))
+        results = html2md.process_directory(self.input_dir, self.output_dir, workers=self.args.workers)
+        return all(results)
+
+
+def run_child(args):
+    import html2md
+    html2md.set_parser_backend(args.parser)
+    html2md.set_markdown_engine(args.markdown)
+    baseline_rss = peak_rss_kb()
+    scenario = Scenario(args.child, args.base, args)
+
+    latencies = []
+    failures = 0
+    with tempfile.TemporaryDirectory(prefix='html2md-bench-') as tmp:
+        if args.warm:
+            args.state_dir = os.path.join(tmp, 'state')
+        for iteration in range(args.warmup + args.iterations):
+            if iteration == args.warmup:
+                html2md.metrics.reset()
+            iteration_dir = os.path.join(tmp, f'iter{iteration}')
+            os.makedirs(iteration_dir)
+            scenario.prepare(iteration_dir)
+            start = time.perf_counter()
+            ok = scenario.run()
+            elapsed = time.perf_counter() - start
+            if iteration >= args.warmup:
+                latencies.append(elapsed)
+                failures += not ok
+            shutil.rmtree(iteration_dir, ignore_errors=True)
+
+    snapshot = html2md.metrics.snapshot()
+    total = sum(latencies)
+    result = {
+        'scenario': scenario.name,
+        'iterations': len(latencies),
+        'failures': failures,
+        'documents': scenario.documents,
+        'input_bytes': scenario.input_bytes,
+        'latency_ms': {
+            'min': round(min(latencies) * 1000, 3),
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p90': round(percentile(latencies, 0.90) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'max': round(max(latencies) * 1000, 3),
+            'mean': round(total / len(latencies) * 1000, 3),
+        },
+        'throughput': {
+            'docs_per_s': round(scenario.documents * len(latencies) / total, 3),
+            'mb_per_s': round(scenario.input_bytes * len(latencies) / total / 1e6, 3),
+        },
+        'stages': {
+            name: {
+                'count': stage['count'],
+                'total_ms': round(stage['seconds'] * 1000, 3),
+                'mean_ms': round(stage['seconds'] / stage['count'] * 1000, 3),
+                'max_ms': round(stage['max_seconds'] * 1000, 3),
+                'per_s': round(stage['count'] / stage['seconds'], 3) if stage['seconds'] else None,
+            }
+            for name, stage in snapshot['stages'].items()
+        },
+        'counters': snapshot['counters'],
+        'baseline_rss_kb': baseline_rss,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+    if scenario.fetch_mode:
+        result['fetch_mode'] = scenario.fetch_mode
+    if scenario.kind == 'directory':
+        result['workers'] = args.workers
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+# ---- 主进程：启动语料服务并逐个运行场景 ----
+
+def child_command(args, scenario, base_url):
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        '--child', scenario, '--base', base_url,
+        '--iterations', str(args.iterations), '--warmup', str(args.warmup),
+        '--copies', str(args.copies), '--workers', str(args.workers),
+        '--parser', args.parser, '--markdown', args.markdown,
+    ]
+    if args.warm:
+        command.append('--warm')
+    return command
+
+
+def compare(results, baseline_path, max_regression):
+    """与基线结果比较 p50 延迟，返回是否存在超出阈值的回退"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {result['scenario']: result for result in json.load(f)['results']}
+    regressed = False
+    for result in results:
+        old = baseline.get(result['scenario'])
+        if not old:
+            continue
+        ratio = result['latency_ms']['p50'] / old['latency_ms']['p50'] if old['latency_ms']['p50'] else None
+        slower = ratio is not None and ratio > 1 + max_regression
+        regressed = regressed or slower
+        print(json.dumps({
+            'compare': result['scenario'],
+            'p50_ms': result['latency_ms']['p50'],
+            'baseline_p50_ms': old['latency_ms']['p50'],
+            'ratio': round(ratio, 3) if ratio else None,
+            'peak_rss_kb': result['peak_rss_kb'],
+            'baseline_peak_rss_kb': old.get('peak_rss_kb'),
+            'regression': slower,
+        }, ensure_ascii=False))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在离线语料上运行端到端基准测试')
+    parser.add_argument('scenarios', nargs='*', help=f"场景，默认全部：{' '.join(DEFAULT_SCENARIOS)}")
+    parser.add_argument('--iterations', type=int, default=10, help='每个场景计时的迭代次数')
+    parser.add_argument('--warmup', type=int, default=1, help='不计时的预热次数')
+    parser.add_argument('--warm', action='store_true', help='迭代之间复用图片仓库和HTTP缓存')
+    parser.add_argument('--copies', type=int, default=10, help='directory 场景中每个页面的副本数')
+    parser.add_argument('--workers', type=int, default=1, help='directory 场景的并行进程数')
+    parser.add_argument('--parser', default='html.parser', help='HTML解析后端')
+    parser.add_argument('--markdown', default='native', help='Markdown生成方式')
+    parser.add_argument('--output', help='把全部结果保存为JSON文件')
+    parser.add_argument('--baseline', help='与之前 --output 保存的结果比较')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='允许的 p50 延迟增幅（0.2 表示20%%）')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--base', help=argparse.SUPPRESS)
+    parser.add_argument('--state-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    results = []
+    failed = False
+    with CorpusServer() as server:
+        for scenario in args.scenarios or DEFAULT_SCENARIOS:
+            proc = subprocess.run(child_command(args, scenario, server.base_url), cwd=ROOT,
+                                  stdout=subprocess.PIPE, text=True)
+            if proc.returncode != 0:
+                failed = True
+                print(json.dumps({'scenario': scenario, 'error': f'退出码 {proc.returncode}'}, ensure_ascii=False))
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            failed = failed or bool(result['failures'])
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'parser': args.parser,
+                'markdown': args.markdown,
+                'iterations': args.iterations,
+                'warm': args.warm,
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+    if args.baseline and compare(results, args.baseline, args.max_regression):
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""测量 import html2md 和转换一个本地文件的启动开销
+
+用法: python benchmarks/bench_startup.py [--repeat N] [--budget-ms MS]
+每个场景在新的Python进程中运行 N 次（python -X importtime），取中位数，
+每行输出一条JSON结果。导入了不该加载的重量级模块，或 import html2md 的耗时
+超过 --budget-ms 时返回非零退出码，可以放在CI中防止启动开销回升。
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 本地转换用不到的模块，出现在导入列表中说明又被提前加载了
+HEAVY_MODULES = ('selenium', 'requests', 'html2text', 'ttkbootstrap')
+
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+SAMPLE_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>启动测试</title></head>
+<body><h1>启动测试</h1><p>一段<strong>正文</strong>和<a href="https://example.com/">链接</a>。</p>
+<ul><li>列表一</li><li>列表二</li></ul><pre><code class="language-python">print("hi")</code></pre>
+</body></html>
+"""
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 ({顶层模块: 累计微秒}, 已导入模块集合)"""
+    top_level = {}
+    modules = set()
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), match.group(3), match.group(4)
+        modules.add(name)
+        if not indent:
+            top_level[name] = cumulative
+    return top_level, modules
+
+
+def run_once(args):
+    """运行一次，返回 (墙钟耗时秒, 顶层模块导入耗时, 已导入模块集合)"""
+    env = dict(os.environ)
+    # 允许写入字节码缓存，测量的是日常使用时的启动时间
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"命令执行失败: {' '.join(args)}\n{proc.stderr[-2000:]}")
+    top_level, modules = parse_importtime(proc.stderr)
+    return elapsed, top_level, modules
+
+
+def measure(name, args, repeat):
+    """多次运行同一场景，返回结果字典"""
+    run_once(args)  # 预热，生成字节码缓存
+    walls, imports, html2md_imports = [], [], []
+    modules = set()
+    for _ in range(repeat):
+        elapsed, top_level, modules = run_once(args)
+        walls.append(elapsed)
+        imports.append(sum(top_level.values()))
+        html2md_imports.append(top_level.get('html2md', 0))
+    heavy = sorted({module.split('.')[0] for module in modules if module.split('.')[0] in HEAVY_MODULES})
+    return {
+        'case': name,
+        'wall_ms': round(statistics.median(walls) * 1000, 1),
+        'import_ms': round(statistics.median(imports) / 1000, 1),
+        'html2md_import_ms': round(statistics.median(html2md_imports) / 1000, 1),
+        'modules': len(modules),
+        'heavy_modules': heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量html2md的启动开销')
+    parser.add_argument('--repeat', type=int, default=5, help='每个场景运行的次数，取中位数')
+    parser.add_argument('--budget-ms', type=float, help='import html2md 允许的最大耗时（毫秒）')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        html_file = os.path.join(tmp, 'sample.html')
+        with open(html_file, 'w', encoding='utf-8') as f:
+            f.write(SAMPLE_HTML)
+        cases = [
+            ('import', ['-c', 'import html2md']),
+            ('convert_file', ['html2md.py', 'convert', html_file, '-o', os.path.join(tmp, 'out')]),
+        ]
+        for name, case_args in cases:
+            result = measure(name, case_args, args.repeat)
+            if result['heavy_modules']:
+                failed = True
+            if name == 'import' and args.budget_ms is not None:
+                result['budget_ms'] = args.budget_ms
+                if result['html2md_import_ms'] > args.budget_ms:
+                    failed = True
+            print(json.dumps(result, ensure_ascii=False))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
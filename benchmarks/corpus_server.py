@@ -0,0 +1,137 @@
+"""在本地提供基准测试语料的HTTP服务，代替真实的CSDN、知乎和微信服务器
+
+页面按 manifest.json 中登记的路径提供，其中的 {{BASE}} 替换为服务地址；
+其他路径映射到 static/ 目录（忽略查询参数），用于提供图片。
+
+也可以单独运行，便于手动查看：python benchmarks/corpus_server.py [--port 8000]
+"""
+import argparse
+import http.server
+import json
+import os
+import socketserver
+import threading
+from urllib.parse import urlsplit, unquote
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+_CONTENT_TYPES = {
+    b'\x89PNG': 'image/png',
+    b'GIF8': 'image/gif',
+    b'\xff\xd8\xff': 'image/jpeg',
+}
+
+
+def load_manifest(corpus_dir=CORPUS_DIR):
+    with open(os.path.join(corpus_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def render_page(page, base_url, corpus_dir=CORPUS_DIR):
+    """读取页面快照并把其中的 {{BASE}} 替换为服务地址"""
+    with open(os.path.join(corpus_dir, page['file']), 'r', encoding='utf-8') as f:
+        return f.read().replace('{{BASE}}', base_url)
+
+
+def guess_content_type(body):
+    """按文件头判断图片类型（微信图片地址没有扩展名）"""
+    for magic, content_type in _CONTENT_TYPES.items():
+        if body.startswith(magic):
+            return content_type
+    return 'application/octet-stream'
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class CorpusServer:
+    """后台线程中运行的语料服务，可作为上下文管理器使用"""
+
+    def __init__(self, corpus_dir=CORPUS_DIR, host='127.0.0.1', port=0):
+        self.corpus_dir = corpus_dir
+        self.manifest = load_manifest(corpus_dir)
+        self.requests = 0  # 已处理的请求数
+        self._pages = {page['path']: page for page in self.manifest['pages']}
+        self._lock = threading.Lock()
+        self._httpd = _ThreadingServer((host, port), self._make_handler())
+        self.base_url = f'http://{host}:{self._httpd.server_address[1]}'
+        self._thread = None
+
+    def page_url(self, name):
+        """返回页面在本地服务中的URL"""
+        for page in self.manifest['pages']:
+            if page['name'] == name:
+                return self.base_url + page['path']
+        raise KeyError(name)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                path = unquote(urlsplit(self.path).path)
+                page = server._pages.get(path)
+                if page is not None:
+                    self._send(render_page(page, server.base_url, server.corpus_dir).encode('utf-8'), 'text/html; charset=utf-8')
+                    return
+                static_root = os.path.realpath(os.path.join(server.corpus_dir, 'static'))
+                file_path = os.path.realpath(os.path.join(static_root, path.lstrip('/')))
+                if not file_path.startswith(static_root + os.sep) or not os.path.isfile(file_path):
+                    self._send(b'not found', 'text/plain', status=404)
+                    return
+                with open(file_path, 'rb') as f:
+                    body = f.read()
+                self._send(body, guess_content_type(body))
+
+            def _send(self, body, content_type, status=200):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='提供基准测试语料的本地HTTP服务')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    server = CorpusServer(port=args.port)
+    print(f"语料服务: {server.base_url}")
+    for page in server.manifest['pages']:
+        print(f"  {page['name']}: {server.base_url}{page['path']}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,7 @@ import queue
 import os
 import sys
 import subprocess
-from html2md import convert_url_to_md, convert_file_to_md, convert_directory_to_md
+from html2md import convert_url_to_md, convert_file_to_md, convert_directory_to_md, ChromeDriverPool, configure_logging
 
 class RedirectText:
     def __init__(self, text_widget, queue):
@@ -33,6 +33,10 @@ class HTML2MDGui(ttk.Window):
         if not os.path.exists(self.default_output_dir):
             os.makedirs(self.default_output_dir)
             
+        # 多次转换URL时复用同一个浏览器会话
+        self.driver_pool = ChromeDriverPool(size=1)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+            
         self.create_widgets()
         
         # 重定向标准输出到GUI
@@ -40,9 +44,16 @@ class HTML2MDGui(ttk.Window):
         self.stderr = sys.stderr
         sys.stdout = RedirectText(self.output_text, self.queue)
         sys.stderr = RedirectText(self.output_text, self.queue)
+        # 转换进度通过日志输出到标准输出，显示在窗口中
+        configure_logging()
         
         self.check_queue()
 
+    def on_close(self):
+        """关闭窗口时释放浏览器会话"""
+        self.driver_pool.close()
+        self.destroy()
+
     def __del__(self):
         # 恢复标准输出
         sys.stdout = self.stdout
@@ -199,20 +210,25 @@ class HTML2MDGui(ttk.Window):
             result = None
             
             if mode == "url":
-                result = convert_url_to_md(self.url_entry.get(), output_dir)
+                result = convert_url_to_md(self.url_entry.get(), output_dir, self.driver_pool)
             elif mode == "file":
                 result = convert_file_to_md(self.file_entry.get(), output_dir)
             else:
                 result = convert_directory_to_md(self.dir_entry.get(), output_dir)
                 
             print("-" * 50)
-            if result:
+            if mode == "directory" and result:
+                failed = sum(1 for item in result if not item)
+                print(f"\n转换完成！成功 {len(result) - failed} 个，失败 {failed} 个")
+                print(f"\n所有文件已保存到: {output_dir}")
+            elif mode == "directory":
+                print("\n转换失败，请检查输入是否正确")
+            elif result:
                 print("\n转换完成！")
-                if isinstance(result, str):
-                    print(f"输出文件: {result}")
+                print(f"输出文件: {result.output}")
                 print(f"\n所有文件已保存到: {output_dir}")
             else:
-                print("\n转换失败，请检查输入是否正确")
+                print(f"\n转换失败: {result.error}")
                 
             self.status_var.set("转换完成")
         except Exception as e:
@@ -1,62 +1,762 @@
 import os
+import sys
 import re
+import argparse
 import hashlib
-import requests
-import html2text
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, unquote, urlparse
+import base64
+from bs4 import BeautifulSoup, NavigableString, Script, Stylesheet, Tag
+from bs4.builder import builder_registry
+from bs4.element import PreformattedString
+from urllib.parse import unquote, unquote_to_bytes, urlparse
 import shutil
-from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import html
 import time
+from datetime import datetime
 import json
 import logging
+import threading
+import contextvars
+import queue
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+# requests、html2text 和 selenium 导入较慢，只在用到它们的函数中导入，
+# 转换本地文件时不会加载浏览器相关模块
+
+__version__ = '1.5.0'
+
+# 增量转换清单的文件名，保存在输出目录中
+MANIFEST_FILENAME = '.html2md-manifest.json'
+
+# 转换目录时的默认并行进程数（命令行 -j 和交互模式），默认逐个转换，0 表示使用全部CPU核
+DIRECTORY_WORKERS = int(os.environ.get('HTML2MD_WORKERS', 1))
+
+# 可选的HTML解析后端：html.parser 为Python内置实现，lxml 基于libxml2，速度快得多但需要另外安装
+PARSER_BACKENDS = ('html.parser', 'lxml')
+PARSER_BACKEND = os.environ.get('HTML2MD_PARSER', 'html.parser')
+
+# Markdown生成方式：native 直接遍历文档树输出，html2text 使用html2text库
+MARKDOWN_ENGINES = ('native', 'html2text')
+MARKDOWN_ENGINE = os.environ.get('HTML2MD_MARKDOWN', 'native')
+
+# 单张图片允许的最大字节数，超过时放弃下载
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+# 流式下载时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+# data URI 每次解码的字符数（必须是4的倍数）
+DATA_URI_CHUNK_CHARS = 64 * 1024
+
+# 图片并发下载的线程数
+IMAGE_DOWNLOAD_WORKERS = 8
+# 每个主机同时保持的最大连接数
+HTTP_POOL_MAXSIZE = 8
+
+# 跨文章、跨输出目录共享的内容寻址图片仓库
+RESOURCE_STORE_DIR = os.environ.get(
+    'HTML2MD_STORE',
+    os.path.join(os.path.expanduser('~'), '.html2md', 'store')
+)
+# 图片仓库的容量上限（字节），超出时按最近使用时间淘汰，0 表示不限制
+RESOURCE_STORE_MAX_BYTES = int(os.environ.get('HTML2MD_STORE_MAX_MB', 5 * 1024)) * 1024 * 1024
+# 最近这么多秒内查询或存入过的对象不会被淘汰，保证查到的对象在链接到输出目录之前仍然存在
+RESOURCE_STORE_GRACE_SECONDS = 300
+
+# 磁盘HTTP缓存目录
+HTTP_CACHE_DIR = os.environ.get(
+    'HTML2MD_HTTP_CACHE',
+    os.path.join(os.path.expanduser('~'), '.html2md', 'http-cache')
+)
+# 参与缓存键计算的请求头
+CACHE_KEY_HEADERS = ('Accept', 'Accept-Language')
+# 图片内容基本不会变化，缓存有效期比页面长得多
+IMAGE_CACHE_TTL = 30 * 24 * 3600
+
+# 网站提取规则目录：内置规则，以及环境变量 HTML2MD_RULES 指定的目录（多个用 os.pathsep 分隔）
+SITE_RULES_DIRS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site_rules')] + [
+    path for path in os.environ.get('HTML2MD_RULES', '').split(os.pathsep) if path
+]
+
+# 达到该大小（字节）的本地HTML文件使用低内存模式读取，只截取文章相关的元素
+LOW_MEMORY_THRESHOLD = int(os.environ.get('HTML2MD_LOW_MEMORY_BYTES', 16 * 1024 * 1024))
+# 低内存模式扫描文件时每次读取的字节数
+SLICE_CHUNK_SIZE = 1024 * 1024
+
+# 直接请求页面（微信公众号）和图片时使用的请求头
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+PAGE_REQUEST_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0'
+}
+# 图片请求头中的 Referer 默认为微信公众号，转换URL时换成文章所在的网站（见 image_referer）
+IMAGE_REQUEST_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Referer': 'https://mp.weixin.qq.com/'
+}
+
+# 各网站的页面就绪条件
+#   selector: 出现即视为文章已加载的CSS选择器
+#   ready_state: 需要等待的 document.readyState（interactive 或 complete）
+#   network_idle: 资源请求停止增加多少秒后视为网络空闲，0 表示不等待
+#   timeout: 最长等待时间（秒）
+#   remove_selectors: 获取页面前移除的元素
+#   block_resources: 是否拦截图片、字体和媒体请求
+#   http_first: 先用普通HTTP请求获取页面，服务器返回的HTML中已有完整正文时不再启动浏览器
+#   truncated_selectors: HTTP获取的页面中出现这些元素时说明正文被折叠，改用浏览器
+#   extract_in_browser: 在浏览器中按网站规则提取正文，只传回文章部分而不是整个页面
+#   browser_images: 在浏览器中提取正文后，用页面内的 fetch() 获取正文中的图片
+DEFAULT_WAIT_PROFILE = {
+    'selector': None,
+    'ready_state': 'complete',
+    'network_idle': 0.5,
+    'timeout': 10,
+    'remove_selectors': [],
+    'block_resources': True,
+    'http_first': False,
+    'truncated_selectors': [],
+    'extract_in_browser': True,
+    'browser_images': True,
+}
+# 在页面中每批获取的图片数
+BROWSER_IMAGE_BATCH = 8
+PAGE_WAIT_PROFILES = {
+    'csdn.net': {
+        'selector': '#content_views',
+        'ready_state': 'interactive',
+        'network_idle': 0,
+        'remove_selectors': ['.hide-article-box', '.passport-login-container'],
+        'http_first': True,
+        'truncated_selectors': ['.hide-article-box'],
+    },
+    'zhihu.com': {
+        'selector': '.Post-RichText',
+        'ready_state': 'interactive',
+        'network_idle': 0,
+        'http_first': True,
+    },
+}
+# 抓取HTML时拦截的资源
+BLOCKED_RESOURCE_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.mp3', '*.m4a', '*.ogg', '*.m3u8',
+]
+
+_http_session = None
+_http_session_lock = threading.Lock()
+_resource_stores = {}
+_resource_stores_lock = threading.Lock()
+_http_cache = None  # None 表示尚未创建，False 表示已关闭
+_http_cache_lock = threading.Lock()
+_site_rules = None
+_site_rules_lock = threading.Lock()
+# 当前转换的阶段耗时汇总字典，见 Metrics.collect
+_stage_collector = contextvars.ContextVar('html2md_stage_collector', default=None)
+# 当前转换下载图片时使用的 Referer，见 image_referer
+_image_referer = contextvars.ContextVar('html2md_image_referer', default=None)
+
+logger = logging.getLogger('html2md')
+
+class _ConsoleHandler(logging.StreamHandler):
+    """把日志写到当前的 sys.stdout，GUI替换 sys.stdout 后日志会显示在窗口中"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+def configure_logging(level=logging.INFO):
+    """让 html2md 的日志以纯文本输出到标准输出，命令行和GUI启动时调用"""
+    if not any(isinstance(handler, _ConsoleHandler) for handler in logger.handlers):
+        handler = _ConsoleHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+class Metrics:
+    """线程安全的阶段计时器和计数器
+
+    阶段（fetch、parse、images、markdown 等）记录次数、总耗时和最大耗时，可以嵌套；
+    计数器记录下载字节数、图片数、缓存命中和失败次数等。每次记录都会调用已注册的回调，
+    回调收到一个事件字典：{'type': 'stage' 或 'counter', 'name': 名称, 'value': 秒数或增量, ...标签}。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}  # 名称 -> [次数, 总耗时, 最大耗时]
+        self._counters = {}
+        self._hooks = []
+
+    def add_hook(self, hook):
+        """注册回调，返回 hook 便于之后移除"""
+        with self._lock:
+            self._hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def _notify(self, event):
+        for hook in list(self._hooks):
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("指标回调出错")
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """统计 with 代码块的耗时，出错时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def collect(self):
+        """把 with 代码块内记录的阶段耗时另外汇总到返回的 {阶段: 秒数} 字典中
+
+        通过 contextvars 区分不同线程和协程中的转换，线程池中的任务需要用
+        contextvars.copy_context().run 执行才会计入。
+        """
+        stages = {}
+        token = _stage_collector.set(stages)
+        try:
+            yield stages
+        finally:
+            _stage_collector.reset(token)
+
+    def observe(self, name, seconds, **labels):
+        """记录一次阶段耗时（秒）"""
+        collected = _stage_collector.get()
+        with self._lock:
+            entry = self._stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            if collected is not None:
+                collected[name] = collected.get(name, 0.0) + seconds
+        if self._hooks:
+            self._notify({'type': 'stage', 'name': name, 'value': seconds, **labels})
+
+    def count(self, name, value=1, **labels):
+        """计数器增加 value"""
+        if not value:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        if self._hooks:
+            self._notify({'type': 'counter', 'name': name, 'value': value, **labels})
+
+    def snapshot(self):
+        """返回当前所有指标的副本"""
+        with self._lock:
+            return {
+                'stages': {
+                    name: {'count': count, 'seconds': round(total, 6), 'max_seconds': round(longest, 6)}
+                    for name, (count, total, longest) in sorted(self._stages.items())
+                },
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def merge(self, snapshot):
+        """合并其他进程的指标快照"""
+        with self._lock:
+            for name, stage in snapshot.get('stages', {}).items():
+                entry = self._stages.setdefault(name, [0, 0.0, 0.0])
+                entry[0] += stage['count']
+                entry[1] += stage['seconds']
+                entry[2] = max(entry[2], stage['max_seconds'])
+            for name, value in snapshot.get('counters', {}).items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix='html2md'):
+        """生成Prometheus文本格式，可供 node_exporter 的 textfile collector 读取"""
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_seconds_total 各阶段累计耗时（秒）',
+            f'# TYPE {prefix}_stage_seconds_total counter',
+        ]
+        lines += [f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]}' for name, stage in snapshot['stages'].items()]
+        lines += [
+            f'# HELP {prefix}_stage_calls_total 各阶段执行次数',
+            f'# TYPE {prefix}_stage_calls_total counter',
+        ]
+        lines += [f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["count"]}' for name, stage in snapshot['stages'].items()]
+        lines += [
+            f'# HELP {prefix}_stage_max_seconds 各阶段单次最大耗时（秒）',
+            f'# TYPE {prefix}_stage_max_seconds gauge',
+        ]
+        lines += [f'{prefix}_stage_max_seconds{{stage="{name}"}} {stage["max_seconds"]}' for name, stage in snapshot['stages'].items()]
+        for name, value in snapshot['counters'].items():
+            lines += [f'# TYPE {prefix}_{name}_total counter', f'{prefix}_{name}_total {value}']
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """保存指标，.prom 和 .txt 文件使用Prometheus文本格式，其余使用JSON"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        write_chunks_atomic([text.encode('utf-8')], path)
+
+# 全局指标，所有转换共用
+metrics = Metrics()
+
+def set_parser_backend(parser):
+    """设置解析HTML使用的后端（html.parser 或 lxml）"""
+    global PARSER_BACKEND
+    if parser not in PARSER_BACKENDS:
+        raise ValueError(f"不支持的解析器: {parser}，可选: {', '.join(PARSER_BACKENDS)}")
+    if builder_registry.lookup(parser) is None:
+        raise ValueError(f"解析器 {parser} 不可用，请先安装: pip install {parser}")
+    PARSER_BACKEND = parser
+
+def parse_html(html_content, parser=None):
+    """将HTML解析为文档树，parser 默认使用 PARSER_BACKEND"""
+    with metrics.stage('parse'):
+        return BeautifulSoup(html_content, parser or PARSER_BACKEND)
 
 def create_resources_dir(output_dir):
     """创建 resources 目录"""
     resources_dir = os.path.join(output_dir, "resources")
-    if not os.path.exists(resources_dir):
-        os.makedirs(resources_dir)
+    # 多个转换可能同时创建同一目录
+    os.makedirs(resources_dir, exist_ok=True)
     return resources_dir
 
-def download_image(url, save_path, driver=None):
-    """下载图片并保存到指定路径"""
+def get_http_session():
+    """返回全局共享的requests会话，复用keep-alive连接"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            # pool_block 使每个主机的连接数不超过 HTTP_POOL_MAXSIZE
+            adapter = HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+                pool_block=True
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+    return _http_session
+
+class ImageDownloadError(Exception):
+    """服务器没有返回图片内容"""
+
+class ImageTooLargeError(Exception):
+    """图片超过允许的最大大小"""
+
+def write_chunks_atomic(chunks, save_path, max_bytes=None):
+    """把数据块流式写入临时文件后原子重命名，超过 max_bytes 时放弃写入，返回写入的字节数"""
+    temp_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.part"
+    written = 0
     try:
-        # 如果是base64编码的图片
-        if url.startswith('data:image'):
-            import base64
-            header, encoded = url.split(",", 1)
-            image_data = base64.b64decode(encoded)
-            with open(save_path, "wb") as f:
-                f.write(image_data)
-            return True
-        
-        # 如果是本地文件路径
-        elif os.path.exists(url):
-            shutil.copy2(url, save_path)
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                written += len(chunk)
+                if max_bytes and written > max_bytes:
+                    raise ImageTooLargeError(f"超过最大大小 {max_bytes} 字节")
+                f.write(chunk)
+        os.replace(temp_path, save_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return written
+
+@contextmanager
+def atomic_open(path, encoding='utf-8'):
+    """以文本方式写入同目录下的临时文件，成功后原子重命名为 path，出错时删除临时文件"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(temp_path, 'w', encoding=encoding) as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def reserve_output_file(output_dir, filename):
+    """以独占方式创建空的输出文件来占用文件名，同名文件已存在时添加序号，返回文件路径"""
+    name, ext = os.path.splitext(filename)
+    counter = 0
+    while True:
+        candidate = f"{name}_{counter}{ext}" if counter else filename
+        path = os.path.join(output_dir, candidate)
+        try:
+            # O_EXCL 保证并发转换不会选中同一个文件名
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            counter += 1
+            continue
+        os.close(fd)
+        return path
+
+def iter_response(response, max_bytes=None):
+    """分块读取响应内容，Content-Length 超过 max_bytes 时不读取直接放弃"""
+    length = response.headers.get('Content-Length', '')
+    if max_bytes and length.isdigit() and int(length) > max_bytes:
+        raise ImageTooLargeError(f"超过最大大小 {max_bytes} 字节")
+    return _count_fetched(response.iter_content(STREAM_CHUNK_SIZE))
+
+def _count_fetched(chunks):
+    """透传数据块，结束后把总字节数计入 bytes_fetched"""
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        metrics.count('bytes_fetched', total)
+
+def iter_data_uri(url):
+    """分块解码 data URI，避免一次性解码整张图片"""
+    header, encoded = url.split(",", 1)
+    if ';base64' not in header:
+        # 百分号编码的是原始字节，不能先解码成文本
+        yield unquote_to_bytes(encoded)
+        return
+    if re.search(r'\s', encoded):
+        encoded = re.sub(r'\s+', '', encoded)
+    # 每块的字符数是4的倍数，可以独立解码
+    for start in range(0, len(encoded), DATA_URI_CHUNK_CHARS):
+        yield base64.b64decode(encoded[start:start + DATA_URI_CHUNK_CHARS])
+
+class CacheMissError(Exception):
+    """仅缓存模式下请求的内容不在缓存中"""
+
+class HttpCache:
+    """磁盘HTTP缓存：支持TTL、ETag/Last-Modified条件请求、按容量的LRU淘汰和仅缓存模式"""
+
+    def __init__(self, root, ttl=3600, max_bytes=1024 * 1024 * 1024, offline=False):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline  # 仅使用缓存，不访问网络
+        self.bodies_dir = os.path.join(root, 'bodies')
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(root, 'index.sqlite3'),
+            timeout=30,
+            check_same_thread=False
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, url TEXT NOT NULL, headers TEXT NOT NULL, '
+                'etag TEXT, last_modified TEXT, stored_at REAL NOT NULL, '
+                'accessed_at REAL NOT NULL, size INTEGER NOT NULL)'
+            )
+
+    @staticmethod
+    def cache_key(url, headers=None):
+        """缓存键：URL加上影响响应内容的请求头"""
+        headers = headers or {}
+        parts = [url] + [f"{name}:{headers[name]}" for name in sorted(headers) if name in CACHE_KEY_HEADERS]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.bodies_dir, key[:2], key)
+
+    def lookup(self, key, ttl=None):
+        """查询缓存，返回 (条目, 是否仍在有效期内)，未命中返回 (None, False)"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT url, headers, etag, last_modified, stored_at FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+        if not row or not os.path.exists(self._body_path(key)):
+            return None, False
+        entry = {
+            'url': row[0],
+            'headers': json.loads(row[1]),
+            'etag': row[2],
+            'last_modified': row[3],
+            'stored_at': row[4],
+        }
+        ttl = self.ttl if ttl is None else ttl
+        return entry, time.time() - entry['stored_at'] < ttl
+
+    def read_body(self, key):
+        """读取缓存内容并更新最近访问时间"""
+        with open(self._body_path(key), 'rb') as f:
+            body = f.read()
+        with self._lock, self._db:
+            self._db.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return body
+
+    def store(self, key, url, body, headers=None):
+        """写入缓存内容，并在超出容量时淘汰最久未访问的条目"""
+        body_path = self._body_path(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        write_chunks_atomic([body], body_path)
+        self._record(key, url, len(body), headers)
+        self.evict()
+
+    def store_stream(self, key, url, chunks, headers=None, max_bytes=None):
+        """把响应数据流式写入缓存，超过 max_bytes 时放弃"""
+        body_path = self._body_path(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        size = write_chunks_atomic(chunks, body_path, max_bytes)
+        self._record(key, url, size, headers)
+
+    def store_file(self, key, url, temp_path, size, headers=None):
+        """把已下载完成的临时文件（须与缓存在同一文件系统）移入缓存"""
+        body_path = self._body_path(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        os.replace(temp_path, body_path)
+        self._record(key, url, size, headers)
+
+    def _record(self, key, url, size, headers=None):
+        """记录缓存条目"""
+        headers = dict(headers or {})
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries '
+                '(key, url, headers, etag, last_modified, stored_at, accessed_at, size) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, json.dumps(headers), headers.get('ETag'), headers.get('Last-Modified'), now, now, size)
+            )
+
+    def refresh(self, key):
+        """服务器返回304时刷新条目的有效期"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute('UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+
+    def evict(self):
+        """总大小超过 max_bytes 时按最近访问时间淘汰，直到降到容量的90%"""
+        with self._lock:
+            total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY accessed_at'):
+                if total <= self.max_bytes * 0.9:
+                    break
+                victims.append(key)
+                total -= size
+            with self._db:
+                self._db.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in victims])
+        for key in victims:
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+
+    def _response(self, url, body, headers, status_code=200):
+        """把缓存内容包装成 requests.Response，调用方无需区分是否来自缓存"""
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = body
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = url
+        response.from_cache = True
+        return response
+
+    def get(self, url, headers=None, timeout=10, ttl=None, session=None):
+        """带缓存的GET请求，返回 requests.Response"""
+        key = self.cache_key(url, headers)
+        entry, fresh = self.lookup(key, ttl)
+        if entry and (fresh or self.offline):
+            metrics.count('http_cache_hits')
+            return self._response(url, self.read_body(key), entry['headers'])
+        if self.offline:
+            metrics.count('http_cache_misses')
+            raise CacheMissError(f"缓存中没有: {url}")
+            
+        # 缓存过期时发送条件请求，内容未变时服务器返回304
+        request_headers = self._conditional_headers(entry, headers)
+        response = (session or get_http_session()).get(url, headers=request_headers, timeout=timeout)
+        if response.status_code == 304 and entry:
+            metrics.count('http_cache_revalidated')
+            self.refresh(key)
+            return self._response(url, self.read_body(key), entry['headers'])
+        metrics.count('http_cache_misses')
+        metrics.count('bytes_fetched', len(response.content))
+        if response.status_code == 200:
+            self.store(key, url, response.content, response.headers)
+        response.from_cache = False
+        return response
+
+    @staticmethod
+    def _conditional_headers(entry, headers):
+        """为过期的缓存条目加上条件请求头"""
+        request_headers = dict(headers or {})
+        if entry:
+            if entry['etag']:
+                request_headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request_headers['If-Modified-Since'] = entry['last_modified']
+        return request_headers
+
+    def copy_body(self, key, save_path):
+        """把缓存内容放到目标路径，优先使用硬链接，并更新最近访问时间"""
+        temp_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            os.link(self._body_path(key), temp_path)
+        except OSError:
+            shutil.copyfile(self._body_path(key), temp_path)
+        os.replace(temp_path, save_path)
+        with self._lock, self._db:
+            self._db.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (time.time(), key))
+
+    def download(self, url, save_path, headers=None, timeout=10, ttl=None, max_bytes=None, session=None):
+        """带缓存的流式下载，响应内容不会整体读入内存，成功返回 True"""
+        key = self.cache_key(url, headers)
+        entry, fresh = self.lookup(key, ttl)
+        if entry and (fresh or self.offline):
+            metrics.count('http_cache_hits')
+            self.copy_body(key, save_path)
             return True
+        if self.offline:
+            metrics.count('http_cache_misses')
+            raise CacheMissError(f"缓存中没有: {url}")
             
-        # 如果是网络URL
+        request_headers = self._conditional_headers(entry, headers)
+        with (session or get_http_session()).get(url, headers=request_headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and entry:
+                metrics.count('http_cache_revalidated')
+                self.refresh(key)
+            elif response.status_code == 200:
+                metrics.count('http_cache_misses')
+                self.store_stream(key, url, iter_response(response, max_bytes), response.headers, max_bytes)
+            else:
+                return False
+        self.copy_body(key, save_path)
+        self.evict()
+        return True
+
+    def get_rendered(self, url, ttl=None):
+        """查询浏览器渲染后的页面缓存，浏览器页面无法做条件请求，只按TTL判断"""
+        key = self.cache_key('rendered:' + url)
+        entry, fresh = self.lookup(key, ttl)
+        if entry and (fresh or self.offline):
+            return self.read_body(key).decode('utf-8')
+        return None
+
+    def store_rendered(self, url, html_content):
+        """缓存浏览器渲染后的页面"""
+        self.store(self.cache_key('rendered:' + url), url, html_content.encode('utf-8'))
+
+def configure_http_cache(root=None, ttl=3600, max_bytes=1024 * 1024 * 1024, offline=False, enabled=True):
+    """配置全局HTTP缓存，enabled 为 False 时关闭缓存"""
+    global _http_cache
+    with _http_cache_lock:
+        if enabled:
+            _http_cache = HttpCache(os.path.abspath(root or HTTP_CACHE_DIR), ttl, max_bytes, offline)
         else:
-            # 添加用户代理和引用来源
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Referer': 'https://mp.weixin.qq.com/'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                with open(save_path, "wb") as f:
-                    f.write(response.content)
-                return True
+            _http_cache = False
+    return _http_cache or None
+
+def get_http_cache():
+    """返回全局HTTP缓存，缓存被关闭时返回 None"""
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HttpCache(os.path.abspath(HTTP_CACHE_DIR))
+    return _http_cache or None
+
+def http_download(url, save_path, headers=None, timeout=10, ttl=None, max_bytes=None):
+    """通过全局缓存（若启用）流式下载到 save_path，成功返回 True"""
+    cache = get_http_cache()
+    if cache is not None:
+        return cache.download(url, save_path, headers, timeout, ttl, max_bytes)
+    with get_http_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            return False
+        write_chunks_atomic(iter_response(response, max_bytes), save_path, max_bytes)
+    return True
+
+def http_get(url, headers=None, timeout=10, ttl=None):
+    """通过全局缓存（若启用）发送GET请求"""
+    cache = get_http_cache()
+    if cache is None:
+        response = get_http_session().get(url, headers=headers, timeout=timeout)
+        metrics.count('bytes_fetched', len(response.content))
+        return response
+    return cache.get(url, headers, timeout, ttl)
+
+@contextmanager
+def image_referer(page_url):
+    """with 代码块内下载图片时以 page_url 所在的网站作为 Referer，避免图片防盗链"""
+    parts = urlparse(page_url)
+    token = _image_referer.set(f'{parts.scheme}://{parts.netloc}/' if parts.scheme and parts.netloc else None)
+    try:
+        yield
+    finally:
+        _image_referer.reset(token)
+
+def image_request_headers():
+    """下载图片使用的请求头"""
+    referer = _image_referer.get()
+    if referer is None:
+        return IMAGE_REQUEST_HEADERS
+    return {**IMAGE_REQUEST_HEADERS, 'Referer': referer}
+
+def download_image(url, save_path, driver=None, max_bytes=None):
+    """下载图片并保存到指定路径，内容流式写入，超过 max_bytes（默认 MAX_IMAGE_BYTES）时放弃"""
+    try:
+        fetch_image_file(url, save_path, max_bytes)
+        return True
     except Exception:
         # 静默处理错误，不打印错误信息
-        pass
-    return False
+        return False
+
+def fetch_image_file(url, save_path, max_bytes=None):
+    """下载图片并保存到指定路径，失败时抛出异常"""
+    if max_bytes is None:
+        max_bytes = MAX_IMAGE_BYTES
+    # 如果是base64编码的图片
+    if url.startswith('data:image'):
+        # 编码后的长度约为原始大小的4/3，明显过大时不再解码
+        if max_bytes and len(url) * 3 // 4 > max_bytes + 3:
+            raise ImageTooLargeError(f"超过最大大小 {max_bytes} 字节")
+        write_chunks_atomic(iter_data_uri(url), save_path, max_bytes)
+        
+    # 如果是本地文件路径
+    elif os.path.exists(url):
+        if max_bytes and os.path.getsize(url) > max_bytes:
+            raise ImageTooLargeError(f"超过最大大小 {max_bytes} 字节")
+        temp_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.part"
+        shutil.copy2(url, temp_path)
+        os.replace(temp_path, save_path)
+            
+    # 如果是网络URL
+    else:
+        # 添加用户代理和引用来源
+        if not http_download(url, save_path, image_request_headers(), timeout=10, ttl=IMAGE_CACHE_TTL, max_bytes=max_bytes):
+            raise ImageDownloadError(f"下载图片失败: {url}")
 
 def clean_filename(filename, index=None):
     """清理并生成有效的文件名"""
@@ -96,113 +796,447 @@ def clean_filename(filename, index=None):
     
     return filename
 
-def process_images(html_content, html_file_path, resources_dir, driver=None):
-    """处理HTML中的所有图片，下载并更新链接"""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    base_path = os.path.dirname(os.path.abspath(html_file_path))
-    used_filenames = {}
-    image_mappings = {}
-    position_counter = 0  # 添加位置计数器
-
-    def process_image_url(url, alt_text="", img_id=""):
-        """处理单个图片URL"""
-        nonlocal position_counter
-        position_counter += 1  # 增加位置计数
-        
-        if not url:
+def _file_digest(path):
+    """计算文件内容的SHA-256哈希"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class ResourceStore:
+    """内容寻址的图片仓库：相同内容只保存一次，并持久化 URL→哈希 索引
+
+    对象硬链接到各输出目录的 resources 中，与输出文件共用同一份数据，因此设为只读，
+    避免修改一篇文章的图片时连带改变仓库和其他文章。总大小超过 max_bytes 时按最近使用时间淘汰，
+    总大小由触发器维护，存入对象时不必扫描整个表。
+    """
+
+    def __init__(self, root, max_bytes=None):
+        self.root = root
+        self.max_bytes = RESOURCE_STORE_MAX_BYTES if max_bytes is None else max_bytes
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # 使用SQLite保存索引，多个进程可以安全地共享同一个仓库
+        self._db = sqlite3.connect(
+            os.path.join(root, 'index.sqlite3'),
+            timeout=30,
+            check_same_thread=False
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS url_index '
+                '(url TEXT PRIMARY KEY, digest TEXT NOT NULL, ext TEXT NOT NULL)'
+            )
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS objects '
+                '(digest TEXT NOT NULL, ext TEXT NOT NULL, size INTEGER NOT NULL, '
+                'accessed_at REAL NOT NULL, PRIMARY KEY (digest, ext))'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS objects_accessed_at ON objects (accessed_at)')
+            # 对象总大小，只有一行；已有的仓库第一次打开时从 objects 表统计
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS store_stats '
+                '(id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL)'
+            )
+            self._db.execute(
+                'INSERT OR IGNORE INTO store_stats (id, total_bytes) '
+                'SELECT 0, COALESCE(SUM(size), 0) FROM objects'
+            )
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS objects_insert AFTER INSERT ON objects '
+                'BEGIN UPDATE store_stats SET total_bytes = total_bytes + NEW.size; END'
+            )
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS objects_delete AFTER DELETE ON objects '
+                'BEGIN UPDATE store_stats SET total_bytes = total_bytes - OLD.size; END'
+            )
+
+    def object_path(self, digest, ext):
+        """返回内容对象在仓库中的路径"""
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def total_bytes(self):
+        """返回仓库中对象的总大小"""
+        with self._lock:
+            return self._db.execute('SELECT total_bytes FROM store_stats').fetchone()[0]
+
+    def lookup(self, url):
+        """按URL查询索引，命中且对象仍存在时返回 (哈希, 扩展名)
+
+        命中时更新对象的使用时间，之后 RESOURCE_STORE_GRACE_SECONDS 内不会被淘汰。
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT digest, ext FROM url_index WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None:
             return None
-            
-        # 处理base64编码的图片
-        if url.startswith('data:image'):
-            # 为base64图片生成唯一的文件名
-            hash_input = f"{url[:100]}_{position_counter}_{alt_text}"
-            hash_object = hashlib.md5(hash_input.encode())
-            base_filename = f"img_{hash_object.hexdigest()[:8]}"
-            
-            # 尝试从header中获取图片格式
+        # 淘汰在写事务中删除记录和文件，更新成功说明对象没有被淘汰
+        with self._lock, self._db:
+            touched = self._db.execute('UPDATE objects SET accessed_at = ? WHERE digest = ? AND ext = ?',
+                                       (time.time(), *row)).rowcount
+        if touched and os.path.exists(self.object_path(*row)):
+            return row
+        return None
+
+    def remember(self, url, digest, ext):
+        """记录 URL→哈希 映射"""
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO url_index (url, digest, ext) VALUES (?, ?, ?)',
+                (url, digest, ext)
+            )
+
+    def add_file(self, temp_path, ext):
+        """把临时文件按内容哈希移入仓库，内容已存在时直接丢弃，返回哈希"""
+        digest = _file_digest(temp_path)
+        object_path = self.object_path(digest, ext)
+        # 先登记对象并更新使用时间再放入文件：正在进行的淘汰会在登记之前删完文件，
+        # 登记之后的宽限期内对象不会被淘汰
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR IGNORE INTO objects (digest, ext, size, accessed_at) VALUES (?, ?, ?, ?)',
+                (digest, ext, os.path.getsize(temp_path), now)
+            )
+            self._db.execute('UPDATE objects SET accessed_at = ? WHERE digest = ? AND ext = ?', (now, digest, ext))
+        if os.path.exists(object_path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # mkstemp 创建的文件只有属主可读；对象会被硬链接到输出目录，设为所有人只读
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, object_path)
+        self.prune()
+        return digest
+
+    def prune(self, max_bytes=None):
+        """总大小超过 max_bytes（默认为 self.max_bytes，0 表示不限制）时按最近使用时间淘汰对象，
+        直到降到容量的90%，返回 (淘汰的对象数, 释放的字节数)
+
+        最近 RESOURCE_STORE_GRACE_SECONDS 内用过的对象不淘汰。选出、删除记录和删除文件都在
+        同一个写事务中完成，其他进程的查询和存入要等淘汰结束后才能更新使用时间。
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if not max_bytes or self.total_bytes() <= max_bytes:
+            return 0, 0
+        victims = []
+        freed = 0
+        with self._lock, self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            # 取得写锁之后重新读取，其他进程可能刚淘汰过
+            total = self._db.execute('SELECT total_bytes FROM store_stats').fetchone()[0]
+            if total <= max_bytes:
+                return 0, 0
+            rows = self._db.execute(
+                'SELECT digest, ext, size FROM objects WHERE accessed_at < ? ORDER BY accessed_at',
+                (time.time() - RESOURCE_STORE_GRACE_SECONDS,)
+            )
+            for digest, ext, size in rows:
+                if total - freed <= max_bytes * 0.9:
+                    break
+                victims.append((digest, ext))
+                freed += size
+            self._db.executemany('DELETE FROM objects WHERE digest = ? AND ext = ?', victims)
+            self._db.executemany('DELETE FROM url_index WHERE digest = ? AND ext = ?', victims)
+            for digest, ext in victims:
+                path = self.object_path(digest, ext)
+                try:
+                    # Windows 上不能直接删除只读文件
+                    os.chmod(path, 0o644)
+                except OSError:
+                    pass
+                _remove_quietly(path)
+        return len(victims), freed
+
+    def gc(self, max_bytes=None):
+        """整理仓库：登记旧版本留下的未记录对象，删除指向缺失对象的索引和残留的临时文件，
+        然后按容量淘汰，返回统计信息"""
+        with self._lock:
+            known = set(self._db.execute('SELECT digest, ext FROM objects').fetchall())
+        found = set()
+        untracked = []
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                digest, ext = os.path.splitext(name)
+                path = os.path.join(dirpath, name)
+                found.add((digest, ext))
+                if (digest, ext) not in known:
+                    stat = os.stat(path)
+                    untracked.append((digest, ext, stat.st_size, stat.st_mtime))
+                    # 旧版本存入的对象是可写的
+                    os.chmod(path, 0o444)
+        missing = known - found
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR IGNORE INTO objects (digest, ext, size, accessed_at) VALUES (?, ?, ?, ?)', untracked
+            )
+            self._db.executemany('DELETE FROM objects WHERE digest = ? AND ext = ?', missing)
+            indexed = self._db.execute('SELECT DISTINCT digest, ext FROM url_index').fetchall()
+            dangling = [key for key in indexed if key not in found]
+            self._db.executemany('DELETE FROM url_index WHERE digest = ? AND ext = ?', dangling)
+            # 重新统计总大小，修正旧版本或中断留下的偏差
+            self._db.execute('UPDATE store_stats SET total_bytes = (SELECT COALESCE(SUM(size), 0) FROM objects)')
+        # 进程中断时留下的临时文件，一小时前的才删除，避免影响正在进行的下载
+        stale = 0
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
             try:
-                format_match = re.search(r'data:image/([a-zA-Z]+);base64', url)
-                if format_match:
-                    img_format = format_match.group(1).lower()
-                    if img_format in ['jpeg', 'jpg', 'png', 'gif', 'webp', 'svg']:
-                        base_filename += f".{img_format}"
-                    else:
-                        base_filename += ".png"
-                else:
-                    base_filename += ".png"
-            except:
-                base_filename += ".png"
+                if os.path.getmtime(path) < time.time() - 3600:
+                    os.remove(path)
+                    stale += 1
+            except OSError:
+                pass
+        removed, freed = self.prune(max_bytes)
+        with self._lock:
+            count, total = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+        return {
+            'objects': count,
+            'bytes': total,
+            'untracked_added': len(untracked),
+            'index_removed': len(dangling),
+            'temp_removed': stale,
+            'evicted': removed,
+            'evicted_bytes': freed,
+        }
+
+    def add_bytes(self, url, data, ext):
+        """把已经取得的图片内容存入仓库并记录URL，返回哈希"""
+        fd, temp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            digest = self.add_file(temp_path, ext)
+        except BaseException:
+            _remove_quietly(temp_path)
+            raise
+        self.remember(url, digest, ext)
+        return digest
+
+    def fetch(self, url, ext, driver=None):
+        """获取图片并存入仓库，返回 (哈希, 扩展名)，失败返回 None"""
+        try:
+            return self.fetch_outcome(url, ext, driver)[0]
+        except Exception:
+            return None
+
+    def fetch_outcome(self, url, ext, driver=None):
+        """获取图片并存入仓库，返回 ((哈希, 扩展名), 是否命中索引)，失败时抛出异常"""
+        # 网络图片先查索引，命中时完全跳过网络请求
+        is_remote = url.startswith(('http://', 'https://'))
+        if is_remote:
+            hit = self.lookup(url)
+            if hit:
+                metrics.count('image_store_hits')
+                return hit, True
                 
-            filename = base_filename
-            
-        else:
-            # 处理微信图片链接
-            if 'mmbiz.qpic.cn' in url:
-                # 使用图片ID（如果有）和位置信息生成文件名
-                if img_id:
-                    filename = f"wx_img_{img_id}_{position_counter}.png"
-                else:
-                    # 从URL中提取文件名部分
-                    url_parts = url.split('/')
-                    if len(url_parts) > 0:
-                        wx_filename = url_parts[-1].split('?')[0]
-                        filename = f"wx_img_{wx_filename}_{position_counter}.png"
-                    else:
-                        filename = f"wx_img_{position_counter}.png"
-            else:
-                # 处理其他URL
-                if not url.startswith(('http://', 'https://')):
-                    url = os.path.join(base_path, url)
-                    
-                # 生成文件名，包含位置信息
-                original_filename = clean_filename(url)
-                name, ext = os.path.splitext(original_filename)
-                filename = f"{name}_{position_counter}{ext}"
-            
-        # 保存路径
-        save_path = os.path.join(resources_dir, filename)
-        
-        # 如果这个URL和位置的组合之前处理过，直接返回映射的文件名
-        mapping_key = f"{url}_{position_counter}"
-        if mapping_key in image_mappings:
-            return image_mappings[mapping_key]
+        fd, temp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        try:
+            with metrics.stage('image_download'):
+                fetch_image_file(url, temp_path)
+        except BaseException:
+            metrics.count('images_failed')
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        metrics.count('images_downloaded')
             
-        # 下载图片
-        if download_image(url, save_path):
-            image_mappings[mapping_key] = filename
+        digest = self.add_file(temp_path, ext)
+        if is_remote:
+            self.remember(url, digest, ext)
+        return (digest, ext), False
+
+    def link_into(self, digest, ext, resources_dir):
+        """把仓库中的对象硬链接到 resources 目录，返回文件名
+
+        硬链接与仓库共用同一份只读数据；需要修改图片时应先复制一份再编辑。
+        """
+        filename = f"{digest[:16]}{ext}"
+        dest = os.path.join(resources_dir, filename)
+        if not os.path.exists(dest):
+            object_path = self.object_path(digest, ext)
+            try:
+                # 旧版本存入的对象是可写的，链接前改为只读
+                os.chmod(object_path, 0o444)
+                os.link(object_path, dest)
+            except FileExistsError:
+                pass
+            except OSError:
+                # 跨文件系统或不支持硬链接时退回复制，先复制到临时文件再重命名；复制出的文件不共享，可以写
+                temp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.part"
+                shutil.copy2(object_path, temp_path)
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, dest)
         return filename
+
+def get_resource_store(root=None):
+    """返回指定目录（默认 RESOURCE_STORE_DIR）对应的共享图片仓库"""
+    root = os.path.abspath(root or RESOURCE_STORE_DIR)
+    with _resource_stores_lock:
+        store = _resource_stores.get(root)
+        if store is None:
+            store = ResourceStore(root)
+            _resource_stores[root] = store
+    return store
+
+def get_image_extension(url):
+    """根据图片URL推断保存时使用的扩展名"""
+    # 处理base64编码的图片
+    if url.startswith('data:image'):
+        format_match = re.search(r'data:image/([a-zA-Z]+);base64', url)
+        if format_match:
+            img_format = format_match.group(1).lower()
+            if img_format in ['jpeg', 'jpg', 'png', 'gif', 'webp', 'svg']:
+                return f".{img_format}"
+        return ".png"
+    # 处理微信图片链接
+    if 'mmbiz.qpic.cn' in url:
+        return ".png"
+    return os.path.splitext(clean_filename(url))[1]
+
+class ImageOutcome:
+    """一张图片的处理结果，status 为 downloaded（已下载）、stored（图片仓库命中）或 failed"""
+    __slots__ = ('url', 'status', 'filename', 'bytes', 'duration', 'error')
+
+    def __init__(self, url, status, filename=None, bytes=0, duration=0.0, error=''):
+        self.url = url
+        self.status = status
+        self.filename = filename  # resources 目录中的文件名
+        self.bytes = bytes
+        self.duration = duration
+        self.error = error
+
+    def to_dict(self):
+        # data URI 可能很长，只保留开头
+        url = self.url if not self.url.startswith('data:') else self.url[:64] + '...'
+        return {
+            'url': url,
+            'status': self.status,
+            'filename': self.filename,
+            'bytes': self.bytes,
+            'duration': round(self.duration, 6),
+            'error': self.error,
+        }
+
+    def __repr__(self):
+        return f"ImageOutcome({self.url[:80]!r}, {self.status!r})"
+
+def fetch_image(url, resources_dir, store, driver=None):
+    """获取一张图片并链接到 resources 目录，返回 ImageOutcome"""
+    start = time.perf_counter()
+    ext = get_image_extension(url)
+    try:
+        (digest, ext), hit = store.fetch_outcome(url, ext, driver)
+        filename = store.link_into(digest, ext, resources_dir)
+        size = os.path.getsize(os.path.join(resources_dir, filename))
+    except Exception as e:
+        return ImageOutcome(url, 'failed', duration=time.perf_counter() - start, error=str(e) or type(e).__name__)
+    return ImageOutcome(url, 'stored' if hit else 'downloaded', filename, size, time.perf_counter() - start)
+
+def download_images(urls, resources_dir, store=None, driver=None, max_workers=IMAGE_DOWNLOAD_WORKERS):
+    """并发获取图片并链接到 resources 目录，返回 {URL: ImageOutcome}
+
+    提供 driver 时先通过浏览器获取网络图片，浏览器没有取到的再用HTTP下载。
+    """
+    if not urls:
+        return {}
+    store = store or get_resource_store()
+    if driver is not None:
+        fetch_images_in_browser(driver, urls, store)
+    workers = max(1, min(max_workers, len(urls)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 在调用方的上下文中执行，下载耗时计入当前转换的阶段统计
+        futures = {
+            url: executor.submit(contextvars.copy_context().run, fetch_image, url, resources_dir, store, driver)
+            for url in urls
+        }
+        return {url: future.result() for url, future in futures.items()}
+
+def rewrite_images(soup, base_path, resources_dir, driver=None, max_workers=IMAGE_DOWNLOAD_WORKERS, store=None):
+    """在已解析的文档树上处理所有图片，并发下载并原地更新链接，返回 [ImageOutcome]"""
+    targets = collect_images(soup, base_path)
+    outcomes = download_images(targets.urls, resources_dir, store, driver, max_workers)
+    targets.apply(outcomes)
+    return list(outcomes.values())
+
+class ImageTargets:
+    """文档中引用图片的位置：<img> 标签和 background-image 样式"""
+
+    def __init__(self, img_targets, style_targets):
+        self.img_targets = img_targets  # (img标签, 原始地址, 图片URL)
+        self.style_targets = style_targets  # (元素, [(样式中的原始URL, 图片URL)])
+        # 去重后的图片URL，按出现顺序
+        self.urls = list(dict.fromkeys(
+            [url for _, _, url in img_targets] +
+            [url for _, urls in style_targets for _, url in urls]
+        ))
+
+    def apply(self, outcomes):
+        """按 {URL: ImageOutcome} 更新链接，下载失败的图片保留原始地址"""
+        filenames = {url: outcome.filename for url, outcome in outcomes.items()}
+        for img, original, url in self.img_targets:
+            filename = filenames.get(url)
+            img['src'] = f'./resources/{filename}' if filename else original
+        for elem, urls in self.style_targets:
+            style = elem['style']
+            for original, url in urls:
+                filename = filenames.get(url)
+                if filename:
+                    style = style.replace(original, f'./resources/{filename}')
+            elem['style'] = style
+
+def collect_images(soup, base_path):
+    """收集文档中所有图片的位置和URL"""
+
+    def resolve_image_url(url):
+        """把相对路径的本地图片转换为绝对路径"""
+        if url.startswith('data:image') or 'mmbiz.qpic.cn' in url:
+            return url
+        if not url.startswith(('http://', 'https://')):
+            return os.path.join(base_path, url)
+        return url
+
+    img_targets = []  # (img标签, 原始地址, 图片URL)
+    style_targets = []  # (元素, [(样式中的原始URL, 图片URL)])
     
     # 处理<img>标签
     for img in soup.find_all('img'):
         src = img.get('src', '')
         data_src = img.get('data-src', '')  # 获取data-src属性
-        alt = img.get('alt', '')
-        img_id = img.get('data-imgfileid', '')  # 获取微信图片ID
         
         # 优先使用data-src
         if data_src:
-            filename = process_image_url(data_src, alt, img_id)
-            if filename:
-                img['src'] = f'./resources/{filename}'
+            img_targets.append((img, data_src, resolve_image_url(data_src)))
         elif src and not src.startswith('data:image/svg+xml'):  # 忽略SVG占位图
-            filename = process_image_url(src, alt, img_id)
-            if filename:
-                img['src'] = f'./resources/{filename}'
+            img_targets.append((img, src, resolve_image_url(src)))
                 
     # 处理背景图片
     for elem in soup.find_all(lambda tag: tag.get('style') and 'background-image' in tag.get('style', '')):
-        style = elem['style']
-        urls = re.findall(r'url\([\'"]?(.*?)[\'"]?\)', style)
-        for url in urls:
-            filename = process_image_url(url)
-            if filename:
-                style = style.replace(url, f'./resources/{filename}')
-                elem['style'] = style
+        urls = re.findall(r'url\([\'"]?(.*?)[\'"]?\)', elem['style'])
+        urls = [(url, resolve_image_url(url)) for url in urls if url]
+        if urls:
+            style_targets.append((elem, urls))
 
+    return ImageTargets(img_targets, style_targets)
+
+def process_images(html_content, html_file_path, resources_dir, driver=None):
+    """处理HTML中的所有图片，下载并更新链接"""
+    soup = parse_html(html_content)
+    base_path = os.path.dirname(os.path.abspath(html_file_path))
+    rewrite_images(soup, base_path, resources_dir, driver)
     return str(soup)
 
 def get_chrome_driver():
     """配置并返回Chrome WebDriver"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
     chrome_options = Options()
     chrome_options.add_argument('--headless=new')  # 新版本的无界面模式
     chrome_options.add_argument('--disable-gpu')
@@ -235,6 +1269,9 @@ def get_chrome_driver():
     chrome_options.add_argument('--disable-d3d11')  # 禁用D3D11
     chrome_options.add_argument('--disable-gpu-compositing')  # 禁用GPU合成
     
+    # DOMContentLoaded 后即返回，之后按网站的就绪条件等待
+    chrome_options.page_load_strategy = 'eager'
+    
     # 添加实验性选项
     chrome_options.add_experimental_option('excludeSwitches', [
         'enable-automation',  # 禁用自动化提示
@@ -275,7 +1312,8 @@ def get_chrome_driver():
         os.environ['WDM_PRINT_FIRST_LINE'] = 'False'
         
         # 创建 WebDriver
-        driver = webdriver.Chrome(options=chrome_options)
+        with metrics.stage('driver_start'):
+            driver = webdriver.Chrome(options=chrome_options)
         
         # 设置页面加载超时时间
         driver.set_page_load_timeout(30)
@@ -284,447 +1322,2833 @@ def get_chrome_driver():
         
         return driver
     except Exception as e:
-        print(f"创建Chrome WebDriver失败: {str(e)}")
+        metrics.count('driver_failures')
+        logger.error(f"创建Chrome WebDriver失败: {str(e)}")
         return None
 
-def download_html_from_url(url):
-    """从URL下载HTML内容"""
-    try:
-        # 检查是否是微信公众号文章
-        if 'mp.weixin.qq.com' in url:
-            print("检测到微信公众号文章，使用requests获取内容...")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Cache-Control': 'max-age=0'
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            return response.text
-        else:
-            # 使用Selenium获取其他网站的内容
-            print("使用Selenium获取页面内容...")
+class ChromeDriverPool:
+    """可复用的无界面Chrome会话池，避免每个URL都冷启动浏览器"""
+
+    def __init__(self, size=2, max_pages=50):
+        self.size = size
+        self.max_pages = max_pages  # 每个会话处理多少个页面后回收重建
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+        self._pages = {}  # 会话 -> 已处理页面数
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self):
+        """取出一个空闲会话，没有空闲会话时在池容量内新建"""
+        if self._closed:
+            raise RuntimeError("WebDriver池已关闭")
+        self._slots.acquire()
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            logger.info("启动新的Chrome会话...")
             driver = get_chrome_driver()
-            if not driver:
+            if driver is None:
+                self._slots.release()
                 return None
-                
-            print(f"正在访问页面: {url}")
-            driver.get(url)
-            
-            # 等待页面加载完成
-            print("等待页面加载...")
-            time.sleep(3)  # 基础等待时间
-            
-            # 对于CSDN文章，等待特定元素并处理
-            if 'csdn.net' in url:
-                try:
-                    # 等待文章主体内容加载
-                    WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.ID, "content_views"))
-                    )
-                    
-                    # 展开阅读全文
-                    try:
-                        read_more = driver.find_element(By.CLASS_NAME, "hide-article-box")
-                        if read_more:
-                            driver.execute_script("arguments[0].remove()", read_more)
-                    except:
-                        pass
-                        
-                    # 尝试移除登录弹窗
-                    try:
-                        driver.execute_script("""
-                            var elements = document.getElementsByClassName('passport-login-container');
-                            for (var i = 0; i < elements.length; i++) {
-                                elements[i].remove();
-                            }
-                        """)
-                    except:
-                        pass
-                        
-                except Exception as e:
-                    print(f"等待CSDN元素时出错: {str(e)}")
-                    
-            # 获取页面内容
-            print("获取页面内容...")
-            html_content = driver.page_source
-            
-            # 关闭浏览器
+            with self._lock:
+                self._pages[driver] = 0
+        return driver
+
+    def release(self, driver, broken=False):
+        """归还会话，出错或达到页面上限的会话会被关闭"""
+        with self._lock:
+            self._pages[driver] = self._pages.get(driver, 0) + 1
+            recycle = broken or self._closed or self._pages[driver] >= self.max_pages
+            if recycle:
+                self._pages.pop(driver, None)
+        if recycle:
+            self._quit(driver)
+        else:
+            self._idle.put(driver)
+        self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        """以上下文管理器的方式借用会话，发生异常时视为会话已损坏"""
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            if driver is not None:
+                self.release(driver, broken)
+
+    def close(self):
+        """关闭池中所有空闲会话，借出的会话归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._pages.pop(driver, None)
+            self._quit(driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
             driver.quit()
-            print("已关闭浏览器")
-            
-            return html_content
-            
-    except Exception as e:
-        print(f"下载HTML内容失败: {str(e)}")
-        return None
+        except Exception:
+            pass
 
-def process_html_content(html_content):
-    """处理HTML内容，根据不同网站进行特殊处理"""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    metadata = {
-        'title': '',
-        'author': '',
-        'created': '',
-        'updated': ''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def get_wait_profile(url):
+    """根据URL返回对应网站的页面就绪条件"""
+    hostname = urlparse(url).hostname or ''
+    for domain, profile in PAGE_WAIT_PROFILES.items():
+        if hostname == domain or hostname.endswith('.' + domain):
+            return {**DEFAULT_WAIT_PROFILE, **profile}
+    return dict(DEFAULT_WAIT_PROFILE)
+
+def block_page_resources(driver, patterns=BLOCKED_RESOURCE_PATTERNS):
+    """通过Chrome DevTools协议拦截图片、字体和媒体请求，只抓取HTML时无需加载它们"""
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+        return True
+    except Exception:
+        # 非Chromium内核的浏览器不支持CDP，忽略即可
+        return False
+
+# 返回页面已发出的资源请求数。performance.getEntriesByType('resource') 默认最多只保存250条，
+# 资源多的页面达到上限后数量不再增加，会被误判为网络空闲；因此首次调用时放大缓冲区，
+# 并用 PerformanceObserver 计数（观察者不受缓冲区大小限制），浏览器不支持时退回读取缓冲区
+RESOURCE_COUNT_SCRIPT = """
+if (!('__html2mdResources' in window)) {
+    if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(100000);
+    window.__html2mdResources = performance.getEntriesByType('resource').length;
+    try {
+        new PerformanceObserver(function (list) {
+            window.__html2mdResources += list.getEntries().length;
+        }).observe({type: 'resource'});
+    } catch (e) {
+        window.__html2mdResources = null;
     }
+}
+return window.__html2mdResources === null
+    ? performance.getEntriesByType('resource').length
+    : window.__html2mdResources;
+"""
+
+def wait_for_page_ready(driver, profile):
+    """按照就绪条件等待页面，超时后不报错，直接使用当前页面内容"""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    deadline = time.monotonic() + profile['timeout']
+    ready_states = ('complete',) if profile['ready_state'] == 'complete' else ('interactive', 'complete')
     
-    # 检测是否是知乎专栏文章
-    zhihu_header = soup.find('div', class_="ColumnPageHeader-content")
-    if zhihu_header:
-        print("检测到知乎专栏文章，提取文章主体内容...")
-        
-        # 提取标题
-        title_elem = soup.find('h1', class_="Post-Title")
-        if title_elem:
-            metadata['title'] = title_elem.get_text().strip()
-            print(f"文章标题: {metadata['title']}")
-            
-        # 提取作者
-        author_elem = soup.find('a', class_="UserLink-link")
-        if author_elem:
-            metadata['author'] = author_elem.get_text().strip()
-            print(f"作者: {metadata['author']}")
-            
-        # 提取发布时间
-        time_elem = soup.find('div', class_="ContentItem-time")
-        if time_elem:
-            time_text = time_elem.get_text().strip()
-            # 提取时间字符串
-            time_match = re.search(r'发布于 ([\d-]+ [\d:]+)', time_text)
-            if time_match:
-                time_str = time_match.group(1)
-                try:
-                    from datetime import datetime
-                    dt = datetime.strptime(time_str, '%Y-%m-%d %H:%M')
-                    formatted_time = dt.strftime('%Y-%m-%dT%H:%M:%S')
-                    metadata['created'] = formatted_time
-                    metadata['updated'] = formatted_time
-                    print(f"发布时间: {time_str}")
-                except Exception:
-                    metadata['created'] = time_str
-                    metadata['updated'] = time_str
-                    
-        # 查找文章主体内容
-        article_content = soup.find('div', class_="RichText ztext Post-RichText css-ob6uua")
-        if article_content:
-            print("找到文章主体内容，开始处理...")
-            
-            # 处理图片链接
-            for img in article_content.find_all('img'):
-                # 优先使用原始图片链接
-                src = img.get('data-original') or img.get('src', '')
-                if src:
-                    # 如果是相对路径，转换为绝对路径
-                    if not src.startswith(('http://', 'https://')):
-                        if src.startswith('//'):
-                            src = 'https:' + src
-                        else:
-                            src = 'https://www.zhihu.com' + (src if src.startswith('/') else '/' + src)
-                    img['src'] = src
-                    
-            # 创建新的HTML文档
-            new_soup = BeautifulSoup('<html><body></body></html>', 'html.parser')
-            new_soup.body.append(article_content)
-            print("已提取文章主体内容，处理完成")
-            
-            return str(new_soup), metadata
-        else:
-            print("未找到文章主体内容，将处理整个页面")
-            
-    # 检测是否是CSDN文章
-    csdn_logo = soup.find('img', title="CSDN首页")
-    if csdn_logo:
-        print("检测到CSDN文章，提取文章主体内容...")
+    def remaining():
+        return max(0.1, deadline - time.monotonic())
+    
+    try:
+        # 等待文档加载状态
+        WebDriverWait(driver, remaining(), poll_frequency=0.1).until(
+            lambda d: d.execute_script("return document.readyState") in ready_states
+        )
         
-        # 提取标题
-        title_elem = soup.find('h1', class_="title-article")
-        if title_elem:
-            metadata['title'] = title_elem.get_text().strip()
-            print(f"文章标题: {metadata['title']}")
-            
-        # 提取发布时间
-        time_elem = soup.find('span', class_="time")
-        if time_elem:
-            time_str = time_elem.get('data-time', '')
-            if time_str:
-                # 转换时间格式为ISO 8601
-                try:
-                    from datetime import datetime
-                    dt = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-                    formatted_time = dt.strftime('%Y-%m-%dT%H:%M:%S')
-                    metadata['created'] = formatted_time
-                    metadata['updated'] = formatted_time
-                    print(f"发布时间: {time_str}")
-                except Exception:
-                    metadata['created'] = time_str
-                    metadata['updated'] = time_str
-                
-        # 提取作者
-        author_elem = soup.find('a', class_="follow-nickName")
-        if author_elem:
-            metadata['author'] = author_elem.get_text().strip()
-            print(f"作者: {metadata['author']}")
-            
-        # 查找文章主体内容
-        article_content = soup.find('div', id="content_views")
-        if not article_content:
-            article_content = soup.find('div', class_="blog-content-box")
+        # 等待文章主体元素出现
+        if profile['selector']:
+            WebDriverWait(driver, remaining(), poll_frequency=0.1).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, profile['selector']))
+            )
             
-        if article_content:
-            print("找到文章主体内容，开始处理...")
-            
-            # 需要移除的元素选择器列表
-            elements_to_remove = [
-                {'class': 'article-info-box'},  # 文章信息框
-                {'id': 'blogColumnPayAdvert'},  # 付费专栏广告
-                {'class': 'recommend-box'},  # 推荐阅读
-                {'class': 'article-copyright'},  # 版权信息
-                {'class': 'article-footer-copyright'},  # 底部版权
-                {'class': 'comment-box'},  # 评论区
-                {'class': 'template-box'},  # 模板区域
-                {'class': 'hide-article-box'},  # 隐藏文章提示
-                {'id': 'marketingBox'},  # 营销广告框
-                {'class': 'csdn-side-toolbar'},  # 侧边工具栏
-                {'id': 'toolBarBox'},  # 工具栏
-                {'class': 'blog-tags-box'},  # 标签区域
-                {'class': 'article-info-box'},  # 文章信息框
-                {'class': 'article-bar-top'},  # 顶部工具栏
-                {'class': 'blog-tags-box'},  # 博客标签
-                {'class': 'operating'},  # 操作按钮
-                {'id': 'csdn-shop-window-top'},  # 顶部商店窗口
-                {'id': 'csdn-shop-window'},  # 商店窗口
-                {'class': 'more-toolbox'},  # 更多工具箱
-                {'class': 'person-messagebox'},  # 个人消息框
-            ]
-            
-            # 移除所有指定的元素
-            for selector in elements_to_remove:
-                elements = article_content.find_all(**selector)
-                for element in elements:
-                    element.decompose()
-                    
-            # 处理图片链接
-            for img in article_content.find_all('img'):
-                # 优先使用data-src属性
-                src = img.get('data-src') or img.get('src', '')
-                if src:
-                    # 如果是相对路径，转换为绝对路径
-                    if not src.startswith(('http://', 'https://')):
-                        if src.startswith('//'):
-                            src = 'https:' + src
-                        else:
-                            src = 'https://blog.csdn.net' + (src if src.startswith('/') else '/' + src)
-                    img['src'] = src
-                    
-            # 创建新的HTML文档
-            new_soup = BeautifulSoup('<html><body></body></html>', 'html.parser')
-            new_soup.body.append(article_content)
-            print("已移除无关内容，处理完成")
-            
-            return str(new_soup), metadata
-        else:
-            print("未找到文章主体内容，将处理整个页面")
-            
-    return html_content, {}
+        # 等待网络空闲：资源请求数在 network_idle 秒内不再增加
+        if profile['network_idle']:
+            last_count = -1
+            idle_since = time.monotonic()
+            while time.monotonic() < deadline:
+                count = driver.execute_script(RESOURCE_COUNT_SCRIPT)
+                if count != last_count:
+                    last_count = count
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since >= profile['network_idle']:
+                    break
+                time.sleep(0.1)
+        return True
+    except TimeoutException:
+        logger.warning(f"等待页面就绪超时（{profile['timeout']}秒），使用当前页面内容")
+        return False
 
-def convert_url_to_md(url, output_dir=None):
-    """将URL转换为Markdown"""
+def remove_page_elements(driver, selectors):
+    """在页面中移除登录弹窗、“阅读全文”遮罩等元素"""
+    if not selectors:
+        return
     try:
-        # 如果未提供输出目录，使用当前目录
-        if output_dir is None:
-            output_dir = os.getcwd()
-            
-        # 下载HTML内容
-        html_content = download_html_from_url(url)
-        if not html_content:
+        driver.execute_script("""
+            arguments[0].forEach(function (selector) {
+                document.querySelectorAll(selector).forEach(function (element) {
+                    element.remove();
+                });
+            });
+        """, list(selectors))
+    except Exception:
+        pass
+
+# 在页面中按网站规则（SiteRules.browser_spec）提取文章：找到第一个识别出的、需要提取正文的规则，
+# 返回识别标记和元数据元素的 outerHTML、删除无关元素后的正文 outerHTML，以及按规则补全的图片地址；
+# 没有匹配的规则时返回 null
+BROWSER_EXTRACT_SCRIPT = r"""
+var rules = arguments[0];
+function first(selectors) {
+    for (var i = 0; i < selectors.length; i++) {
+        try {
+            var element = document.querySelector(selectors[i]);
+            if (element) return element;
+        } catch (e) {}
+    }
+    return null;
+}
+function imageUrl(img, fixups) {
+    for (var i = 0; i < fixups.length; i++) {
+        var fixup = fixups[i];
+        try {
+            if (fixup.attr !== 'src' || !img.matches(fixup.select)) continue;
+        } catch (e) {
+            continue;
+        }
+        for (var j = 0; j < fixup.sources.length; j++) {
+            var url = img.getAttribute(fixup.sources[j]);
+            if (!url) continue;
+            if (/^https?:\/\//.test(url)) return url;
+            if (url.indexOf('//') === 0) return 'https:' + url;
+            return fixup.base + (url.charAt(0) === '/' ? url : '/' + url);
+        }
+        break;
+    }
+    return img.getAttribute('src');
+}
+for (var i = 0; i < rules.length; i++) {
+    var rule = rules[i];
+    var marker = first(rule.detect);
+    if (!marker || !rule.extract) continue;
+    var root = first(rule.content);
+    if (!root) continue;
+    var parts = [marker];
+    Object.keys(rule.metadata).forEach(function (field) {
+        var element = first([rule.metadata[field]]);
+        if (element && parts.indexOf(element) < 0) parts.push(element);
+    });
+    // 互相包含的识别标记和元数据元素只保留外层的
+    parts = parts.filter(function (element) {
+        return !parts.some(function (other) { return other !== element && other.contains(element); });
+    });
+    var content = root.cloneNode(true);
+    rule.remove.forEach(function (selector) {
+        try {
+            content.querySelectorAll(selector).forEach(function (element) { element.remove(); });
+        } catch (e) {}
+    });
+    var images = [];
+    content.querySelectorAll('img').forEach(function (img) {
+        var url = imageUrl(img, rule.fixups);
+        if (url && url.indexOf('data:') !== 0 && images.indexOf(url) < 0) images.push(url);
+    });
+    return JSON.stringify({
+        rule: rule.name,
+        url: location.href,
+        parts: parts.map(function (element) { return element.outerHTML; }),
+        content: content.outerHTML,
+        images: images
+    });
+}
+return null;
+"""
+
+class BrowserCapture:
+    """在浏览器中提取的文章：rule 为网站规则名，html 为只含识别标记、元数据元素和正文的精简文档，
+    images 为正文中图片的绝对地址"""
+
+    __slots__ = ('rule', 'url', 'html', 'images')
+
+    def __init__(self, payload):
+        self.rule = payload['rule']
+        self.url = payload['url']
+        # 元数据元素放在正文前面，扫描时先于正文中的同名元素被找到
+        self.html = '<html><body>\n' + '\n'.join([*payload['parts'], payload['content']]) + '\n</body></html>'
+        self.images = payload['images']
+
+def extract_in_browser(driver):
+    """在页面中运行 BROWSER_EXTRACT_SCRIPT，返回 BrowserCapture，没有识别出文章时返回 None"""
+    with metrics.stage('browser_extract'):
+        try:
+            payload = driver.execute_script(BROWSER_EXTRACT_SCRIPT, get_site_rules().browser_spec())
+        except Exception as e:
+            logger.warning(f"在浏览器中提取文章失败: {e}")
             return None
-            
-        # 处理HTML内容
-        html_content, metadata = process_html_content(html_content)
-            
-        # 创建临时HTML文件，使用UTF-8编码保存
-        temp_html_file = os.path.join(output_dir, "temp.html")
-        with open(temp_html_file, "w", encoding="utf-8") as f:
-            f.write(html_content)
-            
-        # 检查是否是微信公众号文章并获取标题
-        soup = BeautifulSoup(html_content, 'html.parser')
-        is_wechat = bool(soup.find('div', class_=lambda x: x and 'rich_media_area_primary' in x))
-        title = ''
+    if not payload:
+        return None
+    metrics.count('bytes_fetched', len(payload.encode('utf-8')))
+    capture = BrowserCapture(json.loads(payload))
+    metrics.count('browser_extractions')
+    logger.info(f"已在浏览器中提取文章主体（{len(payload)} 字符，{len(capture.images)} 张图片）")
+    return capture
+
+# 在页面中用 fetch() 并发获取一批图片，带上页面的Cookie和Referer，
+# 返回 [[URL, base64内容或null, 错误信息或null]] 的JSON
+BROWSER_FETCH_IMAGES_SCRIPT = """
+var urls = arguments[0], maxBytes = arguments[1], done = arguments[arguments.length - 1];
+function encode(buffer) {
+    var bytes = new Uint8Array(buffer), chunks = [];
+    for (var i = 0; i < bytes.length; i += 0x8000) {
+        chunks.push(String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000)));
+    }
+    return btoa(chunks.join(''));
+}
+Promise.all(urls.map(function (url) {
+    return fetch(url).then(function (response) {
+        if (!response.ok) throw new Error('HTTP ' + response.status);
+        if (maxBytes && Number(response.headers.get('Content-Length')) > maxBytes) throw new Error('too large');
+        return response.arrayBuffer();
+    }).then(function (buffer) {
+        if (maxBytes && buffer.byteLength > maxBytes) throw new Error('too large');
+        return [url, encode(buffer), null];
+    }).catch(function (e) {
+        return [url, null, String(e)];
+    });
+})).then(function (results) {
+    done(JSON.stringify(results));
+});
+"""
+
+def fetch_images_in_browser(driver, urls, store=None):
+    """通过浏览器获取网络图片并存入图片仓库，返回取到的URL集合
+
+    仓库中已有的URL直接跳过。浏览器没有取到的图片（例如跨域且没有CORS响应头）不报错，
+    之后按普通HTTP下载。
+    """
+    store = store or get_resource_store()
+    urls = [url for url in dict.fromkeys(urls)
+            if url.startswith(('http://', 'https://')) and store.lookup(url) is None]
+    if not urls:
+        return set()
+    fetched = set()
+    with metrics.stage('browser_images'):
+        try:
+            # 抓取页面时拦截了图片请求，页面中的 fetch() 同样会被拦截
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+        except Exception:
+            pass
+        for start in range(0, len(urls), BROWSER_IMAGE_BATCH):
+            batch = urls[start:start + BROWSER_IMAGE_BATCH]
+            try:
+                results = json.loads(driver.execute_async_script(BROWSER_FETCH_IMAGES_SCRIPT, batch, MAX_IMAGE_BYTES))
+            except Exception as e:
+                logger.warning(f"在浏览器中获取图片失败: {e}")
+                break
+            for url, data, error in results:
+                if data is None:
+                    logger.debug(f"浏览器未能获取图片 {url}: {error}")
+                    continue
+                content = base64.b64decode(data)
+                metrics.count('bytes_fetched', len(content))
+                try:
+                    store.add_bytes(url, content, get_image_extension(url))
+                except OSError as e:
+                    logger.warning(f"保存图片失败 {url}: {e}")
+                    continue
+                fetched.add(url)
+    metrics.count('images_from_browser', len(fetched))
+    metrics.count('browser_image_misses', len(urls) - len(fetched))
+    logger.info(f"通过浏览器获取了 {len(fetched)}/{len(urls)} 张图片")
+    return fetched
+
+def capture_page_source(driver, url):
+    """用给定的浏览器会话打开页面并返回渲染后的HTML"""
+    profile = get_wait_profile(url)
+    if profile['block_resources']:
+        block_page_resources(driver)
         
-        # 根据不同类型的文章决定文件名
-        if is_wechat:
-            title_elem = soup.find('h1', id='activity-name')
-            if title_elem:
-                title = title_elem.get_text().strip()
-                # 清理标题中的非法字符
-                title = re.sub(r'[\\/:*?"<>|]', '_', title)
-                # 如果标题太长，截取前50个字符
-                if len(title) > 50:
-                    title = title[:50]
-        elif metadata.get('title'):  # 使用CSDN文章标题
-            title = metadata['title']
-            # 清理标题中的非法字符
-            title = re.sub(r'[\\/:*?"<>|]', '_', title)
-            # 如果标题太长，截取前50个字符
-            if len(title) > 50:
-                title = title[:50]
+    logger.info(f"正在访问页面: {url}")
+    with metrics.stage('page_load'):
+        driver.get(url)
+    
+    # 按网站的就绪条件等待，而不是固定等待
+    logger.info("等待页面加载...")
+    with metrics.stage('page_wait'):
+        wait_for_page_ready(driver, profile)
+    
+    # 展开阅读全文，移除登录弹窗
+    remove_page_elements(driver, profile['remove_selectors'])
+
+    # 只传回文章部分，识别不出文章时再取整个页面
+    if profile['extract_in_browser']:
+        capture = extract_in_browser(driver)
+        if capture is not None:
+            # 趁浏览器会话还在，用页面的Cookie和Referer获取正文中的图片
+            if profile['browser_images'] and capture.images:
+                fetch_images_in_browser(driver, capture.images)
+            return capture.html
+            
+    # 获取页面内容
+    logger.info("获取页面内容...")
+    html_content = driver.page_source
+    metrics.count('bytes_fetched', len(html_content.encode('utf-8')))
+    return html_content
+
+def render_with_browser(url, driver_pool=None):
+    """使用Selenium获取页面内容，提供 driver_pool 时复用池中的浏览器会话"""
+    logger.info("使用Selenium获取页面内容...")
+    if driver_pool is not None:
+        # 从会话池借用浏览器，用完归还而不是关闭
+        with driver_pool.driver() as driver:
+            if not driver:
+                return None
+            return capture_page_source(driver, url)
+            
+    driver = get_chrome_driver()
+    if not driver:
+        return None
+    try:
+        return capture_page_source(driver, url)
+    finally:
+        # 关闭浏览器
+        driver.quit()
+        logger.info("已关闭浏览器")
+
+def download_html_from_url(url, driver_pool=None):
+    """从URL下载HTML内容，提供 driver_pool 时复用池中的浏览器会话，失败时返回 None"""
+    try:
+        return fetch_html(url, driver_pool)
+    except Exception as e:
+        logger.error(f"下载HTML内容失败: {str(e)}")
+        return None
+
+def fetch_html(url, driver_pool=None, result=None):
+    """从URL下载HTML内容，失败时抛出异常
+
+    获取页面的方式（cache、http 或 browser）记录到 result.fetch_tier 中。
+    """
+    return fetch_document(url, driver_pool, result)[0]
+
+def fetch_document(url, driver_pool=None, result=None):
+    """同 fetch_html，返回 (HTML内容, 文档树)
+
+    直接请求的页面在检查文章主体时已经解析过，返回解析好的文档树，转换时不必再次解析；
+    其他方式获取的页面文档树为 None。
+    """
+    with metrics.stage('fetch'):
+        try:
+            html_content, tier, soup = _download_html(url, driver_pool)
+            if not html_content:
+                raise ValueError("浏览器未能获取页面内容")
+        except Exception:
+            metrics.count('fetch_failures')
+            raise
+    metrics.count(f'fetch_tier_{tier}')
+    if result is not None:
+        result.fetch_tier = tier
+    return html_content, soup
+
+def _download_html(url, driver_pool):
+    """返回 (HTML内容, 获取方式, 文档树或 None)"""
+    # 检查是否是微信公众号文章
+    if 'mp.weixin.qq.com' in url:
+        logger.info("检测到微信公众号文章，使用requests获取内容...")
+        response = http_get(url, headers=PAGE_REQUEST_HEADERS, timeout=30)
+        response.raise_for_status()
+        return response.text, 'http', None
+        
+    # 浏览器渲染的页面按TTL缓存
+    cache = get_http_cache()
+    if cache is not None:
+        html_content = cache.get_rendered(url)
+        if html_content is not None:
+            metrics.count('page_cache_hits')
+            logger.info("使用缓存的页面内容")
+            return html_content, 'cache', None
+
+    # 服务器返回的HTML中已有完整正文时不需要浏览器
+    profile = get_wait_profile(url)
+    if profile['http_first']:
+        fetched = fetch_article_over_http(url, profile)
+        if fetched is not None:
+            return fetched[0], 'http', fetched[1]
+        metrics.count('http_tier_fallbacks')
+
+    if cache is not None and cache.offline:
+        raise CacheMissError(f"缓存中没有: {url}")
+            
+    html_content = render_with_browser(url, driver_pool)
+    if html_content and cache is not None:
+        cache.store_rendered(url, html_content)
+    return html_content, 'browser', None
+
+def fetch_article_over_http(url, profile):
+    """用普通HTTP请求获取页面，页面中有完整的文章主体时返回 (HTML, 文档树)，否则返回 None"""
+    logger.info("尝试直接请求页面...")
+    try:
+        with metrics.stage('http_tier'):
+            response = http_get(url, headers=PAGE_REQUEST_HEADERS, timeout=15)
+            response.raise_for_status()
+            html_content = response.text
+            soup = parse_html(html_content)
+            problem = check_article(soup, profile['truncated_selectors'])
+    except Exception as e:
+        logger.info(f"直接请求页面失败（{e}），改用浏览器")
+        return None
+    if problem:
+        logger.info(f"{problem}，改用浏览器")
+        return None
+    logger.info("直接请求的页面中已有文章主体，无需启动浏览器")
+    return html_content, soup
+
+def check_article(soup, truncated_selectors=()):
+    """检查文档树中能否按网站规则找到文章主体，返回问题描述，没有问题时返回 None"""
+    site_rules = get_site_rules()
+    found = site_rules.scan(soup)
+    rules = [rule for rule in site_rules.detected(found) if rule.extract]
+    if not rules:
+        return "未识别出文章页面"
+    if not any(site_rules.content_root(rule, found) is not None for rule in rules):
+        return "页面中没有文章主体"
+    if truncated_selectors:
+        markers = SelectorIndex()
+        for selector in truncated_selectors:
+            markers.add(Selector(selector), selector)
+        for node in iter_tags(soup):
+            matched = markers.match(node)
+            if matched:
+                return f"文章被折叠（{matched[0]}）"
+    return None
+
+_SELECTOR_RE = re.compile(r'([\w-]+|\*)?((?:#[\w-]+|\.[\w-]+|\[[\w-]+(?:=(?:"[^"]*"|\'[^\']*\'|[^\]]*))?\])*)')
+_SELECTOR_PART_RE = re.compile(r'#([\w-]+)|\.([\w-]+)|\[([\w-]+)(?:=("[^"]*"|\'[^\']*\'|[^\]]*))?\]')
+
+class Selector:
+    """简单选择器：标签名、#id、.class 和 [属性=值] 的组合，不支持层级关系"""
+
+    __slots__ = ('text', 'tag', 'id', 'classes', 'attrs')
+
+    def __init__(self, text):
+        self.text = text = text.strip()
+        match = _SELECTOR_RE.fullmatch(text)
+        if not text or not match:
+            raise ValueError(f"无法解析的选择器: {text}")
+        self.tag = match.group(1) if match.group(1) != '*' else None
+        self.id = None
+        classes = []
+        attrs = []
+        for ident, cls, attr, value in _SELECTOR_PART_RE.findall(match.group(2)):
+            if ident:
+                self.id = ident
+            elif cls:
+                classes.append(cls)
+            elif value:
+                attrs.append((attr, value.strip('"\'')))
+            else:
+                attrs.append((attr, None))
+        self.classes = frozenset(classes)
+        self.attrs = tuple(attrs)
+
+    def matches(self, node):
+        if self.tag and node.name != self.tag:
+            return False
+        if self.id and node.get('id') != self.id:
+            return False
+        if self.classes and not self.classes.issubset(node.get('class') or ()):
+            return False
+        for name, value in self.attrs:
+            actual = node.get(name)
+            if actual is None:
+                return False
+            if value is not None:
+                if isinstance(actual, list):
+                    actual = ' '.join(actual)
+                if actual != value:
+                    return False
+        return True
+
+    def __repr__(self):
+        return f'Selector({self.text!r})'
+
+class SelectorIndex:
+    """按 id、class、标签名给选择器建索引，每个节点只需检查少数候选选择器"""
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_class = {}
+        self._by_tag = {}
+        self._any = []
+
+    def add(self, selector, value):
+        """登记选择器，节点匹配时返回 value"""
+        if selector.id:
+            bucket = self._by_id.setdefault(selector.id, [])
+        elif selector.classes:
+            bucket = self._by_class.setdefault(min(selector.classes), [])
+        elif selector.tag:
+            bucket = self._by_tag.setdefault(selector.tag, [])
+        else:
+            bucket = self._any
+        bucket.append((selector, value))
+
+    def __bool__(self):
+        return bool(self._by_id or self._by_class or self._by_tag or self._any)
+
+    def match(self, node):
+        """返回所有与节点匹配的选择器登记的值"""
+        candidates = self._by_tag.get(node.name, ())
+        if self._any:
+            candidates = [*candidates, *self._any]
+        if self._by_id:
+            ident = node.get('id')
+            if ident in self._by_id:
+                candidates = [*candidates, *self._by_id[ident]]
+        if self._by_class:
+            for cls in node.get('class') or ():
+                if cls in self._by_class:
+                    candidates = [*candidates, *self._by_class[cls]]
+        return [value for selector, value in candidates if selector.matches(node)]
+
+def iter_tags(root, prune=None):
+    """按文档顺序遍历 root 下的所有元素，prune(node) 为真时跳过该元素的子节点"""
+    stack = [iter(root.children)]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+        elif isinstance(node, Tag):
+            yield node
+            if not (prune and prune(node)):
+                stack.append(iter(node.children))
+
+class UrlFixup:
+    """把元素的链接属性补全为绝对地址"""
+
+    def __init__(self, data):
+        self.attr = data.get('attr', 'src')
+        self.sources = data.get('sources') or [self.attr]
+        self.base = data['base'].rstrip('/')
+
+    def apply(self, node):
+        url = ''
+        for source in self.sources:
+            url = node.get(source) or ''
+            if url:
+                break
+        if not url:
+            return
+        # 如果是相对路径，转换为绝对路径
+        if not url.startswith(('http://', 'https://')):
+            if url.startswith('//'):
+                url = 'https:' + url
+            else:
+                url = self.base + (url if url.startswith('/') else '/' + url)
+        node[self.attr] = url
+
+class SiteRule:
+    """一个网站的提取规则，来自 site_rules 目录中的JSON文件"""
+
+    # 元数据字段及打印时使用的名称
+    FIELD_LABELS = {'title': '文章标题', 'author': '作者', 'created': '发布时间', 'updated': '更新时间'}
+
+    def __init__(self, data, source='<rule>'):
+        try:
+            self.name = data['name']
+            self.label = data.get('label', self.name)
+            self.priority = data.get('priority', 100)
+            self.detect = [Selector(text) for text in data['detect']]
+            self.metadata = {}
+            for field, spec in data.get('metadata', {}).items():
+                if field not in self.FIELD_LABELS:
+                    raise ValueError(f"未知的元数据字段: {field}")
+                spec = dict(spec)
+                spec['select'] = Selector(spec['select'])
+                spec['pattern'] = re.compile(spec['pattern']) if spec.get('pattern') else None
+                self.metadata[field] = spec
+            self.content = [Selector(text) for text in data.get('content', [])]
+            self.extract = data.get('extract', True)
+            # 正文内的清理规则编译为一个索引，一次遍历完成删除和链接修正
+            self.cleanup = SelectorIndex()
+            for text in dict.fromkeys(data.get('remove', [])):
+                self.cleanup.add(Selector(text), None)
+            fixups = []
+            for fixup in data.get('url_fixups', []):
+                fixups.append((Selector(fixup['select']), UrlFixup(fixup)))
+                self.cleanup.add(*fixups[-1])
+            self.removes = bool(data.get('remove'))
+        except (KeyError, TypeError, ValueError, re.error) as e:
+            raise ValueError(f"网站规则 {source} 无效: {e}") from e
+        # 在浏览器中提取正文时交给页面脚本的规则（见 BROWSER_EXTRACT_SCRIPT）
+        self.browser_spec = {
+            'name': self.name,
+            'extract': self.extract,
+            'detect': [selector.text for selector in self.detect],
+            'metadata': {field: spec['select'].text for field, spec in self.metadata.items()},
+            'content': [selector.text for selector in self.content],
+            'remove': list(dict.fromkeys(data.get('remove', []))),
+            'fixups': [
+                {'select': selector.text, 'attr': fixup.attr, 'sources': fixup.sources, 'base': fixup.base}
+                for selector, fixup in fixups
+            ],
+        }
+
+    def read_metadata(self, found, metadata):
+        """从扫描结果中读取元数据字段"""
+        for field, spec in self.metadata.items():
+            node = found.get(('metadata', self.name, field))
+            if node is None:
+                continue
+            value = node.get(spec['attr'], '') if spec.get('attr') else node.get_text().strip()
+            if value and spec['pattern']:
+                match = spec['pattern'].search(value)
+                value = match.group(1) if match else ''
+            if not value:
+                continue
+            shown = value
+            if spec.get('time_format'):
+                # 转换时间格式为ISO 8601
+                try:
+                    value = datetime.strptime(value, spec['time_format']).strftime('%Y-%m-%dT%H:%M:%S')
+                except ValueError:
+                    shown = None
+            for key in [field, *spec.get('copy_to', [])]:
+                metadata[key] = value
+            if shown is not None:
+                logger.info(f"{self.FIELD_LABELS[field]}: {shown}")
+
+    def clean(self, root):
+        """一次遍历正文：删除无关元素并修正链接"""
+        removed = []
+
+        def prune(node):
+            actions = self.cleanup.match(node)
+            if None in actions:
+                removed.append(node)
+                return True
+            for action in actions:
+                action.apply(node)
+            return False
+
+        for _ in iter_tags(root, prune):
+            pass
+        for node in removed:
+            node.decompose()
+
+class SiteRules:
+    """编译后的网站规则集，遍历一次页面即可完成网站识别、元数据和正文定位"""
+
+    def __init__(self, rules):
+        self.rules = sorted(rules, key=lambda rule: (rule.priority, rule.name))
+        self._index = SelectorIndex()
+        for rule in self.rules:
+            for selector in rule.detect:
+                self._index.add(selector, ('detect', rule.name))
+            for field, spec in rule.metadata.items():
+                self._index.add(spec['select'], ('metadata', rule.name, field))
+            for order, selector in enumerate(rule.content):
+                self._index.add(selector, ('content', rule.name, order))
+
+    def scan(self, soup):
+        """遍历页面，记录每个选择器的第一个匹配元素"""
+        found = {}
+        for node in iter_tags(soup):
+            for key in self._index.match(node):
+                if key not in found:
+                    found[key] = node
+        return found
+
+    def match_tag(self, node):
+        """返回与单个元素匹配的扫描键"""
+        return self._index.match(node)
+
+    def browser_spec(self):
+        """按优先级排列的规则，供 BROWSER_EXTRACT_SCRIPT 使用"""
+        return [rule.browser_spec for rule in self.rules]
+
+    def detected(self, found):
+        """按优先级返回页面匹配的规则"""
+        return [rule for rule in self.rules if ('detect', rule.name) in found]
+
+    def content_root(self, rule, found):
+        for order in range(len(rule.content)):
+            node = found.get(('content', rule.name, order))
+            if node is not None:
+                return node
+        return None
+
+def load_site_rules(paths=None):
+    """从规则目录加载并编译网站规则，后面目录中的同名规则覆盖前面的"""
+    rules = {}
+    for path in paths or SITE_RULES_DIRS:
+        if not os.path.isdir(path):
+            continue
+        for name in sorted(os.listdir(path)):
+            if not name.endswith('.json'):
+                continue
+            rule_file = os.path.join(path, name)
+            with open(rule_file, 'r', encoding='utf-8') as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"网站规则 {rule_file} 无效: {e}") from e
+            rule = SiteRule(data, rule_file)
+            rules[rule.name] = rule
+    return SiteRules(rules.values())
+
+def get_site_rules():
+    """返回编译好的网站规则，首次调用时加载"""
+    global _site_rules
+    with _site_rules_lock:
+        if _site_rules is None:
+            _site_rules = load_site_rules()
+        return _site_rules
+
+def configure_site_rules(paths=None):
+    """指定规则目录（默认内置规则加 HTML2MD_RULES），下次使用时重新加载"""
+    global _site_rules, SITE_RULES_DIRS
+    with _site_rules_lock:
+        if paths is not None:
+            SITE_RULES_DIRS = list(paths)
+        _site_rules = None
+
+_SLICE_TAG_RE = re.compile(rb'<(/?)([a-zA-Z][^\s/>]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+_SLICE_ATTR_RE = re.compile(rb'([^\s=/>"\']+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+_RAW_TEXT_END_RES = {
+    name: re.compile(rb'</' + name + rb'\s*>', re.I) for name in (b'script', b'style')
+}
+_VOID_ELEMENTS = frozenset([
+    b'area', b'base', b'br', b'col', b'embed', b'hr', b'img', b'input',
+    b'link', b'meta', b'source', b'track', b'wbr',
+])
+# 块末尾无法匹配的 < 最多等待这么多字节，超过后当作普通文本
+_MAX_TAG_BYTES = 256 * 1024
+
+class _SourceTag:
+    """扫描HTML源码时遇到的开始标签，提供选择器匹配所需的 name 和 get()，属性按需解析"""
+
+    __slots__ = ('name', '_raw', '_attrs')
+
+    def __init__(self, name, raw_attrs):
+        self.name = name
+        self._raw = raw_attrs
+        self._attrs = None
+
+    def get(self, name, default=None):
+        if self._attrs is None:
+            self._attrs = {}
+            for match in _SLICE_ATTR_RE.finditer(self._raw):
+                key = match.group(1).decode('utf-8', 'replace').lower()
+                value = next((group for group in match.groups()[1:] if group is not None), b'')
+                value = html.unescape(value.decode('utf-8', 'replace'))
+                self._attrs.setdefault(key, value.split() if key == 'class' else value)
+        return self._attrs.get(name, default)
+
+class ArticleSlicer:
+    """低内存模式：分块扫描HTML源码，找出网站规则用到的元素（识别标记、元数据和正文）的字节范围
+
+    不构建整页的文档树，内存占用只与块大小有关。元素的结束位置按同名标签的嵌套层数判断。
+    """
+
+    def __init__(self, site_rules):
+        self.site_rules = site_rules
+        self.found = set()
+        self.ranges = []  # [(起始偏移, 结束偏移)]
+        self._open = []  # 正在截取的元素：[标签名, 同名标签层数, 起始偏移]
+        self._raw_end = None  # 在 script/style 内时为对应结束标签的正则
+        self._in_comment = False
+
+    def feed(self, buf, base, final=False):
+        """扫描 buf（在文件中的起始偏移为 base），返回已处理的字节数，其余部分需要和下一块拼接"""
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            if self._in_comment:
+                close = buf.find(b'-->', pos)
+                if close < 0:
+                    return end if final else max(pos, end - 2)
+                self._in_comment = False
+                pos = close + 3
+                continue
+            if self._raw_end is not None:
+                match = self._raw_end.search(buf, pos)
+                if not match:
+                    return end if final else max(pos, end - 16)
+                self._end_tag(match.group(0)[2:-1].strip().lower(), base + match.end())
+                self._raw_end = None
+                pos = match.end()
+                continue
+            lt = buf.find(b'<', pos)
+            if lt < 0:
+                return end
+            if not final and end - lt < 4:
+                return lt
+            if buf.startswith(b'<!--', lt):
+                self._in_comment = True
+                pos = lt + 4
+                continue
+            if buf[lt + 1:lt + 2] in (b'!', b'?'):
+                close = buf.find(b'>', lt)
+                if close < 0:
+                    if not final and end - lt < _MAX_TAG_BYTES:
+                        return lt
+                    pos = lt + 1
+                    continue
+                pos = close + 1
+                continue
+            match = _SLICE_TAG_RE.match(buf, lt)
+            if not match:
+                # 可能是被块边界截断的标签，等待下一块
+                if not final and end - lt < _MAX_TAG_BYTES:
+                    return lt
+                pos = lt + 1
+                continue
+            name = match.group(2).lower()
+            if match.group(1):
+                self._end_tag(name, base + match.end())
+            else:
+                self._start_tag(name, match.group(3), base + lt, base + match.end())
+                if name in _RAW_TEXT_END_RES and not match.group(3).endswith(b'/'):
+                    self._raw_end = _RAW_TEXT_END_RES[name]
+            pos = match.end()
+        return end
+
+    def _start_tag(self, name, raw_attrs, start, end):
+        for element in self._open:
+            if element[0] == name:
+                element[1] += 1
+        keys = [key for key in self.site_rules.match_tag(_SourceTag(name.decode('ascii', 'replace'), raw_attrs))
+                if key not in self.found]
+        if not keys:
+            return
+        self.found.update(keys)
+        if name in _VOID_ELEMENTS or raw_attrs.endswith(b'/'):
+            self.ranges.append((start, end))
+        else:
+            self._open.append([name, 1, start])
+
+    def _end_tag(self, name, end):
+        for element in list(self._open):
+            if element[0] == name:
+                element[1] -= 1
+                if element[1] == 0:
+                    self._open.remove(element)
+                    self.ranges.append((element[2], end))
+
+    def finish(self, size):
+        """文件结束，未闭合的元素截取到文件末尾"""
+        for element in self._open:
+            self.ranges.append((element[2], size))
+        self._open = []
+
+    def article_found(self):
+        """是否找到了需要提取正文的网站规则及其正文元素"""
+        for rule in self.site_rules.detected(self.found):
+            if rule.extract and any(('content', rule.name, order) in self.found for order in range(len(rule.content))):
+                return True
+        return False
+
+    def merged_ranges(self):
+        """按文件顺序合并字节范围，去掉被其他范围包含的部分"""
+        merged = []
+        for start, end in sorted(self.ranges):
+            if merged and start < merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+def slice_article_file(html_file, chunk_size=None):
+    """低内存模式读取本地HTML文件
+
+    分块扫描文件，只把网站规则用到的元素拼成一个精简的HTML文档返回，其余内容不会读入内存；
+    没有识别出需要提取正文的网站时返回 None。
+    """
+    chunk_size = chunk_size or SLICE_CHUNK_SIZE
+    slicer = ArticleSlicer(get_site_rules())
+    with metrics.stage('slice'), open(html_file, 'rb') as f:
+        offset = 0
+        buf = b''
+        while True:
+            chunk = f.read(chunk_size)
+            buf = buf + chunk if buf else chunk
+            consumed = slicer.feed(buf, offset, final=not chunk)
+            offset += consumed
+            buf = buf[consumed:]
+            if not chunk:
+                break
+        slicer.finish(offset + len(buf))
+        if not slicer.article_found():
+            return None
+        parts = []
+        for start, end in slicer.merged_ranges():
+            f.seek(start)
+            parts.append(f.read(end - start))
+    return '<html><body>\n' + b'\n'.join(parts).decode('utf-8') + '\n</body></html>'
+
+def set_low_memory_threshold(threshold):
+    """设置使用低内存模式读取本地HTML文件的大小阈值（字节），0 表示总是使用，None 表示不使用"""
+    global LOW_MEMORY_THRESHOLD
+    LOW_MEMORY_THRESHOLD = threshold
+
+def read_html_file(html_file):
+    """读取本地HTML文件，文件达到 LOW_MEMORY_THRESHOLD 时只截取文章相关的元素"""
+    if LOW_MEMORY_THRESHOLD is not None and os.path.getsize(html_file) >= LOW_MEMORY_THRESHOLD:
+        html_content = slice_article_file(html_file)
+        if html_content is not None:
+            metrics.count('low_memory_inputs')
+            return html_content
+        logger.info("未识别出文章主体，读取整个文件")
+    with open(html_file, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def extract_article(soup):
+    """在已解析的文档树上根据不同网站提取文章主体，返回 (文档树, 元数据)"""
+    with metrics.stage('extract'):
+        return _extract_article(soup)
+
+def _extract_article(soup):
+    metadata = {
+        'title': '',
+        'author': '',
+        'created': '',
+        'updated': ''
+    }
+    site_rules = get_site_rules()
+    found = site_rules.scan(soup)
+    for rule in site_rules.detected(found):
+        if not rule.extract:
+            continue
+        logger.info(f"检测到{rule.label}，提取文章主体内容...")
+        rule.read_metadata(found, metadata)
+
+        # 查找文章主体内容
+        article_content = site_rules.content_root(rule, found)
+        if article_content is None:
+            logger.warning("未找到文章主体内容，将处理整个页面")
+            continue
+        logger.info("找到文章主体内容，开始处理...")
+        rule.clean(article_content)
+
+        # 创建新的HTML文档
+        new_soup = parse_html('<html><body></body></html>')
+        new_soup.body.append(article_content)
+        logger.info("已移除无关内容，处理完成" if rule.removes else "已提取文章主体内容，处理完成")
+        return new_soup, metadata
+
+    return soup, {}
+
+def process_html_content(html_content):
+    """处理HTML内容，根据不同网站进行特殊处理"""
+    soup, metadata = extract_article(parse_html(html_content))
+    if not metadata:
+        return html_content, {}
+    return str(soup), metadata
+
+def clean_title(title):
+    """清理标题，使其可以作为文件名"""
+    # 清理标题中的非法字符
+    title = re.sub(r'[\\/:*?"<>|]', '_', title)
+    # 如果标题太长，截取前50个字符
+    if len(title) > 50:
+        title = title[:50]
+    return title
+
+def get_article_title(soup, metadata):
+    """根据文章类型获取用于命名的标题"""
+    # 不提取正文的网站（如微信公众号）从整个页面读取标题
+    site_rules = get_site_rules()
+    found = site_rules.scan(soup)
+    for rule in site_rules.detected(found):
+        if not rule.extract:
+            title_elem = found.get(('metadata', rule.name, 'title'))
+            if title_elem is not None:
+                return clean_title(title_elem.get_text().strip())
+            return ''
+    if metadata.get('title'):  # 使用CSDN/知乎文章标题
+        return clean_title(metadata['title'])
+    return ''
+
+def format_metadata(metadata):
+    """生成YAML格式的元数据"""
+    if not metadata:
+        return ''
+    yaml_metadata = "---\n"
+    # 按照指定顺序添加元数据
+    for key in ['title', 'updated', 'created', 'author']:
+        if metadata.get(key):
+            yaml_metadata += f"{key}: {metadata[key]}\n"
+    yaml_metadata += "---\n\n"
+    return yaml_metadata
+
+def create_html2text():
+    """创建并配置html2text转换器"""
+    import html2text
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.ignore_images = False
+    h.ignore_emphasis = False
+    h.ignore_tables = False
+    h.body_width = 0
+    return h
+
+def _feed_text(h, text):
+    """向html2text输入文本，与序列化后再解析时的实体处理保持一致"""
+    # 序列化时 & < > 会被转义为实体，html2text对实体字符不做Markdown转义
+    start = 0
+    for match in re.finditer(r'[&<>]', text):
+        if match.start() > start:
+            h.handle_data(text[start:match.start()])
+        h.handle_data(match.group(), True)
+        start = match.end()
+    if start < len(text):
+        h.handle_data(text[start:])
+
+def soup_to_markdown(soup):
+    """直接遍历文档树生成Markdown，避免 str(soup) 后再次解析"""
+    h = create_html2text()
+    h.start = True
+    # 使用显式栈代替递归，避免深层嵌套的页面超出递归深度
+    stack = [(child, False) for child in reversed(list(soup.children))]
+    while stack:
+        node, closing = stack.pop()
+        if closing:
+            h.handle_endtag(node.name)
+        elif isinstance(node, Tag):
+            attrs = [
+                (key, ' '.join(value) if isinstance(value, list) else value)
+                for key, value in node.attrs.items()
+            ]
+            h.handle_starttag(node.name, attrs)
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.contents))
+        elif isinstance(node, (Script, Stylesheet)):
+            # 脚本和样式内容不会被转义，原样输入
+            h.handle_data(str(node))
+        elif isinstance(node, NavigableString) and not isinstance(node, PreformattedString):
+            _feed_text(h, str(node))
+    markdown_content = h.optwrap(h.finish())
+    if h.pad_tables:
+        from html2text import pad_tables_in_text
+        markdown_content = pad_tables_in_text(markdown_content)
+    return markdown_content
+
+_WHITESPACE_RE = re.compile(r'[ \t\n\r\f\v]+')
+_MD_ESCAPE_RE = re.compile(r'([\\`*_\[\]]|<(?=[A-Za-z/!?]))')
+# 行首的列表序号、标题、引用和列表标记，以及会成为分隔线或setext标题下划线的一整行 - 或 =
+_LINE_START_ESCAPE_RE = re.compile(r'(\d+[.)]|#{1,6}|[>+-])(?=\s|$)|[-=]+$')
+_CODE_LANGUAGE_RE = re.compile(r'^(?:language|lang)-(.+)$')
+
+class MarkdownEmitter:
+    """直接遍历已解析的文档树输出Markdown，边生成边写入，不需要再次解析HTML"""
+
+    # 前后各空一行的块级元素
+    PARAGRAPH_TAGS = {'p', 'dl', 'figure', 'address', 'details', 'form'}
+    # 前后换行的块级元素
+    LINE_TAGS = {
+        'div', 'section', 'article', 'main', 'header', 'footer', 'nav', 'aside',
+        'dt', 'dd', 'figcaption', 'center', 'summary', 'body', 'html', 'tr'
+    }
+    # 不输出内容的元素
+    SKIP_TAGS = {
+        'head', 'title', 'meta', 'link', 'script', 'style', 'noscript', 'template',
+        'svg', 'button', 'input', 'select', 'option', 'textarea', 'iframe', 'canvas',
+        'object', 'embed'
+    }
+    # 代码块中不属于代码内容的元素（如CSDN的行号）
+    CODE_SKIP_CLASSES = {'pre-numbering', 'hljs-ln-numbers'}
+
+    # 有专门处理方法的元素，值为方法名
+    HANDLERS = {
+        'h1': '_heading', 'h2': '_heading', 'h3': '_heading',
+        'h4': '_heading', 'h5': '_heading', 'h6': '_heading',
+        'strong': '_strong', 'b': '_strong',
+        'em': '_emphasis', 'i': '_emphasis',
+        'del': '_strike', 's': '_strike', 'strike': '_strike',
+        'code': '_code', 'kbd': '_code', 'tt': '_code',
+        'a': '_link', 'img': '_image', 'br': '_line_break', 'hr': '_rule',
+        'pre': '_pre', 'ul': '_list', 'ol': '_list',
+        'blockquote': '_blockquote', 'table': '_table',
+    }
+
+    def __init__(self, write, buffer_size=4096, inline=False):
+        self._out = write
+        self._inline = inline  # 渲染表格单元格时只输出单行内容
+        self._buffer = []
+        self._buffer_size = buffer_size  # 缓冲多少段文本后写出一次
+        self._prefixes = []  # 行前缀栈，每项为 [首行前缀, 后续行前缀, 首行是否已输出]
+        self._breaks = 0  # 下一段文字前需要的换行数
+        self._blank_lines = 0  # 上一段文字之后已输出的空行数
+        self._space = False  # 下一段文字前是否需要空格
+        self._pending = []  # 尚未输出的开始标记，遇到实际内容时才输出，空元素不输出标记
+        self._line_start = True
+        self._started = False
+        self._list_depth = 0
+
+    # ---- 输出 ----
+
+    def _raw(self, text):
+        self._buffer.append(text)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的内容写出"""
+        if self._buffer:
+            self._out(''.join(self._buffer))
+            self._buffer = []
+
+    def finish(self):
+        """结束输出，保证以换行结尾"""
+        if self._started and not self._line_start:
+            self._raw('\n')
+        self.flush()
+
+    def _prefix(self):
+        parts = []
+        for entry in self._prefixes:
+            if entry[2]:
+                parts.append(entry[1])
+            else:
+                parts.append(entry[0])
+                entry[2] = True
+        return ''.join(parts)
+
+    def _blank_prefix(self):
+        return ''.join(entry[1] for entry in self._prefixes).rstrip()
+
+    def block(self, breaks):
+        """请求在下一段文字前至少换 breaks 行（2 表示空一行）"""
+        if self._started:
+            self._breaks = max(self._breaks, breaks)
+
+    def _flush_breaks(self):
+        if self._breaks:
+            if not self._line_start:
+                self._raw('\n')
+                self._line_start = True
+            while self._blank_lines < self._breaks - 1:
+                self._raw(self._blank_prefix() + '\n')
+                self._blank_lines += 1
+            self._breaks = 0
+            self._space = False
+
+    def write(self, text, space=True):
+        """输出一段已转义的单行文本，space 为 False 时不输出之前积累的空格"""
+        if not text:
+            return
+        self._flush_breaks()
+        if self._line_start:
+            self._raw(self._prefix())
+            self._line_start = False
+        elif self._space and space:
+            self._raw(' ')
+        if space:
+            self._space = False
+        if self._pending:
+            self._raw(''.join(self._pending))
+            self._pending.clear()
+        self._blank_lines = 0
+        self._raw(text)
+        self._started = True
+
+    def _newline(self):
+        self._raw('\n')
+        self._line_start = True
+        self._space = False
+
+    def _open(self, marker):
+        # 开始标记推迟到第一段内容之前输出，元素开头的空白因此落在标记之前
+        self._pending.append(marker)
+
+    def _close(self, marker):
+        # 元素没有任何内容时，开始和结束标记都不输出
+        if self._pending:
+            self._pending.pop()
+            return
+        # 结束标记紧贴内容，原本的空格留到标记之后
+        pending = self._space
+        self.write(marker, space=False)
+        self._space = pending
+
+    def text(self, data):
+        """输出普通文本：折叠空白并转义Markdown特殊字符"""
+        data = _WHITESPACE_RE.sub(' ', data)
+        if not data.strip(' '):
+            if data:
+                self._space = True
+            return
+        if data[0] == ' ':
+            self._space = True
+        escaped = _MD_ESCAPE_RE.sub(r'\\\1', data.strip(' ').replace('\xa0', ' '))
+        # 位于行首（列表、引用前缀之后）且前面没有标题等标记时，才可能被当作列表、标题或引用
+        match = None
+        if (self._line_start or self._breaks) and not self._pending:
+            match = _LINE_START_ESCAPE_RE.match(escaped)
+        if match:
+            # 序号转义其后的分隔符（1\.），其他标记转义第一个字符（\-、\#）
+            at = match.end() - 1 if escaped[0].isdigit() else 0
+            escaped = escaped[:at] + '\\' + escaped[at:]
+        self.write(escaped)
+        if data[-1] == ' ':
+            self._space = True
+
+    # ---- 遍历 ----
+
+    def emit(self, node):
+        """输出一个节点及其子节点"""
+        node_type = node.__class__
+        if node_type is NavigableString:
+            # 最常见的情况，先判断
+            self.text(node)
+        elif node_type is Tag or isinstance(node, Tag):
+            handler = self.HANDLERS.get(node.name)
+            if handler:
+                getattr(self, handler)(node)
+            elif node.name in self.SKIP_TAGS:
+                return
+            elif node.name in self.PARAGRAPH_TAGS:
+                self.block(2)
+                self.children(node)
+                self.block(2)
+            elif node.name in self.LINE_TAGS:
+                self.block(1)
+                self.children(node)
+                self.block(1)
+            else:
+                self.children(node)
+        elif isinstance(node, (Script, Stylesheet, PreformattedString)):
+            return
+        elif isinstance(node, NavigableString):
+            self.text(node)
+        else:
+            # BeautifulSoup 文档对象
+            self.children(node)
+
+    def children(self, node):
+        for child in node.children:
+            self.emit(child)
+
+    # ---- 元素 ----
+
+    def _heading(self, node):
+        self.block(2)
+        self._open('#' * int(node.name[1]) + ' ')
+        self.children(node)
+        self._close('')
+        self.block(2)
+
+    def _wrap(self, node, marker):
+        self._open(marker)
+        self.children(node)
+        self._close(marker)
+
+    def _strong(self, node):
+        self._wrap(node, '**')
+
+    def _emphasis(self, node):
+        # 中日韩文字中间的 _ 不构成强调，用 *
+        self._wrap(node, '*')
+
+    def _strike(self, node):
+        self._wrap(node, '~~')
+
+    def _code(self, node):
+        code = _WHITESPACE_RE.sub(' ', node.get_text())
+        if not code.strip():
+            return
+        fence = '`' * (max((len(run) for run in re.findall(r'`+', code)), default=0) + 1)
+        if code.startswith('`') or code.endswith('`'):
+            code = f' {code} '
+        self.write(f'{fence}{code}{fence}')
+
+    def _link(self, node):
+        href = node.get('href', '').strip()
+        if not href or href.startswith(('#', 'javascript:')):
+            self.children(node)
+            return
+        href = href.replace(' ', '%20').replace('(', '%28').replace(')', '%29')
+        title = node.get('title', '').replace('"', '\\"')
+        self._open('[')
+        self.children(node)
+        self._close(f']({href} "{title}")' if title else f']({href})')
+
+    def _image(self, node):
+        src = node.get('src', '').strip()
+        if not src:
+            return
+        src = src.replace(' ', '%20').replace('(', '%28').replace(')', '%29')
+        alt = _MD_ESCAPE_RE.sub(r'\\\1', _WHITESPACE_RE.sub(' ', node.get('alt', '')).strip())
+        title = node.get('title', '').replace('"', '\\"')
+        self.write(f'![{alt}]({src} "{title}")' if title else f'![{alt}]({src})')
+
+    def _line_break(self, node):
+        if self._line_start or self._breaks:
+            return
+        self._raw('  ')
+        self._newline()
+
+    def _rule(self, node):
+        self.block(2)
+        self.write('* * *')
+        self.block(2)
+
+    def _code_text(self, node):
+        """取出代码块的文本，跳过行号等非代码元素"""
+        parts = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, Tag):
+                if self.CODE_SKIP_CLASSES.intersection(current.get('class') or ()):
+                    continue
+                if current.name == 'br':
+                    parts.append('\n')
+                    continue
+                stack.extend(reversed(current.contents))
+            elif isinstance(current, NavigableString) and not isinstance(current, PreformattedString):
+                parts.append(str(current))
+        return ''.join(parts)
+
+    def _pre(self, node):
+        if self._inline:
+            self._code(node)
+            return
+        language = ''
+        code = node.find('code')
+        for element in (code, node):
+            if element is None:
+                continue
+            for css_class in element.get('class') or ():
+                match = _CODE_LANGUAGE_RE.match(css_class)
+                if match:
+                    language = match.group(1)
+                    break
+            if language:
+                break
+        text = self._code_text(node).strip('\n').rstrip()
+        fence = '```'
+        while fence in text:
+            fence += '`'
+        self.block(2)
+        self.write(fence + language)
+        for line in text.split('\n'):
+            self._newline()
+            self._raw(self._prefix() + line if line else self._blank_prefix())
+            self._line_start = False
+        self._newline()
+        self.write(fence)
+        self.block(2)
+
+    def _list(self, node):
+        ordered = node.name == 'ol'
+        index = 1
+        if ordered:
+            try:
+                index = int(node.get('start', 1))
+            except ValueError:
+                pass
+        # 起始序号不是1的有序列表不能紧跟在段落文字后面，需要空一行
+        self.block(1 if self._list_depth and index == 1 else 2)
+        self._list_depth += 1
+        for child in node.children:
+            if isinstance(child, Tag) and child.name == 'li':
+                marker = f"{index}. " if ordered else "- "
+                self.block(1)
+                self._prefixes.append([marker, ' ' * len(marker), False])
+                self.children(child)
+                self._prefixes.pop()
+                index += 1
+            else:
+                self.emit(child)
+        self._list_depth -= 1
+        self.block(1 if self._list_depth else 2)
+
+    def _blockquote(self, node):
+        # 引用之前的空行不带引用前缀
+        self.block(2)
+        self._flush_breaks()
+        self._prefixes.append(['> ', '> ', False])
+        self.children(node)
+        self._prefixes.pop()
+        self.block(2)
+
+    def _cell_text(self, cell):
+        """把单元格内容渲染为单行Markdown"""
+        parts = []
+        emitter = MarkdownEmitter(parts.append, inline=True)
+        emitter.children(cell)
+        emitter.finish()
+        return _WHITESPACE_RE.sub(' ', ''.join(parts).replace('\n', ' ')).strip().replace('|', '\\|')
+
+    def _table_rows(self, node):
+        # 跳过嵌套表格中的行，嵌套表格作为单元格文本输出
+        stack = [iter(node.children)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, Tag) and child.name != 'table':
+                    if child.name == 'tr':
+                        yield child
+                    else:
+                        stack.append(iter(child.children))
+                    break
+            else:
+                stack.pop()
+
+    def _table(self, node):
+        rows = []
+        for tr in self._table_rows(node):
+            cells = [self._cell_text(cell) for cell in tr.children if isinstance(cell, Tag) and cell.name in ('th', 'td')]
+            if cells:
+                rows.append(cells)
+        if not rows:
+            return
+        if self._inline:
+            # 嵌套在单元格中的表格只输出文字
+            self.write(' '.join(cell for row in rows for cell in row if cell))
+            return
+        width = max(len(row) for row in rows)
+        self.block(2)
+        for number, row in enumerate(rows):
+            row = row + [''] * (width - len(row))
+            if number:
+                self._newline()
+            self.write('| ' + ' | '.join(row) + ' |')
+            if number == 0:
+                self._newline()
+                self.write('|' + ' --- |' * width)
+        self.block(2)
+
+def write_markdown(soup, out, engine=None):
+    """把文档树转换为Markdown写入文件对象 out，engine 默认使用 MARKDOWN_ENGINE"""
+    engine = engine or MARKDOWN_ENGINE
+    if engine == 'native':
+        start = out.tell() if out.seekable() else None
+        try:
+            emitter = MarkdownEmitter(out.write)
+            emitter.emit(soup)
+            emitter.finish()
+            return
+        except RecursionError:
+            # 嵌套过深的文档退回html2text
+            if start is None:
+                raise
+            out.seek(start)
+            out.truncate()
+    out.write(soup_to_markdown(soup))
+
+def set_markdown_engine(engine):
+    """设置Markdown生成方式（native 或 html2text）"""
+    global MARKDOWN_ENGINE
+    if engine not in MARKDOWN_ENGINES:
+        raise ValueError(f"不支持的Markdown生成方式: {engine}，可选: {', '.join(MARKDOWN_ENGINES)}")
+    MARKDOWN_ENGINE = engine
+
+class ConversionResult:
+    """一次转换的结果，可以直接作为布尔值判断是否成功
+
+    output 为输出文件路径（失败时为 None），error 为失败原因，metadata 为文章元数据，
+    images 为 [ImageOutcome]，stages 为本次转换各阶段的耗时（秒），elapsed 为总耗时（秒），
+    fetch_tier 为URL页面的获取方式（转换本地文件时为 None）。
+    """
+    __slots__ = ('source', 'output', 'error', 'metadata', 'images', 'stages',
+                 'bytes_written', 'elapsed', 'attempts', 'skipped', 'fetch_tier')
+
+    def __init__(self, source, output=None, error=''):
+        self.source = source  # 输入的URL或HTML文件
+        self.output = output
+        self.error = error
+        self.metadata = {}
+        self.images = []
+        self.stages = {}
+        self.bytes_written = 0  # Markdown文件的字节数
+        self.elapsed = 0.0
+        self.attempts = 1
+        self.skipped = False  # 增量转换时输入未变化，沿用已有的输出
+        self.fetch_tier = None  # URL页面的获取方式：cache、http 或 browser
+
+    @property
+    def ok(self):
+        return self.output is not None
+
+    def __bool__(self):
+        return self.ok
+
+    @property
+    def status(self):
+        if self.skipped:
+            return 'skipped'
+        return 'ok' if self.ok else 'failed'
+
+    @contextmanager
+    def track(self):
+        """把 with 代码块内的阶段耗时和总耗时记录到结果中"""
+        start = time.perf_counter()
+        try:
+            with metrics.collect() as self.stages:
+                yield self
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def to_dict(self):
+        """转换为可以写入JSON的字典"""
+        return {
+            'source': self.source,
+            'status': self.status,
+            'output': self.output,
+            'error': self.error,
+            'attempts': self.attempts,
+            'fetch_tier': self.fetch_tier,
+            'elapsed': round(self.elapsed, 3),
+            'bytes_written': self.bytes_written,
+            'metadata': self.metadata,
+            'stages': {name: round(seconds, 6) for name, seconds in sorted(self.stages.items())},
+            'images': [image.to_dict() for image in self.images],
+        }
+
+    def __repr__(self):
+        if self.ok:
+            return f"ConversionResult({self.source!r}, output={self.output!r})"
+        return f"ConversionResult({self.source!r}, error={self.error!r})"
+
+def convert_soup_to_md(soup, output_file, base_path, driver=None, metadata=None, result=None):
+    """单次解析的转换流水线：站点提取、元数据、图片改写、Markdown输出共用同一棵文档树
+
+    结果记录到 result（默认新建）中并返回，出错时抛出异常。
+    """
+    if result is None:
+        result = ConversionResult(output_file)
+    output_dir = os.path.dirname(output_file)
+    
+    # 创建resources目录
+    resources_dir = create_resources_dir(output_dir)
+    
+    # 处理HTML内容
+    if metadata is None:
+        soup, metadata = extract_article(soup)
+    result.metadata = metadata
         
-        # 转换为Markdown
-        result = convert_html_to_md(temp_html_file, output_dir)
+    # 处理图片，传入driver实例
+    with metrics.stage('images'):
+        result.images = rewrite_images(soup, base_path, resources_dir, driver)
+    
+    # 边转换边写入Markdown文件，元数据在最前面
+    # 先写入临时文件再重命名，其他进程不会读到写了一半的文件
+    with metrics.stage('markdown'), atomic_open(output_file) as f:
+        f.write(format_metadata(metadata))
+        write_markdown(soup, f)
         
-        # 如果转换成功，根据情况重命名文件
-        if result:
-            base_dir = os.path.dirname(result)
+    metrics.count('conversions')
+    logger.info(f"已保存Markdown文件: {output_file}")
+    result.bytes_written = os.path.getsize(output_file)
+    result.output = output_file
+    return result
+
+def convert_url_to_md(url, output_dir=None, driver_pool=None):
+    """将URL转换为Markdown，返回 ConversionResult，可传入 ChromeDriverPool 复用浏览器会话"""
+    result = ConversionResult(url)
+    # 图片请求以文章所在网站作为 Referer
+    with result.track(), image_referer(url):
+        try:
+            # 如果未提供输出目录，使用当前目录
+            if output_dir is None:
+                output_dir = os.getcwd()
+            os.makedirs(output_dir, exist_ok=True)
+                
+            # 下载HTML内容
+            html_content, soup = fetch_document(url, driver_pool, result)
+                
+            # 解析一次，后续所有步骤共用同一棵文档树（直接请求的页面在检查时已经解析）
+            if soup is None:
+                soup = parse_html(html_content)
+            soup, metadata = extract_article(soup)
+            result.metadata = metadata
+            
+            # 根据不同类型的文章决定文件名
+            title = get_article_title(soup, metadata)
             if title:
                 # 使用文章标题命名
                 new_filename = f"{title}.md"
             else:
                 # 使用当前时间命名
-                from datetime import datetime
                 current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
                 new_filename = f"{current_time}.md"
             
-            # 构建新的文件路径
-            new_file_path = os.path.join(base_dir, new_filename)
-            
-            # 如果目标文件已存在，添加序号
-            counter = 1
-            while os.path.exists(new_file_path):
-                name, ext = os.path.splitext(new_filename)
-                new_filename = f"{name}_{counter}{ext}"
-                new_file_path = os.path.join(base_dir, new_filename)
-                counter += 1
-            
-            # 如果有元数据，添加到文件内容中
-            if metadata:
-                with open(result, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # 生成YAML格式的元数据
-                yaml_metadata = "---\n"
-                # 按照指定顺序添加元数据
-                for key in ['title', 'updated', 'created', 'author']:
-                    if metadata.get(key):
-                        yaml_metadata += f"{key}: {metadata[key]}\n"
-                yaml_metadata += "---\n\n"
-                
-                # 将元数据添加到文件开头
-                with open(result, 'w', encoding='utf-8') as f:
-                    f.write(yaml_metadata + content)
-            
-            # 重命名文件
+            # 独占地占用文件名，同名文件已存在时添加序号
+            new_file_path = reserve_output_file(output_dir, new_filename)
             try:
-                os.rename(result, new_file_path)
-                result = new_file_path
-                print(f"已重命名文件为: {new_file_path}")
-            except Exception as e:
-                print(f"重命名文件失败: {str(e)}")
+                # 转换为Markdown，相对路径的图片以输出目录为基准
+                convert_soup_to_md(soup, new_file_path, output_dir, metadata=metadata, result=result)
+            except BaseException:
+                # 转换失败时释放占用的文件名
+                os.remove(new_file_path)
+                raise
+        except Exception as e:
+            metrics.count('conversion_failures')
+            logger.error(f"转换URL失败: {str(e)}")
+            result.error = str(e)
+    return result
+
+class HostRateLimiter:
+    """按主机限速：同一主机相邻两次请求至少间隔 min_interval 秒"""
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        """阻塞到该主机允许发出下一次请求"""
+        with self._lock:
+            now = time.monotonic()
+            allowed = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = allowed + self.min_interval
+        if allowed > now:
+            time.sleep(allowed - now)
+
+def needs_browser(url):
+    """判断URL是否需要使用浏览器获取"""
+    return 'mp.weixin.qq.com' not in url
+
+def iter_urls_to_md(urls, output_dir=None, http_workers=4, browser_workers=2,
+                    host_interval=1.0, retries=2, backoff=2.0, report_path=None, driver_pool=None):
+    """批量将URL转换为Markdown，每完成一个URL就产出它的 ConversionResult（按完成顺序）
+
+    微信公众号文章走 requests 队列，其他网站走浏览器队列，两个队列各自并发；
+    同一主机的请求按 host_interval 限速，失败后按指数退避重试 retries 次。
+    提供 report_path 时，每完成一个URL就向该JSONL文件追加一条结果。
+    """
+    for _, result in _iter_url_batch(urls, output_dir, http_workers, browser_workers,
+                                     host_interval, retries, backoff, report_path, driver_pool):
+        yield result
+
+def convert_urls_to_md(urls, output_dir=None, http_workers=4, browser_workers=2,
+                       host_interval=1.0, retries=2, backoff=2.0, report_path=None, driver_pool=None):
+    """批量将URL转换为Markdown，按输入顺序返回 [ConversionResult]，参数见 iter_urls_to_md"""
+    results = {}
+    for index, result in _iter_url_batch(urls, output_dir, http_workers, browser_workers,
+                                         host_interval, retries, backoff, report_path, driver_pool):
+        results[index] = result
+    return [results[index] for index in sorted(results)]
+
+def _iter_url_batch(urls, output_dir, http_workers, browser_workers,
+                    host_interval, retries, backoff, report_path, driver_pool):
+    """按完成顺序产出 (输入序号, ConversionResult)"""
+    from concurrent.futures import as_completed
+    if output_dir is None:
+        output_dir = os.getcwd()
+    os.makedirs(output_dir, exist_ok=True)
         
-        # 删除临时HTML文件
+    urls = [url.strip() for url in urls if url and url.strip()]
+    limiter = HostRateLimiter(host_interval)
+    report_lock = threading.Lock()
+    own_pool = driver_pool is None and any(needs_browser(url) for url in urls)
+    if own_pool:
+        driver_pool = ChromeDriverPool(size=browser_workers)
+
+    def convert_one(url):
+        host = urlparse(url).hostname or ''
+        lane = 'browser' if needs_browser(url) else 'http'
+        start = time.monotonic()
+        for attempt in range(retries + 1):
+            if attempt:
+                # 指数退避后重试
+                metrics.count('retries', lane=lane)
+                time.sleep(backoff * (2 ** (attempt - 1)))
+            with metrics.stage('rate_limit_wait', lane=lane):
+                limiter.wait(host)
+            try:
+                result = convert_url_to_md(url, output_dir, driver_pool)
+            except Exception as e:
+                result = ConversionResult(url, error=str(e))
+            if result:
+                break
+        result.attempts = attempt + 1
+        result.elapsed = time.monotonic() - start
+        if report_path:
+            record = {'lane': lane, **result.to_dict()}
+            with report_lock:
+                with open(report_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return result
+
+    http_executor = ThreadPoolExecutor(max_workers=max(1, http_workers))
+    browser_executor = ThreadPoolExecutor(max_workers=max(1, browser_workers))
+    try:
+        futures = {
+            (browser_executor if needs_browser(url) else http_executor).submit(convert_one, url): index
+            for index, url in enumerate(urls)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # 调用方提前停止迭代时，不再开始尚未执行的URL
+        for executor in (http_executor, browser_executor):
+            executor.shutdown(cancel_futures=True)
+        if own_pool:
+            driver_pool.close()
+
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+
+def decode_body(body, headers):
+    """按 Content-Type 中的字符集解码响应内容，未声明时按UTF-8解码"""
+    match = _CHARSET_RE.search(headers.get('Content-Type', ''))
+    try:
+        return body.decode(match.group(1) if match else 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class AsyncConverter:
+    """asyncio 转换器，可作为异步上下文管理器使用
+
+    微信公众号页面和网络图片使用 aiohttp 异步下载（未安装 aiohttp 时退回线程池中的 requests），
+    浏览器渲染、解析和Markdown输出分别放到有界线程池中执行，不会阻塞事件循环。
+    取消正在进行的转换时会删除已占用的输出文件和临时文件。
+    """
+
+    def __init__(self, output_dir=None, driver_pool=None, browser_workers=2, cpu_workers=None,
+                 image_concurrency=IMAGE_DOWNLOAD_WORKERS, timeout=30):
+        self.output_dir = output_dir
+        self.driver_pool = driver_pool
+        self.browser_workers = max(1, browser_workers)
+        self.timeout = timeout
+        self._own_pool = False
+        self._session = None
+        self._image_slots = None
+        self._image_concurrency = max(1, image_concurrency)
+        self._browser = ThreadPoolExecutor(max_workers=self.browser_workers, thread_name_prefix='html2md-browser')
+        self._cpu = ThreadPoolExecutor(max_workers=cpu_workers or os.cpu_count() or 1, thread_name_prefix='html2md-cpu')
+        # 缓存索引、文件复制和未安装 aiohttp 时的同步请求
+        self._io = ThreadPoolExecutor(max_workers=self._image_concurrency, thread_name_prefix='html2md-io')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """关闭HTTP会话、线程池和自建的浏览器会话池"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        for executor in (self._browser, self._cpu, self._io):
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self._own_pool:
+            import asyncio
+            await asyncio.get_running_loop().run_in_executor(None, self.driver_pool.close)
+            self.driver_pool = None
+            self._own_pool = False
+
+    async def _run(self, executor, func, *args, cleanup=None):
+        """在线程池中执行 func；被取消时函数仍会在线程中运行完，结束后调用 cleanup"""
+        import asyncio
+        # 在当前协程的上下文中执行，阶段耗时计入当前转换
+        future = executor.submit(contextvars.copy_context().run, func, *args)
         try:
-            os.remove(temp_html_file)
-        except:
-            pass
-            
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if cleanup is not None:
+                future.add_done_callback(lambda _: cleanup())
+            raise
+
+    def _get_session(self):
+        """返回共享的 aiohttp 会话，未安装 aiohttp 时返回 None"""
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError:
+                return None
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit_per_host=HTTP_POOL_MAXSIZE)
+            )
+        return self._session
+
+    async def _cached_entry(self, cache, key, ttl=None):
+        """查询缓存，返回 (条目, 是否可以直接使用)；仅缓存模式下未命中时抛出 CacheMissError"""
+        entry, fresh = await self._run(self._io, cache.lookup, key, ttl)
+        if entry and (fresh or cache.offline):
+            metrics.count('http_cache_hits')
+            return entry, True
+        if cache.offline:
+            metrics.count('http_cache_misses')
+            raise CacheMissError("缓存中没有请求的内容")
+        return entry, False
+
+    async def get_text(self, url, headers=None):
+        """带缓存的异步GET请求，返回解码后的文本"""
+        session = self._get_session()
+        if session is None:
+            response = await self._run(self._io, http_get, url, headers, self.timeout)
+            response.raise_for_status()
+            return response.text
+        cache = get_http_cache()
+        entry = key = None
+        if cache is not None:
+            key = cache.cache_key(url, headers)
+            entry, usable = await self._cached_entry(cache, key)
+            if usable:
+                return decode_body(await self._run(self._io, cache.read_body, key), entry['headers'])
+            headers = cache._conditional_headers(entry, headers)
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and entry:
+                metrics.count('http_cache_revalidated')
+                await self._run(self._io, cache.refresh, key)
+                return decode_body(await self._run(self._io, cache.read_body, key), entry['headers'])
+            response.raise_for_status()
+            body = await response.read()
+            response_headers = dict(response.headers)
+        metrics.count('bytes_fetched', len(body))
+        if cache is not None:
+            metrics.count('http_cache_misses')
+            await self._run(self._io, cache.store, key, url, body, response_headers)
+        return decode_body(body, response_headers)
+
+    async def _stream_to_file(self, response, directory, max_bytes=None):
+        """把响应内容分块写入 directory 下的临时文件，返回 (临时文件路径, 字节数)"""
+        length = response.content_length
+        if max_bytes and length and length > max_bytes:
+            raise ImageTooLargeError(f"超过最大大小 {max_bytes} 字节")
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        written = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    written += len(chunk)
+                    if max_bytes and written > max_bytes:
+                        raise ImageTooLargeError(f"超过最大大小 {max_bytes} 字节")
+                    f.write(chunk)
+        except BaseException:
+            _remove_quietly(temp_path)
+            raise
+        finally:
+            metrics.count('bytes_fetched', written)
+        return temp_path, written
+
+    async def download(self, url, save_path, headers=None, ttl=None, max_bytes=None):
+        """带缓存的异步流式下载，成功返回 True"""
+        session = self._get_session()
+        if session is None:
+            return await self._run(self._io, http_download, url, save_path, headers, self.timeout, ttl, max_bytes)
+        cache = get_http_cache()
+        entry = key = None
+        if cache is not None:
+            key = cache.cache_key(url, headers)
+            entry, usable = await self._cached_entry(cache, key, ttl)
+            if usable:
+                await self._run(self._io, cache.copy_body, key, save_path)
+                return True
+            headers = cache._conditional_headers(entry, headers)
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and entry:
+                metrics.count('http_cache_revalidated')
+                await self._run(self._io, cache.refresh, key)
+            elif response.status == 200:
+                directory = cache.bodies_dir if cache is not None else os.path.dirname(save_path)
+                temp_path, size = await self._stream_to_file(response, directory, max_bytes)
+                if cache is None:
+                    os.replace(temp_path, save_path)
+                    return True
+                metrics.count('http_cache_misses')
+                await self._run(self._io, cache.store_file, key, url, temp_path, size, dict(response.headers))
+            else:
+                return False
+        await self._run(self._io, cache.copy_body, key, save_path)
+        await self._run(self._io, cache.evict)
+        return True
+
+    async def fetch_image(self, url, resources_dir, store):
+        """获取一张图片并链接到 resources 目录，返回 ImageOutcome"""
+        if not url.startswith(('http://', 'https://')) or self._get_session() is None:
+            # data URI、本地文件和同步下载都在线程池中完成
+            return await self._run(self._io, fetch_image, url, resources_dir, store)
+        start = time.perf_counter()
+        try:
+            (digest, ext), hit = await self._fetch_remote_image(url, get_image_extension(url), store)
+            filename = await self._run(self._io, store.link_into, digest, ext, resources_dir)
+            size = os.path.getsize(os.path.join(resources_dir, filename))
+        except Exception as e:
+            return ImageOutcome(url, 'failed', duration=time.perf_counter() - start, error=str(e) or type(e).__name__)
+        return ImageOutcome(url, 'stored' if hit else 'downloaded', filename, size, time.perf_counter() - start)
+
+    async def _fetch_remote_image(self, url, ext, store):
+        """与 ResourceStore.fetch_outcome 相同，下载使用 aiohttp"""
+        hit = await self._run(self._io, store.lookup, url)
+        if hit:
+            metrics.count('image_store_hits')
+            return hit, True
+        fd, temp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        os.close(fd)
+        try:
+            with metrics.stage('image_download'):
+                downloaded = await self.download(url, temp_path, image_request_headers(),
+                                                 ttl=IMAGE_CACHE_TTL, max_bytes=MAX_IMAGE_BYTES)
+            if not downloaded:
+                raise ImageDownloadError(f"下载图片失败: {url}")
+        except BaseException:
+            metrics.count('images_failed')
+            _remove_quietly(temp_path)
+            raise
+        metrics.count('images_downloaded')
+        digest = await self._run(self._io, store.add_file, temp_path, ext)
+        await self._run(self._io, store.remember, url, digest, ext)
+        return (digest, ext), False
+
+    async def download_images(self, urls, resources_dir, store=None):
+        """并发获取图片，同时进行的下载数不超过 image_concurrency，返回 {URL: ImageOutcome}"""
+        import asyncio
+        if not urls:
+            return {}
+        store = store or get_resource_store()
+        if self._image_slots is None:
+            self._image_slots = asyncio.Semaphore(self._image_concurrency)
+
+        async def fetch_one(url):
+            async with self._image_slots:
+                return await self.fetch_image(url, resources_dir, store)
+
+        outcomes = await asyncio.gather(*(fetch_one(url) for url in urls))
+        return dict(zip(urls, outcomes))
+
+    async def fetch_page(self, url, result=None):
+        """获取页面HTML：微信公众号文章异步请求，其他网站在浏览器线程池中获取（先尝试HTTP，
+        必要时渲染），失败时抛出异常，获取方式记录到 result.fetch_tier 中"""
+        return (await self.fetch_document(url, result))[0]
+
+    async def fetch_document(self, url, result=None):
+        """同 fetch_page，返回 (HTML内容, 文档树)，文档树只在直接请求时已解析，否则为 None"""
+        if needs_browser(url):
+            if self.driver_pool is None:
+                self.driver_pool = ChromeDriverPool(size=self.browser_workers)
+                self._own_pool = True
+            return await self._run(self._browser, fetch_document, url, self.driver_pool, result)
+        with metrics.stage('fetch'):
+            logger.info("检测到微信公众号文章，使用aiohttp获取内容...")
+            try:
+                html_content = await self.get_text(url, PAGE_REQUEST_HEADERS)
+            except Exception:
+                metrics.count('fetch_failures')
+                raise
+        metrics.count('fetch_tier_http')
+        if result is not None:
+            result.fetch_tier = 'http'
+        return html_content, None
+
+    @staticmethod
+    def _prepare(html_content, base_path, soup=None):
+        """解析（已解析时跳过）、提取正文并收集图片，返回 (文档树, 元数据, 标题, 图片位置)"""
+        soup, metadata = extract_article(soup if soup is not None else parse_html(html_content))
+        return soup, metadata, get_article_title(soup, metadata), collect_images(soup, base_path)
+
+    @staticmethod
+    def _write(soup, metadata, targets, outcomes, temp_file):
+        """更新图片链接并把Markdown写入临时文件"""
+        with metrics.stage('images'):
+            targets.apply(outcomes)
+        with metrics.stage('markdown'), open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(format_metadata(metadata))
+            write_markdown(soup, f)
+
+    async def convert_url(self, url, output_dir=None):
+        """将URL转换为Markdown，返回 ConversionResult；被取消时抛出 CancelledError"""
+        output_dir = output_dir or self.output_dir or os.getcwd()
+        result = ConversionResult(url)
+        output_file = temp_file = None
+        with result.track(), image_referer(url):
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+                html_content, soup = await self.fetch_document(url, result)
+                # 相对路径的图片以输出目录为基准
+                soup, metadata, title, targets = await self._run(self._cpu, self._prepare, html_content, output_dir, soup)
+                result.metadata = metadata
+                filename = f"{title}.md" if title else f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+                output_file = reserve_output_file(output_dir, filename)
+                resources_dir = create_resources_dir(output_dir)
+                outcomes = await self.download_images(targets.urls, resources_dir)
+                result.images = list(outcomes.values())
+                # 输出文件名已被独占，临时文件名不会冲突
+                temp_file = output_file + '.async.part'
+                await self._run(self._cpu, self._write, soup, metadata, targets, outcomes, temp_file,
+                                cleanup=lambda: _remove_quietly(temp_file))
+                os.replace(temp_file, output_file)
+                metrics.count('conversions')
+                logger.info(f"已保存Markdown文件: {output_file}")
+                result.bytes_written = os.path.getsize(output_file)
+                result.output = output_file
+            except BaseException as e:
+                if output_file is not None and result.output is None:
+                    _remove_quietly(output_file)
+                    if temp_file is not None:
+                        _remove_quietly(temp_file)
+                if not isinstance(e, Exception):
+                    raise
+                metrics.count('conversion_failures')
+                logger.error(f"转换URL失败: {str(e)}")
+                result.error = str(e)
         return result
-    except Exception as e:
-        print(f"转换URL失败: {str(e)}")
-        return None
+
+    async def iter_many(self, urls, output_dir=None, concurrency=4):
+        """并发转换多个URL，同时进行的转换不超过 concurrency 个，按完成顺序产出 ConversionResult"""
+        import asyncio
+        urls = [url.strip() for url in urls if url and url.strip()]
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def convert_one(url):
+            async with slots:
+                return await self.convert_url(url, output_dir)
+
+        tasks = [asyncio.ensure_future(convert_one(url)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 调用方提前停止迭代时取消剩余的转换
+            for task in tasks:
+                task.cancel()
+
+    async def convert_many(self, urls, output_dir=None, concurrency=4):
+        """并发转换多个URL，按输入顺序返回 ConversionResult 列表"""
+        import asyncio
+        urls = [url.strip() for url in urls if url and url.strip()]
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def convert_one(url):
+            async with slots:
+                return await self.convert_url(url, output_dir)
+
+        return await asyncio.gather(*(convert_one(url) for url in urls))
+
+async def convert_url_to_md_async(url, output_dir=None, driver_pool=None):
+    """convert_url_to_md 的异步版本，返回 ConversionResult"""
+    async with AsyncConverter(output_dir, driver_pool) as converter:
+        return await converter.convert_url(url)
+
+async def convert_many_async(urls, output_dir=None, concurrency=4, driver_pool=None, browser_workers=2):
+    """异步批量转换URL，按输入顺序返回 ConversionResult 列表"""
+    async with AsyncConverter(output_dir, driver_pool, browser_workers=browser_workers) as converter:
+        return await converter.convert_many(urls, concurrency=concurrency)
 
 def convert_html_to_md(html_file, output_dir, driver=None):
-    """将HTML文件转换为Markdown"""
-    try:
-        # 创建输出目录
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            
-        # 创建resources目录
-        resources_dir = create_resources_dir(output_dir)
-        
-        # 读取HTML文件
-        with open(html_file, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-            
-        # 处理HTML内容
-        html_content, metadata = process_html_content(html_content)
+    """将HTML文件转换为Markdown，返回 ConversionResult"""
+    result = ConversionResult(html_file)
+    with result.track():
+        try:
+            # 创建输出目录
+            os.makedirs(output_dir, exist_ok=True)
+                
+            # 读取HTML文件，大文件只截取文章相关的元素
+            html_content = read_html_file(html_file)
+                
+            # 生成输出文件名
+            input_filename = os.path.basename(html_file)
+            output_filename = os.path.splitext(input_filename)[0] + '.md'
+            output_file = os.path.join(output_dir, output_filename)
             
-        # 处理图片，传入driver实例
-        html_content = process_images(html_content, html_file, resources_dir, driver)
-        
-        # 使用html2text转换为Markdown
-        h = html2text.HTML2Text()
-        h.ignore_links = False
-        h.ignore_images = False
-        h.ignore_emphasis = False
-        h.ignore_tables = False
-        h.body_width = 0
-        markdown_content = h.handle(html_content)
-        
-        # 生成YAML格式的元数据
-        if metadata:
-            yaml_metadata = "---\n"
-            # 按照指定顺序添加元数据
-            for key in ['title', 'updated', 'created', 'author']:
-                if metadata.get(key):
-                    yaml_metadata += f"{key}: {metadata[key]}\n"
-            yaml_metadata += "---\n\n"
-            markdown_content = yaml_metadata + markdown_content
-        
-        # 生成输出文件名
-        input_filename = os.path.basename(html_file)
-        output_filename = os.path.splitext(input_filename)[0] + '.md'
-        output_file = os.path.join(output_dir, output_filename)
-        
-        # 保存Markdown文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
+            base_path = os.path.dirname(os.path.abspath(html_file))
+            soup = parse_html(html_content)
+            # 解析后不再需要源码，尽早释放
+            del html_content
+            convert_soup_to_md(soup, output_file, base_path, driver, result=result)
             
-        print(f"已保存Markdown文件: {output_file}")
-        return output_file
-        
-    except Exception as e:
-        print(f"转换失败: {str(e)}")
-        return None
+        except Exception as e:
+            metrics.count('conversion_failures')
+            logger.error(f"转换失败: {str(e)}")
+            result.error = str(e)
+    return result
 
-def process_directory(input_dir, output_dir):
-    """处理目录中的所有HTML文件"""
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
+def collect_html_files(input_dir, output_dir):
+    """遍历目录，返回 [(HTML文件, 对应的输出目录)]"""
+    tasks = []
     for root, dirs, files in os.walk(input_dir):
         for file in files:
             if file.endswith(('.html', '.htm')):
                 html_file = os.path.join(root, file)
                 relative_path = os.path.relpath(root, input_dir)
-                current_output_dir = os.path.join(output_dir, relative_path)
-                
-                if not os.path.exists(current_output_dir):
-                    os.makedirs(current_output_dir)
-                    
-                try:
-                    result = convert_html_to_md(html_file, current_output_dir)
-                    print(f"已转换: {html_file} -> {result}")
-                except Exception as e:
-                    print(f"转换失败 {html_file}: {str(e)}")
+                tasks.append((html_file, os.path.join(output_dir, relative_path)))
+    return tasks
+
+def _file_signature(path):
+    """返回文件的 (修改时间, 大小)"""
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+def load_manifest(output_dir):
+    """读取输出目录中的增量转换清单"""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('files'), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'files': {}}
+
+def save_manifest(output_dir, manifest):
+    """原子地写入增量转换清单"""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    with atomic_open(manifest_path) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+def _manifest_outputs(output_file, output_dir):
+    """返回一次转换产生的输出文件：Markdown文件及其引用的图片（相对输出目录）"""
+    outputs = [os.path.relpath(output_file, output_dir)]
+    with open(output_file, 'r', encoding='utf-8') as f:
+        markdown_content = f.read()
+    md_dir = os.path.dirname(output_file)
+    for filename in sorted(set(re.findall(r'\./resources/([^)\s"\']+)', markdown_content))):
+        outputs.append(os.path.relpath(os.path.join(md_dir, 'resources', filename), output_dir))
+    return outputs
+
+def _is_unchanged(entry, html_file, output_dir):
+    """判断输入文件自上次转换后是否未变化，必要时更新清单中的修改时间"""
+    if not entry or entry.get('converter') != __version__:
+        return False
+    if not all(os.path.exists(os.path.join(output_dir, output)) for output in entry.get('outputs', [])):
+        return False
+    mtime, size = _file_signature(html_file)
+    if entry.get('mtime') == mtime and entry.get('size') == size:
+        return True
+    # 修改时间变化但内容相同（例如重新复制过），只更新签名
+    if entry.get('size') == size and entry.get('sha256') == _file_digest(html_file):
+        entry['mtime'] = mtime
+        return True
+    return False
+
+def prune_manifest(manifest, output_dir, keep_keys):
+    """删除已不存在的输入文件所产生的输出，仍被其他文件引用的图片会保留"""
+    removed_keys = [key for key in manifest['files'] if key not in keep_keys]
+    if not removed_keys:
+        return []
+    still_used = {
+        output
+        for key in keep_keys if key in manifest['files']
+        for output in manifest['files'][key].get('outputs', [])
+    }
+    pruned = []
+    for key in removed_keys:
+        for output in manifest['files'].pop(key).get('outputs', []):
+            output_path = os.path.join(output_dir, output)
+            if output not in still_used and os.path.exists(output_path):
+                os.remove(output_path)
+                pruned.append(output_path)
+    return pruned
+
+# fork 出的子进程从父进程继承来的HTTP会话、缓存和图片仓库，见 _reset_inherited_globals
+_inherited_globals = []
+
+def _reset_inherited_globals():
+    """丢弃从父进程继承的HTTP会话、HTTP缓存和图片仓库，子进程用到时各自重新打开
+
+    SQLite连接和HTTP连接池都不能跨 fork 共用。继承来的对象只保留引用、不再使用，
+    避免它们在子进程里被回收时关闭父进程仍在使用的连接。父进程其他线程在 fork 时
+    可能正持有这些全局对象的锁，锁也一并重新创建。
+    """
+    global _http_session, _http_session_lock, _resource_stores, _resource_stores_lock
+    global _http_cache, _http_cache_lock
+    _inherited_globals.extend([_http_session, _http_cache, _resource_stores])
+    _http_session = None
+    _http_session_lock = threading.Lock()
+    _resource_stores = {}
+    _resource_stores_lock = threading.Lock()
+    cache = _http_cache
+    if cache:
+        # 保留父进程的缓存配置（目录、有效期、离线模式），连接重新打开
+        cache = HttpCache(cache.root, cache.ttl, cache.max_bytes, cache.offline)
+    _http_cache = cache
+    _http_cache_lock = threading.Lock()
+
+def _init_worker(parser, engine, log_level=None, low_memory_threshold=None):
+    """进程池子进程的初始化"""
+    _reset_inherited_globals()
+    set_parser_backend(parser)
+    set_markdown_engine(engine)
+    set_low_memory_threshold(low_memory_threshold)
+    if log_level is not None:
+        configure_logging(log_level)
+
+def _convert_directory_task(html_file, current_output_dir):
+    """进程池中执行的单个文件转换任务，同时返回本次任务的指标供主进程汇总"""
+    metrics.reset()
+    result = convert_html_to_md(html_file, current_output_dir)
+    return result, metrics.snapshot()
+
+def iter_directory_tasks(tasks, workers=1):
+    """转换 [(HTML文件, 输出目录)]，按完成顺序产出 (任务序号, ConversionResult)
+
+    workers 大于1（或为 None）时使用进程池。
+    """
+    if workers is not None and workers <= 1:
+        for index, (html_file, current_output_dir) in enumerate(tasks):
+            result = convert_html_to_md(html_file, current_output_dir)
+            if result:
+                logger.info(f"已转换: {html_file} -> {result.output}")
+            yield index, result
+        return
+        
+    # 子进程使用与当前进程相同的解析后端、Markdown生成方式和日志级别
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    log_level = logger.level if logger.handlers else None
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(PARSER_BACKEND, MARKDOWN_ENGINE, log_level, LOW_MEMORY_THRESHOLD))
+    try:
+        futures = {
+            executor.submit(_convert_directory_task, html_file, current_output_dir): index
+            for index, (html_file, current_output_dir) in enumerate(tasks)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            html_file = tasks[index][0]
+            try:
+                result, snapshot = future.result()
+                metrics.merge(snapshot)
+                if result:
+                    logger.info(f"已转换: {html_file} -> {result.output}")
+            except Exception as e:
+                # 子进程异常退出等进程池本身的错误
+                result = ConversionResult(html_file, error=str(e))
+                logger.error(f"转换失败 {html_file}: {str(e)}")
+            yield index, result
+    finally:
+        # 调用方提前停止迭代时，不再开始尚未执行的任务
+        executor.shutdown(cancel_futures=True)
+
+def run_directory_tasks(tasks, workers=1):
+    """转换 [(HTML文件, 输出目录)]，按任务顺序返回 [ConversionResult]"""
+    results = dict(iter_directory_tasks(tasks, workers))
+    return [results[index] for index in range(len(tasks))]
+
+def iter_directory_to_md(input_dir, output_dir, workers=1, incremental=False):
+    """处理目录中的所有HTML文件，每完成一个文件就产出它的 ConversionResult（按完成顺序）
+
+    workers 大于1时使用进程池并行转换；incremental 为 True 时根据输出目录中的清单
+    跳过未变化的文件（结果的 skipped 为 True），并删除已不存在的输入文件所产生的输出。
+    """
+    for _, result in _iter_directory(input_dir, output_dir, workers, incremental):
+        yield result
+
+def process_directory(input_dir, output_dir, workers=1, incremental=False):
+    """处理目录中的所有HTML文件，按文件顺序返回 [ConversionResult]，参数见 iter_directory_to_md"""
+    results = dict(_iter_directory(input_dir, output_dir, workers, incremental))
+    return [results[index] for index in sorted(results)]
+
+def _iter_directory(input_dir, output_dir, workers, incremental):
+    """按完成顺序产出 (文件序号, ConversionResult)"""
+    os.makedirs(output_dir, exist_ok=True)
+    
+    tasks = collect_html_files(input_dir, output_dir)
+    for current_output_dir in {output for _, output in tasks}:
+        if not os.path.exists(current_output_dir):
+            os.makedirs(current_output_dir, exist_ok=True)
+            
+    if not incremental:
+        yield from iter_directory_tasks(tasks, workers)
+        return
+        
+    manifest = load_manifest(output_dir)
+    keys = [os.path.relpath(html_file, input_dir).replace(os.sep, '/') for html_file, _ in tasks]
+    
+    # 只转换新增或变化的文件
+    skipped = []
+    pending = []
+    for index, (key, (html_file, current_output_dir)) in enumerate(zip(keys, tasks)):
+        entry = manifest['files'].get(key)
+        if _is_unchanged(entry, html_file, output_dir):
+            result = ConversionResult(html_file, os.path.join(output_dir, entry['outputs'][0]))
+            result.skipped = True
+            skipped.append((index, result))
+        else:
+            pending.append(index)
+    logger.info(f"增量转换: {len(pending)} 个文件需要转换，{len(skipped)} 个文件未变化")
+    
+    try:
+        yield from skipped
+        # 记录成功转换的文件，失败的文件下次会重新转换
+        for position, result in iter_directory_tasks([tasks[index] for index in pending], workers):
+            index = pending[position]
+            key, html_file = keys[index], tasks[index][0]
+            if result:
+                mtime, size = _file_signature(html_file)
+                manifest['files'][key] = {
+                    'mtime': mtime,
+                    'size': size,
+                    'sha256': _file_digest(html_file),
+                    'converter': __version__,
+                    'outputs': _manifest_outputs(result.output, output_dir),
+                }
+            else:
+                manifest['files'].pop(key, None)
+            yield index, result
+    finally:
+        # 提前停止时同样保存已完成的部分，尚未转换的文件下次会重新转换
+        # 删除已不存在的输入文件所产生的输出
+        for output_path in prune_manifest(manifest, output_dir, set(keys)):
+            logger.info(f"已删除过期输出: {output_path}")
+            
+        save_manifest(output_dir, manifest)
 
 def convert_file_to_md(html_file, output_dir=None):
-    """将单个HTML文件转换为Markdown"""
+    """将单个HTML文件转换为Markdown，返回 ConversionResult"""
     if output_dir is None:
         # 如果未指定输出目录，使用输入文件的目录
         output_dir = os.path.dirname(os.path.abspath(html_file))
     return convert_html_to_md(html_file, output_dir)
 
-def convert_directory_to_md(input_dir, output_dir=None):
-    """将目录中的所有HTML文件转换为Markdown"""
+def convert_directory_to_md(input_dir, output_dir=None, workers=1, incremental=False):
+    """将目录中的所有HTML文件转换为Markdown，按文件顺序返回 [ConversionResult]
+
+    workers 为并行进程数（None 表示CPU核数），incremental 开启增量转换。
+    """
     if output_dir is None:
         # 如果未指定输出目录，使用输入目录
         output_dir = input_dir
-    return process_directory(input_dir, output_dir)
+    return process_directory(input_dir, output_dir, workers, incremental)
+
+class JobJournal:
+    """批量任务的检查点日志：在SQLite中记录每个条目的状态，进程中断后可以从断点继续
+
+    条目状态为 pending（等待转换或等待重试）、running、ok 和 failed（已用完重试次数）。
+    每完成一个条目立即提交，崩溃或 Ctrl-C 时处于 running 的条目在下次打开时重新排队。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS items ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, source TEXT NOT NULL, '
+                'output_dir TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL, '
+                'next_attempt REAL NOT NULL, error TEXT, output TEXT, result TEXT, '
+                'updated_at REAL NOT NULL, UNIQUE (kind, source))'
+            )
+
+    def add(self, kind, items):
+        """加入 [(来源, 输出目录)]，已在日志中的条目保持原状态，返回新加入的条目数"""
+        now = time.time()
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany(
+                'INSERT OR IGNORE INTO items (kind, source, output_dir, status, attempts, next_attempt, updated_at) '
+                "VALUES (?, ?, ?, 'pending', 0, 0, ?)",
+                [(kind, source, output_dir, now) for source, output_dir in items]
+            )
+            return self._db.total_changes - before
+
+    def recover(self):
+        """把上次中断时仍在进行的条目重新排队，返回条目数"""
+        with self._lock, self._db:
+            return self._db.execute(
+                "UPDATE items SET status = 'pending', updated_at = ? WHERE status = 'running'", (time.time(),)
+            ).rowcount
+
+    def requeue_failed(self):
+        """把已用完重试次数的失败条目重新排队，返回条目数"""
+        with self._lock, self._db:
+            return self._db.execute(
+                "UPDATE items SET status = 'pending', attempts = 0, next_attempt = 0, updated_at = ? "
+                "WHERE status = 'failed'", (time.time(),)
+            ).rowcount
+
+    def claim_ready(self):
+        """取出所有已到重试时间的条目并标记为 running，返回 [(id, 类型, 来源, 输出目录)]"""
+        now = time.time()
+        with self._lock, self._db:
+            rows = self._db.execute(
+                "SELECT id, kind, source, output_dir FROM items "
+                "WHERE status = 'pending' AND next_attempt <= ? ORDER BY id", (now,)
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE items SET status = 'running', updated_at = ? WHERE id = ?",
+                [(now, row[0]) for row in rows]
+            )
+        return rows
+
+    def next_attempt(self):
+        """返回最早的待重试时间，没有待处理的条目时返回 None"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(next_attempt) FROM items WHERE status = 'pending'"
+            ).fetchone()[0]
+
+    def record(self, item_id, result, max_attempts=3, backoff=30.0):
+        """记录一次转换结果，失败且未用完重试次数时按指数退避重新排队，返回新状态"""
+        now = time.time()
+        with self._lock, self._db:
+            attempts = self._db.execute('SELECT attempts FROM items WHERE id = ?', (item_id,)).fetchone()[0] + 1
+            if result:
+                status, next_attempt = 'ok', 0
+            elif attempts < max_attempts:
+                status, next_attempt = 'pending', now + backoff * (2 ** (attempts - 1))
+            else:
+                status, next_attempt = 'failed', 0
+            self._db.execute(
+                'UPDATE items SET status = ?, attempts = ?, next_attempt = ?, error = ?, output = ?, '
+                'result = ?, updated_at = ? WHERE id = ?',
+                (status, attempts, next_attempt, result.error, result.output,
+                 json.dumps(result.to_dict(), ensure_ascii=False), now, item_id)
+            )
+        return status
+
+    def counts(self):
+        """返回 {状态: 条目数}"""
+        with self._lock:
+            return dict(self._db.execute('SELECT status, COUNT(*) FROM items GROUP BY status').fetchall())
+
+    def failures(self):
+        """返回 [(来源, 尝试次数, 错误信息)]，包括等待重试的条目"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT source, attempts, error FROM items WHERE attempts > 0 AND status IN ('pending', 'failed') ORDER BY id"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def iter_job(journal_path, urls=None, input_dir=None, output_dir=None, max_attempts=3, backoff=30.0,
+             workers=1, http_workers=4, browser_workers=2, host_interval=1.0, retry_failed=False):
+    """运行可恢复的批量任务，每完成一个条目就产出它的 ConversionResult
+
+    urls 和 input_dir 中的条目加入 journal_path 指向的检查点日志，已完成的条目不会重复转换；
+    不提供新条目时继续上次未完成的任务。失败的条目按 backoff 指数退避重试，最多尝试
+    max_attempts 次，retry_failed 为 True 时重新排队上次已用完重试次数的条目。
+    """
+    if output_dir is None:
+        output_dir = os.getcwd()
+    output_dir = os.path.abspath(output_dir)
+    with JobJournal(journal_path) as journal:
+        recovered = journal.recover()
+        if recovered:
+            logger.info(f"重新排队上次中断时未完成的 {recovered} 个条目")
+        if retry_failed:
+            logger.info(f"重新排队 {journal.requeue_failed()} 个失败的条目")
+        if urls:
+            urls = [url.strip() for url in urls if url and url.strip()]
+            logger.info(f"新加入 {journal.add('url', [(url, output_dir) for url in urls])} 个URL")
+        if input_dir:
+            files = [(os.path.abspath(html_file), os.path.abspath(current_output_dir))
+                     for html_file, current_output_dir in collect_html_files(input_dir, output_dir)]
+            logger.info(f"新加入 {journal.add('file', files)} 个HTML文件")
+
+        driver_pool = ChromeDriverPool(size=browser_workers)
+        try:
+            while True:
+                ready = journal.claim_ready()
+                if not ready:
+                    # 剩下的条目都在等待重试
+                    next_attempt = journal.next_attempt()
+                    if next_attempt is None:
+                        break
+                    delay = max(0.0, next_attempt - time.time())
+                    logger.info(f"等待 {delay:.1f} 秒后重试失败的条目")
+                    time.sleep(delay)
+                    continue
+                for item_id, result in _run_job_items(ready, workers, http_workers, browser_workers,
+                                                      host_interval, driver_pool):
+                    status = journal.record(item_id, result, max_attempts, backoff)
+                    if status == 'pending':
+                        logger.warning(f"转换失败，稍后重试: {result.source}")
+                    yield result
+        finally:
+            driver_pool.close()
+
+def _run_job_items(items, workers, http_workers, browser_workers, host_interval, driver_pool):
+    """转换一轮已取出的条目，按完成顺序产出 (条目id, ConversionResult)"""
+    files = [item for item in items if item[1] == 'file']
+    if files:
+        tasks = [(source, current_output_dir) for _, _, source, current_output_dir in files]
+        for position, result in iter_directory_tasks(tasks, workers):
+            yield files[position][0], result
+            
+    # URL按输出目录分组，重试由日志负责，这里不再重试
+    url_groups = {}
+    for item in items:
+        if item[1] == 'url':
+            url_groups.setdefault(item[3], []).append(item)
+    for current_output_dir, group in url_groups.items():
+        batch = _iter_url_batch([source for _, _, source, _ in group], current_output_dir, http_workers,
+                                browser_workers, host_interval, 0, 0, None, driver_pool)
+        for position, result in batch:
+            yield group[position][0], result
+
+class ConversionService:
+    """serve 模式的常驻转换服务
+
+    在多次请求之间保留已导入的模块、浏览器会话池、HTTP会话、缓存和转换HTML文件的进程池。
+    URL和HTML文件都以任务形式提交，返回 concurrent.futures.Future，结果为 ConversionResult。
+    请求中的HTML文件和输出目录必须位于 roots（以及默认输出目录）之内，见 check_path。
+    """
+
+    def __init__(self, output_dir, http_workers=4, browser_workers=2, file_workers=1, host_interval=1.0, roots=()):
+        self.output_dir = os.path.abspath(output_dir)
+        self.roots = [os.path.realpath(root) for root in [self.output_dir, *roots]]
+        self.file_workers = file_workers
+        self.driver_pool = ChromeDriverPool(size=browser_workers)
+        self.limiter = HostRateLimiter(host_interval)
+        self._http = ThreadPoolExecutor(max_workers=max(1, http_workers), thread_name_prefix='html2md-http')
+        self._browser = ThreadPoolExecutor(max_workers=max(1, browser_workers), thread_name_prefix='html2md-browser')
+        # 文件任务先进入线程队列，再交给进程池，这样可以准确统计排队和运行中的任务数
+        self._files = ThreadPoolExecutor(max_workers=max(1, file_workers or os.cpu_count() or 1), thread_name_prefix='html2md-file')
+        self._processes = None
+        self._lock = threading.Lock()
+        self._counts = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0}
+        self.started_at = time.time()
+
+    def warm_up(self):
+        """预先创建进程池，导入模块，创建HTTP会话、缓存和图片仓库"""
+        import importlib
+        # 进程池必须在创建任何连接之前 fork，子进程不继承父进程的SQLite连接和HTTP连接池
+        if self.file_workers is None or self.file_workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            workers = self.file_workers or os.cpu_count() or 1
+            log_level = logger.level if logger.handlers else None
+            self._processes = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(PARSER_BACKEND, MARKDOWN_ENGINE, log_level, LOW_MEMORY_THRESHOLD)
+            )
+            # 启动所有子进程，第一个请求不必等待进程创建
+            for future in [self._processes.submit(os.getpid) for _ in range(workers)]:
+                future.result()
+        importlib.import_module('html2text')
+        get_http_session()
+        get_http_cache()
+        get_resource_store()
+        get_site_rules()
+        try:
+            importlib.import_module('selenium.webdriver')
+        except ImportError:
+            logger.warning("未安装selenium，CSDN、知乎等需要浏览器的页面将无法转换")
+
+    def _track(self, func, *args):
+        """包装任务，维护排队、运行、完成和失败的任务数"""
+        def run():
+            self._change(queued=-1, running=1)
+            result = None
+            try:
+                result = func(*args)
+                return result
+            finally:
+                self._change(running=-1, completed=1 if result else 0, failed=0 if result else 1)
+        self._change(queued=1)
+        return run
+
+    def _change(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counts[name] += delta
+
+    def check_path(self, path):
+        """返回 path 的绝对路径，不在允许的目录之内时抛出 PermissionError"""
+        real = os.path.realpath(path)
+        for root in self.roots:
+            if os.path.commonpath([real, root]) == root:
+                return real
+        raise PermissionError(f"路径不在允许的目录中: {path}")
+
+    def submit_url(self, url, output_dir=None):
+        """提交URL转换任务"""
+        output_dir = output_dir or self.output_dir
+        lane = 'browser' if needs_browser(url) else 'http'
+
+        def convert():
+            with metrics.stage('rate_limit_wait', lane=lane):
+                self.limiter.wait(urlparse(url).hostname or '')
+            return convert_url_to_md(url, output_dir, self.driver_pool)
+
+        executor = self._browser if lane == 'browser' else self._http
+        return executor.submit(self._track(convert))
+
+    def submit_file(self, html_file, output_dir=None):
+        """提交HTML文件转换任务，未指定输出目录时输出到文件所在目录"""
+        output_dir = output_dir or os.path.dirname(os.path.abspath(html_file))
+
+        def convert():
+            if self._processes is None:
+                return convert_html_to_md(html_file, output_dir)
+            try:
+                result, snapshot = self._processes.submit(_convert_directory_task, html_file, output_dir).result()
+            except Exception as e:
+                # 子进程异常退出等进程池本身的错误
+                return ConversionResult(html_file, error=str(e))
+            metrics.merge(snapshot)
+            return result
+
+        return self._files.submit(self._track(convert))
+
+    def status(self):
+        """返回队列深度和任务统计"""
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'queue_depth': counts['queued'],
+            'running': counts['running'],
+            'completed': counts['completed'],
+            'failed': counts['failed'],
+            'uptime': round(time.time() - self.started_at, 3),
+            'pid': os.getpid(),
+        }
+
+    def close(self):
+        for executor in (self._http, self._browser, self._files):
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(cancel_futures=True)
+        self.driver_pool.close()
+
+def make_service_handler(service):
+    """创建 serve 模式的HTTP请求处理类
+
+    GET  /status   队列深度和任务统计（JSON）
+    GET  /metrics  各阶段耗时和计数器（Prometheus文本格式）
+    POST /convert  请求体为 {"urls": [...], "files": [...], "output_dir": 可选}，
+                   每完成一个任务就以一行JSON（ConversionResult.to_dict()）流式返回
+
+    POST 请求必须是 application/json：网页无法不经预检就跨域发送这种请求，
+    因此不能借用户的浏览器向本机服务提交任务。files 和 output_dir 只能位于服务允许的目录中。
+    """
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/status':
+                self._send_json(200, service.status())
+            elif path == '/metrics':
+                self._send(200, metrics.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+            else:
+                self._send_json(404, {'error': f"未知的路径: {path}"})
+
+        def do_POST(self):
+            from concurrent.futures import as_completed
+            if urlparse(self.path).path != '/convert':
+                self._send_json(404, {'error': f"未知的路径: {self.path}"})
+                return
+            content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type != 'application/json':
+                self._send_json(415, {'error': "请求体必须是JSON（Content-Type: application/json）"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                job = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(job, dict):
+                    raise ValueError("请求体必须是JSON对象")
+                urls, files = job.get('urls', []), job.get('files', [])
+                if not isinstance(urls, list) or not isinstance(files, list):
+                    raise ValueError("urls 和 files 必须是列表")
+                if job.get('url') is not None:
+                    urls = urls + [job['url']]
+                if not all(isinstance(item, str) for item in urls + files):
+                    raise ValueError("url、urls 和 files 中的每一项都必须是字符串")
+                output_dir = job.get('output_dir')
+                if output_dir is not None and not isinstance(output_dir, str):
+                    raise ValueError("output_dir 必须是字符串")
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            try:
+                if output_dir:
+                    output_dir = service.check_path(output_dir)
+                files = [service.check_path(html_file) for html_file in files]
+            except PermissionError as e:
+                self._send_json(403, {'error': str(e)})
+                return
+            futures = [service.submit_url(url, output_dir) for url in urls if url and url.strip()]
+            futures += [service.submit_file(html_file, output_dir) for html_file in files]
+            
+            # 分块传输，每完成一个任务写出一行
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for future in as_completed(futures):
+                    line = json.dumps(future.result().to_dict(), ensure_ascii=False) + '\n'
+                    self._write_chunk(line.encode('utf-8'))
+                self._write_chunk(b'')
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端断开后已提交的任务继续执行
+                logger.warning("客户端已断开，任务将在后台完成")
+                self.close_connection = True
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+
+        def _send_json(self, status, data):
+            self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            # Unix套接字的客户端地址为空字符串
+            return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+def serve(service, host='127.0.0.1', port=8765, socket_path=None):
+    """在前台运行转换服务，直到 Ctrl-C 或收到 SIGTERM"""
+    import http.server
+    import signal
+    import socketserver
+    handler = make_service_handler(service)
+    if socket_path:
+        class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixServer(socket_path, handler)
+        address = f"unix:{socket_path}"
+    else:
+        server = http.server.ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        address = f"http://{host}:{server.server_address[1]}"
+    if threading.current_thread() is threading.main_thread():
+        # serve_forever 所在线程不能调用 shutdown，交给另一个线程
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    logger.info(f"转换服务已启动: {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        logger.info("转换服务已停止")
 
 def main():
     """主函数，处理用户输入和程序流程"""
@@ -735,76 +4159,328 @@ def main():
     print("2. 包含HTML文件的文件夹路径")
     print("3. 文章URL（支持微信公众号文章）")
     
-    while True:
-        input_path = input("\n请输入要转换的HTML文件路径、文件夹路径或URL（输入q退出）: ").strip()
+    # 整个交互会话复用同一个浏览器会话
+    driver_pool = ChromeDriverPool(size=1)
+    try:
+        while True:
+            input_path = input("\n请输入要转换的HTML文件路径、文件夹路径或URL（输入q退出）: ").strip()
         
-        if input_path.lower() == 'q':
-            print("程序已退出")
-            break
+            if input_path.lower() == 'q':
+                print("程序已退出")
+                break
             
-        if not input_path:
-            print("输入不能为空，请重新输入")
-            continue
+            if not input_path:
+                print("输入不能为空，请重新输入")
+                continue
             
-        # 移除路径中的引号
-        input_path = input_path.strip('"\'')
+            # 移除路径中的引号
+            input_path = input_path.strip('"\'')
         
-        # 设置默认输出目录
-        default_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+            # 设置默认输出目录
+            default_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
         
-        # 获取用户指定的输出目录
-        output_dir = input(f"\n请输入输出目录路径（直接回车使用默认路径 {default_output_dir}）: ").strip()
-        if not output_dir:
-            output_dir = default_output_dir
-        else:
-            # 移除输出目录中的引号
-            output_dir = output_dir.strip('"\'')
+            # 获取用户指定的输出目录
+            output_dir = input(f"\n请输入输出目录路径（直接回车使用默认路径 {default_output_dir}）: ").strip()
+            if not output_dir:
+                output_dir = default_output_dir
+            else:
+                # 移除输出目录中的引号
+                output_dir = output_dir.strip('"\'')
             
-        # 确保输出目录存在
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print(f"已创建输出目录: {output_dir}")
+            # 确保输出目录存在
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+                print(f"已创建输出目录: {output_dir}")
         
-        try:
-            # 判断输入是否为URL
-            if input_path.startswith(('http://', 'https://')):
-                print(f"\n开始从URL转换: {input_path}")
-                result = convert_url_to_md(input_path, output_dir)
-                if result:
-                    print(f"转换成功！输出文件: {result}")
-                else:
-                    print("转换失败")
-            # 处理本地文件或目录
-            elif os.path.exists(input_path):
-                if os.path.isfile(input_path):
-                    if input_path.endswith('.html') or input_path.endswith('.htm'):
-                        print(f"\n开始转换文件: {input_path}")
-                        result = convert_html_to_md(input_path, output_dir)
-                        if result:
-                            print(f"转换成功！输出文件: {result}")
+            try:
+                # 判断输入是否为URL
+                if input_path.startswith(('http://', 'https://')):
+                    print(f"\n开始从URL转换: {input_path}")
+                    result = convert_url_to_md(input_path, output_dir, driver_pool)
+                    if result:
+                        print(f"转换成功！输出文件: {result.output}")
+                    else:
+                        print(f"转换失败: {result.error}")
+                # 处理本地文件或目录
+                elif os.path.exists(input_path):
+                    if os.path.isfile(input_path):
+                        if input_path.endswith('.html') or input_path.endswith('.htm'):
+                            print(f"\n开始转换文件: {input_path}")
+                            result = convert_html_to_md(input_path, output_dir)
+                            if result:
+                                print(f"转换成功！输出文件: {result.output}")
+                            else:
+                                print(f"转换失败: {result.error}")
                         else:
-                            print("转换失败")
+                            print("错误：输入文件必须是HTML文件（.html或.htm）")
+                    elif os.path.isdir(input_path):
+                        print(f"\n开始处理目录: {input_path}")
+                        results = process_directory(input_path, output_dir, workers=DIRECTORY_WORKERS or None)
+                        failed = sum(1 for result in results if not result)
+                        print(f"目录处理完成！成功 {len(results) - failed} 个，失败 {failed} 个，输出目录: {output_dir}")
                     else:
-                        print("错误：输入文件必须是HTML文件（.html或.htm）")
-                elif os.path.isdir(input_path):
-                    print(f"\n开始处理目录: {input_path}")
-                    process_directory(input_path, output_dir)
-                    print(f"目录处理完成！输出目录: {output_dir}")
-                else:
-                    print(f"错误：'{input_path}' 不是有效的文件、目录或URL")
-        except Exception as e:
-            print(f"发生错误: {str(e)}")
+                        print(f"错误：'{input_path}' 不是有效的文件、目录或URL")
+            except Exception as e:
+                print(f"发生错误: {str(e)}")
             
-        print("\n" + "=" * 50)
+            print("\n" + "=" * 50)
         
-        # 询问是否继续
-        choice = input("\n是否继续转换其他文件？(y/n): ").strip().lower()
-        if choice != 'y':
-            print("程序已退出")
-            break
+            # 询问是否继续
+            choice = input("\n是否继续转换其他文件？(y/n): ").strip().lower()
+            if choice != 'y':
+                print("程序已退出")
+                break
+    finally:
+        driver_pool.close()
+
+def read_url_list(source):
+    """从文件或标准输入（-）读取URL列表，忽略空行和 # 开头的注释"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def add_cache_arguments(parser):
+    """添加HTTP缓存相关的命令行参数"""
+    parser.add_argument('--cache-dir', help=f'HTTP缓存目录，默认 {HTTP_CACHE_DIR}')
+    parser.add_argument('--cache-ttl', type=float, default=3600, help='页面缓存的有效期（秒）')
+    parser.add_argument('--cache-size', type=int, default=1024, help='HTTP缓存的容量上限（MB）')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--no-cache', action='store_true', help='不使用HTTP缓存')
+    group.add_argument('--cache-only', action='store_true', help='只使用缓存内容，不访问网络')
+
+def apply_cache_arguments(args):
+    """根据命令行参数配置全局HTTP缓存"""
+    configure_http_cache(
+        args.cache_dir,
+        ttl=args.cache_ttl,
+        max_bytes=args.cache_size * 1024 * 1024,
+        offline=args.cache_only,
+        enabled=not args.no_cache
+    )
+
+def add_output_arguments(parser):
+    """添加日志和指标输出相关的命令行参数"""
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help='日志级别')
+    parser.add_argument('--metrics', help='结束后保存各阶段耗时和计数器，.prom/.txt 为Prometheus文本格式，其余为JSON')
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog='html2md', description='HTML转Markdown工具，不带参数运行时进入交互模式')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    batch = subparsers.add_parser('batch', help='批量转换URL列表')
+    batch.add_argument('urls', help='URL列表文件，每行一个URL，- 表示从标准输入读取')
+    batch.add_argument('-o', '--output-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "output"), help='输出目录')
+    batch.add_argument('--report', help='结果报告（JSONL）的保存路径，默认保存到输出目录的 report.jsonl')
+    batch.add_argument('--http-workers', type=int, default=4, help='requests队列（微信公众号）的并发数')
+    batch.add_argument('--browser-workers', type=int, default=2, help='浏览器队列（CSDN、知乎等）的并发数')
+    batch.add_argument('--host-interval', type=float, default=1.0, help='同一主机两次请求之间的最小间隔（秒）')
+    batch.add_argument('--retries', type=int, default=2, help='失败后的重试次数')
+    batch.add_argument('--backoff', type=float, default=2.0, help='首次重试前的等待时间（秒），之后指数递增')
+    batch.add_argument('--parser', choices=PARSER_BACKENDS, default=PARSER_BACKEND, help='HTML解析后端')
+    batch.add_argument('--markdown', choices=MARKDOWN_ENGINES, default=MARKDOWN_ENGINE, help='Markdown生成方式')
+    add_cache_arguments(batch)
+    add_output_arguments(batch)
+    
+    # 只处理本地文件，不加载浏览器相关模块，适合频繁启动的短进程
+    convert = subparsers.add_parser('convert', help='转换本地HTML文件或目录')
+    convert.add_argument('paths', nargs='+', help='HTML文件或目录')
+    convert.add_argument('-o', '--output-dir', help='输出目录，默认与输入文件相同')
+    convert.add_argument('-j', '--workers', type=int, default=DIRECTORY_WORKERS, help='转换目录时的并行进程数，0 表示使用全部CPU核')
+    convert.add_argument('--incremental', action='store_true', help='转换目录时只转换新增或修改过的文件')
+    convert.add_argument('--parser', choices=PARSER_BACKENDS, default=PARSER_BACKEND, help='HTML解析后端')
+    convert.add_argument('--markdown', choices=MARKDOWN_ENGINES, default=MARKDOWN_ENGINE, help='Markdown生成方式')
+    convert.add_argument('--low-memory', action='store_true',
+                         help=f'总是分块读取并只截取文章主体，默认只对不小于 {LOW_MEMORY_THRESHOLD // (1024 * 1024)}MB 的文件这样做')
+    add_output_arguments(convert)
+    
+    job = subparsers.add_parser('job', help='可恢复的批量任务，中断后重新运行同一命令即可从断点继续')
+    job.add_argument('journal', help='检查点日志文件（SQLite），不存在时创建')
+    job.add_argument('--urls', help='要加入任务的URL列表文件，- 表示从标准输入读取')
+    job.add_argument('--input-dir', help='要加入任务的HTML文件目录')
+    job.add_argument('-o', '--output-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "output"), help='输出目录')
+    job.add_argument('--max-attempts', type=int, default=3, help='每个条目最多尝试的次数')
+    job.add_argument('--backoff', type=float, default=30.0, help='首次重试前的等待时间（秒），之后指数递增')
+    job.add_argument('--retry-failed', action='store_true', help='重新排队已用完重试次数的失败条目')
+    job.add_argument('--status', action='store_true', help='只显示任务进度和失败的条目，不执行转换')
+    job.add_argument('-j', '--workers', type=int, default=DIRECTORY_WORKERS, help='转换HTML文件的并行进程数，0 表示使用全部CPU核')
+    job.add_argument('--http-workers', type=int, default=4, help='requests队列（微信公众号）的并发数')
+    job.add_argument('--browser-workers', type=int, default=2, help='浏览器队列（CSDN、知乎等）的并发数')
+    job.add_argument('--host-interval', type=float, default=1.0, help='同一主机两次请求之间的最小间隔（秒）')
+    job.add_argument('--parser', choices=PARSER_BACKENDS, default=PARSER_BACKEND, help='HTML解析后端')
+    job.add_argument('--markdown', choices=MARKDOWN_ENGINES, default=MARKDOWN_ENGINE, help='Markdown生成方式')
+    add_cache_arguments(job)
+    add_output_arguments(job)
+    
+    serve = subparsers.add_parser('serve', help='常驻的转换服务，在多次请求之间保留浏览器会话、缓存和进程池')
+    serve.add_argument('--host', default='127.0.0.1', help='监听地址')
+    serve.add_argument('--port', type=int, default=8765, help='监听端口')
+    serve.add_argument('--socket', help='改为监听Unix套接字')
+    serve.add_argument('-o', '--output-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "output"), help='URL任务的默认输出目录')
+    serve.add_argument('--root', action='append', default=[], help='允许请求读取HTML文件和写入输出的目录，可重复指定；默认输出目录总是允许')
+    serve.add_argument('-j', '--workers', type=int, default=1, help='转换HTML文件的进程数，0 表示使用全部CPU核')
+    serve.add_argument('--http-workers', type=int, default=4, help='requests队列（微信公众号）的并发数')
+    serve.add_argument('--browser-workers', type=int, default=2, help='浏览器队列（CSDN、知乎等）的并发数')
+    serve.add_argument('--host-interval', type=float, default=1.0, help='同一主机两次请求之间的最小间隔（秒）')
+    serve.add_argument('--parser', choices=PARSER_BACKENDS, default=PARSER_BACKEND, help='HTML解析后端')
+    serve.add_argument('--markdown', choices=MARKDOWN_ENGINES, default=MARKDOWN_ENGINE, help='Markdown生成方式')
+    add_cache_arguments(serve)
+    add_output_arguments(serve)
+    
+    gc = subparsers.add_parser('gc', help='整理图片仓库，超出容量时按最近使用时间淘汰')
+    gc.add_argument('--store', help=f'图片仓库目录，默认 {RESOURCE_STORE_DIR}')
+    gc.add_argument('--max-size', type=int, help=f'容量上限（MB），默认 {RESOURCE_STORE_MAX_BYTES // (1024 * 1024)}，0 表示不限制')
+    add_output_arguments(gc)
+    return parser
+
+def run_gc(args):
+    """执行 gc 子命令，返回进程退出码"""
+    store = get_resource_store(args.store)
+    stats = store.gc(None if args.max_size is None else args.max_size * 1024 * 1024)
+    print(f"图片仓库: {store.root}")
+    print(f"对象 {stats['objects']} 个，共 {stats['bytes'] / (1024 * 1024):.1f} MB")
+    print(f"登记未记录的对象 {stats['untracked_added']} 个，删除失效索引 {stats['index_removed']} 条，"
+          f"临时文件 {stats['temp_removed']} 个")
+    print(f"淘汰对象 {stats['evicted']} 个，释放 {stats['evicted_bytes'] / (1024 * 1024):.1f} MB")
+    return 0
+
+def run_serve(args):
+    """执行 serve 子命令，返回进程退出码"""
+    set_parser_backend(args.parser)
+    set_markdown_engine(args.markdown)
+    apply_cache_arguments(args)
+    service = ConversionService(
+        args.output_dir,
+        http_workers=args.http_workers,
+        browser_workers=args.browser_workers,
+        file_workers=args.workers or None,
+        host_interval=args.host_interval,
+        roots=args.root
+    )
+    try:
+        service.warm_up()
+        serve(service, args.host, args.port, args.socket)
+    finally:
+        service.close()
+    return 0
+
+def print_job_status(journal_path):
+    """显示任务各状态的条目数和失败的条目，还有未完成的条目时返回 1"""
+    with JobJournal(journal_path) as journal:
+        counts = journal.counts()
+        failures = journal.failures()
+    print("任务进度: " + "，".join(f"{status} {counts.get(status, 0)} 个" for status in ('ok', 'pending', 'running', 'failed')))
+    for source, attempts, error in failures:
+        print(f"  [{attempts}次] {source}: {error}")
+    return 0 if set(counts) <= {'ok'} else 1
+
+def run_job(args):
+    """执行 job 子命令，返回进程退出码"""
+    if args.status:
+        return print_job_status(args.journal)
+    set_parser_backend(args.parser)
+    set_markdown_engine(args.markdown)
+    apply_cache_arguments(args)
+    urls = read_url_list(args.urls) if args.urls else None
+    results = iter_job(
+        args.journal,
+        urls=urls,
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
+        max_attempts=args.max_attempts,
+        backoff=args.backoff,
+        workers=args.workers or None,
+        http_workers=args.http_workers,
+        browser_workers=args.browser_workers,
+        host_interval=args.host_interval,
+        retry_failed=args.retry_failed
+    )
+    for result in results:
+        print(f"{result.status}: {result.source}")
+    return print_job_status(args.journal)
+
+def run_convert(args):
+    """执行 convert 子命令，返回进程退出码"""
+    set_parser_backend(args.parser)
+    set_markdown_engine(args.markdown)
+    if args.low_memory:
+        set_low_memory_threshold(0)
+    failed = 0
+    for path in args.paths:
+        if os.path.isdir(path):
+            results = convert_directory_to_md(path, args.output_dir, workers=args.workers or None, incremental=args.incremental)
+            failed += sum(1 for result in results if not result)
+        elif os.path.isfile(path):
+            if args.output_dir:
+                os.makedirs(args.output_dir, exist_ok=True)
+            result = convert_file_to_md(path, args.output_dir)
+            if result:
+                print(f"转换成功！输出文件: {result.output}")
+            else:
+                failed += 1
+        else:
+            print(f"错误：'{path}' 不是有效的文件或目录")
+            failed += 1
+    return 1 if failed else 0
+
+def run_cli(argv):
+    """处理命令行参数，返回进程退出码"""
+    args = build_arg_parser().parse_args(argv)
+    configure_logging(getattr(args, 'log_level', 'INFO'))
+    try:
+        return run_command(args)
+    finally:
+        if getattr(args, 'metrics', None):
+            metrics.write(args.metrics)
+
+def run_command(args):
+    """执行子命令，返回进程退出码"""
+    if args.command == 'batch':
+        set_parser_backend(args.parser)
+        set_markdown_engine(args.markdown)
+        apply_cache_arguments(args)
+        urls = read_url_list(args.urls)
+        report_path = args.report or os.path.join(args.output_dir, 'report.jsonl')
+        print(f"共 {len(urls)} 个URL，结果报告: {report_path}")
+        results = iter_urls_to_md(
+            urls,
+            args.output_dir,
+            http_workers=args.http_workers,
+            browser_workers=args.browser_workers,
+            host_interval=args.host_interval,
+            retries=args.retries,
+            backoff=args.backoff,
+            report_path=report_path
+        )
+        done = failed = 0
+        for result in results:
+            done += 1
+            if not result:
+                failed += 1
+            print(f"[{done}/{len(urls)}] {result.status}: {result.source}")
+        print(f"批量转换完成：成功 {done - failed} 个，失败 {failed} 个")
+        return 1 if failed else 0
+    if args.command == 'convert':
+        return run_convert(args)
+    if args.command == 'job':
+        return run_job(args)
+    if args.command == 'serve':
+        return run_serve(args)
+    if args.command == 'gc':
+        return run_gc(args)
+    main()
+    return 0
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    configure_logging()
     main()
 else:
     # 导出函数供GUI使用
-    __all__ = ['convert_url_to_md', 'convert_file_to_md', 'convert_directory_to_md']
\ No newline at end of file
+    __all__ = ['convert_url_to_md', 'convert_urls_to_md', 'iter_urls_to_md', 'convert_url_to_md_async', 'convert_many_async',
+               'AsyncConverter', 'ConversionResult', 'ImageOutcome', 'convert_file_to_md', 'convert_directory_to_md',
+               'iter_directory_to_md', 'iter_job', 'JobJournal', 'ChromeDriverPool', 'configure_logging', 'metrics']
@@ -0,0 +1,22 @@
+"""测试共用的设置：从仓库根目录导入 html2md，从 benchmarks/ 导入语料服务"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import html2md
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    """使用临时图片仓库并关闭HTTP缓存，不写入用户目录；测试结束后恢复解析后端和转换引擎"""
+    monkeypatch.setattr(html2md, 'RESOURCE_STORE_DIR', str(tmp_path / 'store'))
+    monkeypatch.setattr(html2md, '_resource_stores', {})
+    monkeypatch.setattr(html2md, '_http_cache', False)
+    monkeypatch.setattr(html2md, 'PARSER_BACKEND', html2md.PARSER_BACKEND)
+    monkeypatch.setattr(html2md, 'MARKDOWN_ENGINE', html2md.MARKDOWN_ENGINE)
+    return tmp_path
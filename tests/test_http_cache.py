@@ -0,0 +1,126 @@
+"""HTTP缓存：有效期内直接命中，过期后用 ETag / Last-Modified 条件请求重新验证"""
+import http.server
+import threading
+
+import pytest
+
+import html2md
+
+requests = pytest.importorskip('requests')
+
+
+class Origin:
+    """本地源站：返回带 ETag 和 Last-Modified 的内容，条件请求匹配时返回304"""
+
+    def __init__(self):
+        self.body = b'version 1'
+        self.etag = '"v1"'
+        self.last_modified = 'Mon, 01 Jan 2024 00:00:00 GMT'
+        self.requests = []  # 每次请求的请求头
+        origin = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                origin.requests.append(dict(self.headers))
+                if ((origin.etag and self.headers.get('If-None-Match') == origin.etag)
+                        or self.headers.get('If-Modified-Since') == origin.last_modified):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.send_header('Content-Length', str(len(origin.body)))
+                if origin.etag:
+                    self.send_header('ETag', origin.etag)
+                self.send_header('Last-Modified', origin.last_modified)
+                self.end_headers()
+                self.wfile.write(origin.body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/page'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def origin():
+    origin = Origin()
+    yield origin
+    origin.close()
+
+
+@pytest.fixture
+def cache(isolated):
+    cache = html2md.HttpCache(str(isolated / 'http-cache'), ttl=3600)
+    yield cache
+    cache._db.close()
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as session:
+        yield session
+
+
+def counter(name):
+    return html2md.metrics.snapshot()['counters'].get(name, 0)
+
+
+def test_fresh_entry_is_served_without_request(origin, cache, session):
+    first = cache.get(origin.url, session=session)
+    assert first.content == b'version 1' and not first.from_cache
+    second = cache.get(origin.url, session=session)
+    assert second.content == b'version 1' and second.from_cache
+    assert len(origin.requests) == 1
+
+
+def test_stale_entry_is_revalidated_with_304(origin, cache, session):
+    cache.get(origin.url, session=session)
+    revalidated = counter('http_cache_revalidated')
+    response = cache.get(origin.url, ttl=0, session=session)
+    assert response.status_code == 200
+    assert response.content == b'version 1'
+    assert response.from_cache
+    assert origin.requests[-1]['If-None-Match'] == '"v1"'
+    assert origin.requests[-1]['If-Modified-Since'] == origin.last_modified
+    assert counter('http_cache_revalidated') == revalidated + 1
+    # 304 刷新了有效期，之后的请求直接命中
+    cache.get(origin.url, session=session)
+    assert len(origin.requests) == 2
+
+
+def test_stale_entry_is_replaced_when_content_changed(origin, cache, session):
+    cache.get(origin.url, session=session)
+    origin.body, origin.etag = b'version 2', '"v2"'
+    origin.last_modified = 'Tue, 02 Jan 2024 00:00:00 GMT'
+    response = cache.get(origin.url, ttl=0, session=session)
+    assert response.content == b'version 2' and not response.from_cache
+    assert cache.get(origin.url, session=session).content == b'version 2'
+
+
+def test_download_revalidates_with_last_modified(origin, cache, session, isolated):
+    origin.etag = None
+    assert cache.download(origin.url, str(isolated / 'a.txt'), session=session)
+    assert cache.download(origin.url, str(isolated / 'b.txt'), ttl=0, session=session)
+    assert 'If-None-Match' not in origin.requests[-1]
+    assert origin.requests[-1]['If-Modified-Since'] == origin.last_modified
+    assert (isolated / 'b.txt').read_bytes() == b'version 1'
+    assert len(origin.requests) == 2
+
+
+def test_offline_mode_serves_stale_entries_and_raises_on_miss(origin, cache, session, isolated):
+    cache.get(origin.url, session=session)
+    offline = html2md.HttpCache(str(isolated / 'http-cache'), ttl=0, offline=True)
+    try:
+        assert offline.get(origin.url, session=session).content == b'version 1'
+        with pytest.raises(html2md.CacheMissError):
+            offline.get(origin.url + '?missing', session=session)
+    finally:
+        offline._db.close()
+    assert len(origin.requests) == 1
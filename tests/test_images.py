@@ -0,0 +1,25 @@
+"""data URI 图片的解码"""
+import base64
+
+import pytest
+
+import html2md
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('data:image/png;base64,' + base64.b64encode(bytes(range(256))).decode('ascii'), bytes(range(256))),
+    ('data:image/png;base64,' + 'AAEC\n/w==', b'\x00\x01\x02\xff'),
+    ('data:image/gif,GIF89a%FF%00%80', b'GIF89a\xff\x00\x80'),
+    ('data:image/svg+xml,%3Csvg%3E%E4%B8%AD%3C/svg%3E', '<svg>中</svg>'.encode('utf-8')),
+    ('data:image/svg+xml;utf8,<svg/>', b'<svg/>'),
+])
+def test_data_uri_is_decoded_to_original_bytes(url, expected):
+    assert b''.join(html2md.iter_data_uri(url)) == expected
+
+
+def test_large_base64_data_uri_is_decoded_in_chunks(monkeypatch):
+    monkeypatch.setattr(html2md, 'DATA_URI_CHUNK_CHARS', 8)
+    data = bytes(range(256)) * 3
+    chunks = list(html2md.iter_data_uri('data:image/png;base64,' + base64.b64encode(data).decode('ascii')))
+    assert len(chunks) > 1
+    assert b''.join(chunks) == data
@@ -0,0 +1,80 @@
+"""增量转换：清单记录输入文件的签名，未变化的文件跳过，删除的输入对应的输出一并删除"""
+import os
+
+import html2md
+
+
+def write_page(path, title, body):
+    path.write_text(f'<html><body><h1>{title}</h1><p>{body}</p></body></html>', encoding='utf-8')
+
+
+def convert(input_dir, output_dir):
+    """增量转换目录，返回 {输入文件名: ConversionResult}"""
+    results = html2md.convert_directory_to_md(str(input_dir), str(output_dir), incremental=True)
+    return {os.path.basename(result.source): result for result in results}
+
+
+def test_unchanged_inputs_are_skipped(isolated):
+    pages, output = isolated / 'pages', isolated / 'output'
+    pages.mkdir()
+    write_page(pages / 'a.html', '甲', '第一版')
+    write_page(pages / 'b.html', '乙', '正文')
+
+    first = convert(pages, output)
+    assert all(first.values()) and not any(result.skipped for result in first.values())
+    assert (output / html2md.MANIFEST_FILENAME).exists()
+
+    second = convert(pages, output)
+    assert all(result.skipped for result in second.values())
+    outputs = {name: os.path.normpath(result.output) for name, result in first.items()}
+    assert {name: os.path.normpath(result.output) for name, result in second.items()} == outputs
+
+
+def test_changed_input_is_converted_again(isolated):
+    pages, output = isolated / 'pages', isolated / 'output'
+    pages.mkdir()
+    write_page(pages / 'a.html', '甲', '第一版')
+    write_page(pages / 'b.html', '乙', '正文')
+    convert(pages, output)
+
+    write_page(pages / 'a.html', '甲', '第二版，内容更长')
+    results = convert(pages, output)
+    assert not results['a.html'].skipped and results['b.html'].skipped
+    with open(results['a.html'].output, encoding='utf-8') as f:
+        assert '第二版' in f.read()
+
+
+def test_touched_input_with_same_content_is_skipped(isolated):
+    pages, output = isolated / 'pages', isolated / 'output'
+    pages.mkdir()
+    write_page(pages / 'a.html', '甲', '正文')
+    convert(pages, output)
+
+    stat = os.stat(pages / 'a.html')
+    os.utime(pages / 'a.html', (stat.st_atime, stat.st_mtime + 100))
+    assert convert(pages, output)['a.html'].skipped
+    manifest = html2md.load_manifest(str(output))
+    assert manifest['files']['a.html']['mtime'] == os.stat(pages / 'a.html').st_mtime
+
+
+def test_missing_output_is_regenerated(isolated):
+    pages, output = isolated / 'pages', isolated / 'output'
+    pages.mkdir()
+    write_page(pages / 'a.html', '甲', '正文')
+    os.remove(convert(pages, output)['a.html'].output)
+
+    result = convert(pages, output)['a.html']
+    assert not result.skipped and os.path.exists(result.output)
+
+
+def test_outputs_of_removed_inputs_are_deleted(isolated):
+    pages, output = isolated / 'pages', isolated / 'output'
+    pages.mkdir()
+    write_page(pages / 'a.html', '甲', '正文')
+    write_page(pages / 'b.html', '乙', '正文')
+    removed_output = convert(pages, output)['b.html'].output
+
+    os.remove(pages / 'b.html')
+    assert list(convert(pages, output)) == ['a.html']
+    assert not os.path.exists(removed_output)
+    assert list(html2md.load_manifest(str(output))['files']) == ['a.html']
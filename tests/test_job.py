@@ -0,0 +1,62 @@
+"""可恢复的批量任务：中断后从检查点继续，失败的条目按次数重试"""
+import contextlib
+import itertools
+import os
+
+import html2md
+
+
+def make_pages(directory, count):
+    directory.mkdir()
+    for i in range(count):
+        (directory / f'page{i}.html').write_text(
+            f'<html><body><h1>第{i}篇</h1><p>正文{i}</p></body></html>', encoding='utf-8'
+        )
+    return sorted(str(path) for path in directory.iterdir())
+
+
+def test_interrupted_job_resumes_where_it_stopped(isolated):
+    pages = make_pages(isolated / 'pages', 4)
+    journal_path = str(isolated / 'job.db')
+    output_dir = str(isolated / 'output')
+
+    # 转换两个条目后中断，剩下的条目停留在 running 状态
+    with contextlib.closing(html2md.iter_job(journal_path, input_dir=str(isolated / 'pages'), output_dir=output_dir)) as job:
+        first = list(itertools.islice(job, 2))
+    assert all(first)
+    with html2md.JobJournal(journal_path) as journal:
+        assert journal.counts() == {'ok': 2, 'running': 2}
+
+    # 不提供新条目时继续上次的任务，已完成的条目不会重复转换
+    rest = list(html2md.iter_job(journal_path, output_dir=output_dir))
+    assert all(rest)
+    assert sorted(result.source for result in first + rest) == pages
+    with html2md.JobJournal(journal_path) as journal:
+        assert journal.counts() == {'ok': 4}
+    assert len([name for name in os.listdir(output_dir) if name.endswith('.md')]) == 4
+
+    # 再次加入同一目录也不会重复转换
+    assert list(html2md.iter_job(journal_path, input_dir=str(isolated / 'pages'), output_dir=output_dir)) == []
+
+
+def test_failed_items_are_retried_until_attempts_run_out(isolated):
+    pages = make_pages(isolated / 'pages', 2)
+    journal_path = str(isolated / 'job.db')
+    with html2md.JobJournal(journal_path) as journal:
+        journal.add('file', [(path, str(isolated / 'output')) for path in pages])
+    os.remove(pages[1])
+
+    results = list(html2md.iter_job(journal_path, max_attempts=2, backoff=0))
+    assert [result.source for result in results if result] == [pages[0]]
+    assert [result.source for result in results if not result] == [pages[1], pages[1]]
+    with html2md.JobJournal(journal_path) as journal:
+        assert journal.counts() == {'ok': 1, 'failed': 1}
+        assert [(source, attempts) for source, attempts, _ in journal.failures()] == [(pages[1], 2)]
+
+    # 文件恢复后重新排队失败的条目
+    with open(pages[1], 'w', encoding='utf-8') as f:
+        f.write('<html><body><p>恢复</p></body></html>')
+    retried = list(html2md.iter_job(journal_path, retry_failed=True))
+    assert [result.source for result in retried] == [pages[1]] and all(retried)
+    with html2md.JobJournal(journal_path) as journal:
+        assert journal.counts() == {'ok': 2}
@@ -0,0 +1,58 @@
+"""低内存模式：分块扫描大文件只截取文章相关的元素，生成的Markdown与读取整个文件时一致"""
+import glob
+import os
+
+import pytest
+
+import html2md
+from corpus_server import CORPUS_DIR, CorpusServer, render_page
+
+# 微信公众号的规则不提取正文（extract 为 false），整页转换，低内存模式不截取
+SLICED_PAGES = {'csdn.html', 'zhihu.html'}
+PAGES = sorted(os.path.relpath(path, CORPUS_DIR) for path in glob.glob(os.path.join(CORPUS_DIR, 'pages', '*.html')))
+
+# 文章之后的评论和推荐列表，让页面远大于文章本身
+FILLER = (
+    '<div class="comment-box"><p class="comment-content">第{i}条评论 <b>写得好</b> &amp; 收藏</p>'
+    '<ul class="recommend"><li><a href="https://example.com/p/{i}">推荐 {i}</a></li></ul></div>\n'
+)
+
+
+@pytest.fixture(scope='module')
+def corpus_server():
+    with CorpusServer() as server:
+        yield server
+
+
+def convert(html_file, output_dir):
+    result = html2md.convert_html_to_md(str(html_file), str(output_dir))
+    assert result, result.error
+    with open(result.output, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('page', PAGES, ids=[os.path.basename(page) for page in PAGES])
+def test_sliced_article_matches_full_read(page, corpus_server, isolated, monkeypatch):
+    html = render_page({'file': page}, corpus_server.base_url)
+    head, sep, tail = html.rpartition('</body>')
+    html_file = isolated / os.path.basename(page)
+    html_file.write_text(head + ''.join(FILLER.format(i=i) for i in range(500)) + sep + tail, encoding='utf-8')
+    # 块很小，元素和标签会跨越块的边界
+    monkeypatch.setattr(html2md, 'SLICE_CHUNK_SIZE', 4096)
+
+    monkeypatch.setattr(html2md, 'LOW_MEMORY_THRESHOLD', None)
+    expected = convert(html_file, isolated / 'full')
+    sliced_before = html2md.metrics.snapshot()['counters'].get('low_memory_inputs', 0)
+    monkeypatch.setattr(html2md, 'LOW_MEMORY_THRESHOLD', 0)
+    assert convert(html_file, isolated / 'sliced') == expected
+    sliced = os.path.basename(page) in SLICED_PAGES
+    assert html2md.metrics.snapshot()['counters'].get('low_memory_inputs', 0) == sliced_before + sliced
+
+
+def test_unrecognised_page_is_read_whole(isolated, monkeypatch):
+    html_file = isolated / 'plain.html'
+    html_file.write_text('<html><body><h1>普通页面</h1><p>正文</p></body></html>', encoding='utf-8')
+    monkeypatch.setattr(html2md, 'LOW_MEMORY_THRESHOLD', 0)
+    sliced_before = html2md.metrics.snapshot()['counters'].get('low_memory_inputs', 0)
+    assert '普通页面' in convert(html_file, isolated / 'out')
+    assert html2md.metrics.snapshot()['counters'].get('low_memory_inputs', 0) == sliced_before
@@ -0,0 +1,62 @@
+"""native 引擎的强调标记，以及对行首类似列表、标题、引用、分隔线标记的文字的转义"""
+import io
+
+import pytest
+
+import html2md
+
+
+def to_markdown(html):
+    out = io.StringIO()
+    html2md.write_markdown(html2md.parse_html(html, 'html.parser'), out, engine='native')
+    return out.getvalue().strip()
+
+
+@pytest.mark.parametrize('html, expected', [
+    ('<p>1. 调度网络请求</p>', '1\\. 调度网络请求'),
+    ('<p>12) 第十二步</p>', '12\\) 第十二步'),
+    ('<p>- 不是列表</p>', '\\- 不是列表'),
+    ('<p>+ 不是列表</p>', '\\+ 不是列表'),
+    ('<p># 不是标题</p>', '\\# 不是标题'),
+    ('<p>### 不是标题</p>', '\\### 不是标题'),
+    ('<p>&gt; 不是引用</p>', '\\> 不是引用'),
+    ('<p>第一行<br>1. 第二行</p>', '第一行  \n1\\. 第二行'),
+    ('<p>---</p>', '\\---'),
+    ('<p>***</p>', '\\*\\*\\*'),
+    ('<p>abc<br>---</p>', 'abc  \n\\---'),
+    ('<p>abc<br>===</p>', 'abc  \n\\==='),
+    ('<p>abc<br>=</p>', 'abc  \n\\='),
+])
+def test_paragraph_line_start_is_escaped(html, expected):
+    assert to_markdown(html) == expected
+
+
+@pytest.mark.parametrize('html, expected', [
+    ('<h2>1. 调度网络请求响应。</h2>', '## 1. 调度网络请求响应。'),
+    ('<h3>- 减号开头</h3>', '### - 减号开头'),
+    ('<p><strong>1. 加粗</strong></p>', '**1. 加粗**'),
+])
+def test_text_after_marker_is_not_escaped(html, expected):
+    assert to_markdown(html) == expected
+
+
+@pytest.mark.parametrize('html, expected', [
+    ('<ul><li>1. 嵌套序号</li></ul>', '- 1\\. 嵌套序号'),
+    ('<blockquote><p>- 引用中的减号</p></blockquote>', '> \\- 引用中的减号'),
+])
+def test_line_start_after_prefix_is_escaped(html, expected):
+    assert to_markdown(html) == expected
+
+
+def test_text_inside_line_is_not_escaped():
+    assert to_markdown('<p>共 1. 2 - 3 # 4</p>') == '共 1. 2 - 3 # 4'
+    assert to_markdown('<p>a --- b === c</p>') == 'a --- b === c'
+
+
+@pytest.mark.parametrize('html, expected', [
+    ('<p>这是<em>强调</em>文本</p>', '这是*强调*文本'),
+    ('<p>这是<strong>加粗</strong>文本</p>', '这是**加粗**文本'),
+    ('<p>an <i>emphasized</i> word</p>', 'an *emphasized* word'),
+])
+def test_emphasis_works_inside_words(html, expected):
+    assert to_markdown(html) == expected
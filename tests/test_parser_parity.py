@@ -0,0 +1,35 @@
+"""lxml 与 html.parser 在基准语料上生成的Markdown应逐字节一致"""
+import glob
+import os
+
+import pytest
+
+import html2md
+from corpus_server import CORPUS_DIR, CorpusServer, render_page
+
+pytest.importorskip('lxml')
+
+PAGES = sorted(os.path.relpath(path, CORPUS_DIR) for path in glob.glob(os.path.join(CORPUS_DIR, 'pages', '*.html')))
+
+
+@pytest.fixture(scope='module')
+def corpus_server():
+    with CorpusServer() as server:
+        yield server
+
+
+def convert_with(parser, html_file, output_dir):
+    """使用指定的解析后端转换文件，返回Markdown内容"""
+    html2md.set_parser_backend(parser)
+    result = html2md.convert_html_to_md(str(html_file), str(output_dir))
+    assert result, f"{parser} 转换失败: {result.error}"
+    with open(result.output, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('page', PAGES, ids=[os.path.basename(page) for page in PAGES])
+def test_lxml_matches_html_parser(page, corpus_server, isolated):
+    html_file = isolated / os.path.basename(page)
+    html_file.write_text(render_page({'file': page}, corpus_server.base_url), encoding='utf-8')
+    expected = convert_with('html.parser', html_file, isolated / 'html.parser')
+    assert convert_with('lxml', html_file, isolated / 'lxml') == expected
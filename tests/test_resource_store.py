@@ -0,0 +1,113 @@
+"""图片仓库：按内容去重、只读对象、总大小统计、按最近使用时间淘汰和整理"""
+import os
+import stat
+import time
+
+import pytest
+
+import html2md
+
+
+@pytest.fixture
+def store(isolated, monkeypatch):
+    monkeypatch.setattr(html2md, 'RESOURCE_STORE_GRACE_SECONDS', 0)
+    store = html2md.ResourceStore(str(isolated / 'store'), max_bytes=0)
+    yield store
+    store._db.close()
+
+
+def add(store, url, data, accessed_at=None):
+    """存入一张图片，可以指定最近使用时间，返回哈希"""
+    digest = store.add_bytes(url, data, '.png')
+    if accessed_at is not None:
+        with store._db:
+            store._db.execute('UPDATE objects SET accessed_at = ? WHERE digest = ?', (accessed_at, digest))
+    return digest
+
+
+def test_identical_content_is_stored_once(store):
+    first = add(store, 'https://example.com/a.png', b'x' * 100)
+    second = add(store, 'https://example.com/b.png', b'x' * 100)
+    assert first == second
+    assert store.total_bytes() == 100
+    assert store.lookup('https://example.com/b.png') == (first, '.png')
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_linked_objects_are_read_only(store, isolated):
+    digest = add(store, 'https://example.com/a.png', b'data')
+    resources = isolated / 'resources'
+    resources.mkdir()
+    filename = store.link_into(digest, '.png', str(resources))
+    linked = os.stat(resources / filename)
+    assert stat.S_IMODE(linked.st_mode) == 0o444
+    assert linked.st_ino == os.stat(store.object_path(digest, '.png')).st_ino
+
+
+def test_prune_evicts_least_recently_used(store):
+    now = time.time()
+    old = add(store, 'https://example.com/old.png', b'a' * 400, now - 300)
+    middle = add(store, 'https://example.com/middle.png', b'b' * 400, now - 200)
+    new = add(store, 'https://example.com/new.png', b'c' * 400, now - 100)
+    assert store.total_bytes() == 1200
+
+    assert store.prune(1000) == (1, 400)
+    assert not os.path.exists(store.object_path(old, '.png'))
+    assert store.lookup('https://example.com/old.png') is None
+    assert store.lookup('https://example.com/middle.png') == (middle, '.png')
+    assert store.lookup('https://example.com/new.png') == (new, '.png')
+    assert store.total_bytes() == 800
+    assert store.prune(1000) == (0, 0)
+
+
+def test_add_prunes_to_the_size_limit(store):
+    store.max_bytes = 1000
+    now = time.time()
+    for i in range(5):
+        add(store, f'https://example.com/{i}.png', bytes([i]) * 300, now - 100 + i)
+    assert store.total_bytes() <= 1000
+    assert store.lookup('https://example.com/4.png') is not None
+    assert store.lookup('https://example.com/0.png') is None
+
+
+def test_recently_used_objects_are_not_evicted(store, monkeypatch):
+    monkeypatch.setattr(html2md, 'RESOURCE_STORE_GRACE_SECONDS', 60)
+    digest = add(store, 'https://example.com/a.png', b'a' * 400)
+    add(store, 'https://example.com/b.png', b'b' * 400, time.time() - 3600)
+    assert store.prune(100) == (1, 400)
+    # 查询命中后到链接进输出目录之前，对象不会被其他进程淘汰
+    assert store.lookup('https://example.com/a.png') == (digest, '.png')
+    assert os.path.exists(store.object_path(digest, '.png'))
+
+
+def test_existing_store_total_is_counted_on_open(store, isolated):
+    add(store, 'https://example.com/a.png', b'a' * 100)
+    add(store, 'https://example.com/b.png', b'b' * 50)
+    with store._db:
+        store._db.execute('DROP TABLE store_stats')
+    reopened = html2md.ResourceStore(str(isolated / 'store'), max_bytes=0)
+    try:
+        assert reopened.total_bytes() == 150
+    finally:
+        reopened._db.close()
+
+
+def test_gc_registers_untracked_objects_and_drops_dangling_index(store):
+    digest = add(store, 'https://example.com/a.png', b'a' * 100)
+    # 旧版本存入、没有记录的对象
+    untracked = store.object_path('ab' + '0' * 62, '.png')
+    os.makedirs(os.path.dirname(untracked), exist_ok=True)
+    with open(untracked, 'wb') as f:
+        f.write(b'u' * 30)
+    gone = add(store, 'https://example.com/gone.png', b'g' * 10)
+    os.chmod(store.object_path(gone, '.png'), 0o644)
+    os.remove(store.object_path(gone, '.png'))
+
+    stats = store.gc(max_bytes=0)
+    assert stats['untracked_added'] == 1
+    assert stats['index_removed'] == 1
+    assert stats['objects'] == 2
+    assert stats['bytes'] == store.total_bytes() == 130
+    assert stat.S_IMODE(os.stat(untracked).st_mode) == 0o444
+    assert store.lookup('https://example.com/a.png') == (digest, '.png')
+    assert store.lookup('https://example.com/gone.png') is None
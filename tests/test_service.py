@@ -0,0 +1,78 @@
+"""serve 模式的请求检查：Content-Type、请求体格式和允许的目录"""
+import http.server
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import html2md
+
+
+@pytest.fixture
+def service_url(isolated):
+    service = html2md.ConversionService(str(isolated / 'output'), roots=[str(isolated / 'pages')])
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), html2md.make_service_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/convert'
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def post(url, body, content_type='application/json'):
+    """发送请求，返回 (状态码, 响应内容)"""
+    request = urllib.request.Request(url, data=body, method='POST', headers={'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+
+
+@pytest.mark.parametrize('body', [
+    b'[1, 2]',
+    b'"https://example.com/"',
+    b'{"urls": "https://example.com/"}',
+    b'{"urls": [1]}',
+    b'{"url": 5}',
+    b'{"files": [null]}',
+    b'{"output_dir": 3}',
+    b'{not json',
+    b'\xff',
+])
+def test_malformed_body_is_rejected(service_url, body):
+    status, text = post(service_url, body)
+    assert status == 400
+    assert json.loads(text)['error']
+
+
+@pytest.mark.parametrize('content_type', ['text/plain', 'application/x-www-form-urlencoded', ''])
+def test_non_json_content_type_is_rejected(service_url, content_type):
+    status, _ = post(service_url, b'{"urls": []}', content_type)
+    assert status == 415
+
+
+@pytest.mark.parametrize('job', [
+    {'files': ['/etc/passwd']},
+    {'files': ['pages/../../secret.html']},
+    {'output_dir': '/tmp'},
+])
+def test_paths_outside_roots_are_rejected(service_url, isolated, job):
+    job = {key: value if key == 'output_dir' else [str(isolated / path) for path in value] for key, value in job.items()}
+    status, _ = post(service_url, json.dumps(job).encode('utf-8'))
+    assert status == 403
+
+
+def test_file_inside_root_is_converted(service_url, isolated):
+    pages = isolated / 'pages'
+    pages.mkdir()
+    (pages / 'a.html').write_text('<html><body><h1>标题</h1><p>正文</p></body></html>', encoding='utf-8')
+    job = {'files': [str(pages / 'a.html')], 'output_dir': str(isolated / 'output' / 'a')}
+    status, text = post(service_url, json.dumps(job).encode('utf-8'), 'application/json; charset=utf-8')
+    assert status == 200
+    result = json.loads(text.splitlines()[0])
+    assert result['status'] == 'ok'
+    assert result['output'].startswith(str(isolated / 'output' / 'a'))
@@ -0,0 +1,70 @@
+"""比较不同解析后端生成的Markdown是否逐字节一致
+
+用法: python tools/parser_parity.py [--parser lxml] 文件或目录 ...
+以 html.parser 的输出为基准，输出不一致的文件及差异，存在差异时退出码为1。
+"""
+import argparse
+import difflib
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import html2md
+
+
+def iter_html_files(paths):
+    """展开命令行中的文件和目录"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file.endswith(('.html', '.htm')):
+                        yield os.path.join(root, file)
+        else:
+            yield path
+
+
+def convert_with(parser, html_file, output_dir):
+    """使用指定的解析后端转换文件，返回Markdown内容"""
+    html2md.set_parser_backend(parser)
+    result = html2md.convert_html_to_md(html_file, output_dir)
+    if not result:
+        return None
+    with open(result.output, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较解析后端的Markdown输出')
+    parser.add_argument('paths', nargs='+', help='HTML文件或目录')
+    parser.add_argument('--parser', default='lxml', choices=html2md.PARSER_BACKENDS, help='要与 html.parser 比较的后端')
+    args = parser.parse_args()
+
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        # 使用临时图片仓库，避免写入用户的共享仓库
+        html2md.RESOURCE_STORE_DIR = os.path.join(work_dir, 'store')
+        for index, html_file in enumerate(iter_html_files(args.paths)):
+            expected = convert_with('html.parser', html_file, os.path.join(work_dir, f'base_{index}'))
+            actual = convert_with(args.parser, html_file, os.path.join(work_dir, f'test_{index}'))
+            if expected == actual:
+                print(f"一致: {html_file}")
+                continue
+            mismatches += 1
+            print(f"不一致: {html_file}")
+            diff = difflib.unified_diff(
+                (expected or '').splitlines(True),
+                (actual or '').splitlines(True),
+                'html.parser',
+                args.parser
+            )
+            sys.stdout.writelines(diff)
+    print(f"共 {mismatches} 个文件不一致")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())